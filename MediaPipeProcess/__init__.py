@@ -0,0 +1,8 @@
+"""
+Keypoint extraction, augmentation and packing for the sign language dataset.
+
+Importing the package or any module loads no model and none of mediapipe, scikit-learn or
+scipy: those are imported by the code that first needs them. Run the tools from the
+repository root with python -m MediaPipeProcess <command>. The metrics module lives here and
+the crawler at the repository root imports it as MediaPipeProcess.metrics.
+"""
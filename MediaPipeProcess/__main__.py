@@ -0,0 +1,44 @@
+"""
+Single entry point for the dataset tools; each command loads only its own module:
+
+    python -m MediaPipeProcess extract VIDEO_DIR OUTPUT_DIR [--workers N ...]
+    python -m MediaPipeProcess augment CLIP_DIR OUTPUT_DIR [--copies N]
+    python -m MediaPipeProcess pack METADATA KEYPOINTS_DIR OUTPUT_DIR
+    python -m MediaPipeProcess proxy VIDEO_DIR [--format mjpg|raw]
+    python -m MediaPipeProcess features CLIP_SOURCE [--features body,hands,velocity,bones]
+    python -m MediaPipeProcess check [--videos DIR] [--metadata FILE] [--keypoints DIR]
+"""
+
+import sys
+import importlib
+
+# command -> (module with a main(argv, prog) function, help)
+COMMANDS = {
+    "extract": ("batch_extract", "extract keypoints from a directory of videos"),
+    "augment": ("augmentation", "write augmented copies of dense keypoint clips"),
+    "pack": ("keypoint_dataset", "pack per-clip keypoint files into shards"),
+    "proxy": ("proxy_cache", "transcode videos into normalized proxies ahead of extraction"),
+    "features": ("keypoint_features", "compute and cache derived features of keypoint clips"),
+    "check": ("dataset_check", "verify videos, metadata and keypoint clips and write a repair list"),
+}
+
+def usage():
+    lines = ["usage: python -m MediaPipeProcess <command> [args]", "", "commands:"]
+    lines += [f"  {command:<10}{help_text}" for command, (_, help_text) in COMMANDS.items()]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] in (["-h"], ["--help"]):
+        print(usage())
+        return 0
+    if not argv or argv[0] not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        return 2
+    command, args = argv[0], argv[1:]
+    module = importlib.import_module(f".{COMMANDS[command][0]}", __package__)
+    module.main(args, prog=f"python -m {__package__} {command}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
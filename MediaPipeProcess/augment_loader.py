@@ -0,0 +1,217 @@
+"""
+On-the-fly augmentation loader: clips are read from a packed KeypointDataset or a folder of
+dense clips, augmented with augmentation.augment_clip when drawn, and yielded as fixed-shape
+batches, so augmented copies cost CPU time and never disk. Batches are built by a process
+pool with a bounded number of batches in flight.
+"""
+
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+from . import metrics
+from . import keypoint_format as kf
+from . import augmentation as aug
+from .keypoint_dataset import KeypointDataset, INDEX_NAME
+from .config import K, N_LANDMARKS
+
+BATCH_SIZE = 32
+PREFETCH = 4                                                # batches in flight per worker
+
+class ClipFolder:
+    """Dense clips under a directory, labelled by their sub-folder (the per-word layout of batch_extract)."""
+
+    def __init__(self, root):
+        self.root = root
+        self.paths = []
+        words = []
+        for directory, _, files in sorted(os.walk(root)):
+            for name in sorted(files):
+                if kf.is_keypoint_file(name):
+                    self.paths.append(os.path.join(directory, name))
+                    words.append(os.path.relpath(directory, root))
+        self.words = sorted(set(words))
+        word_labels = {word: label for label, word in enumerate(self.words)}
+        self.labels = [word_labels[word] for word in words]
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        keypoints, mask = kf.load_keypoints(self.paths[i])
+        return keypoints, mask, {"path": self.paths[i]}
+
+    def label(self, i):
+        return self.labels[i]
+
+def open_source(path):
+    """KeypointDataset for a packed directory (with INDEX_NAME), ClipFolder otherwise."""
+
+    if os.path.exists(os.path.join(path, INDEX_NAME)):
+        return KeypointDataset(path)
+    return ClipFolder(path)
+
+def fixed_length(n_frames, length):
+    """Indices resampling n_frames evenly to length frames (repeating frames of short clips)."""
+
+    return np.linspace(0, n_frames - 1, length).round().astype(np.int64)
+
+def batch_seed(seed, epoch, batch_index):
+    """Seed of one batch: independent of which worker builds it, so a run is reproducible."""
+
+    return np.random.SeedSequence([seed, epoch, batch_index])
+
+# Per worker process state, set by init_worker
+_worker_source = None
+_worker_options = None
+_worker_transform = None
+_worker_features = None
+
+def init_worker(source_path, options):
+    """Open the clip source in this worker (shards and cached features are memory-mapped once per process)."""
+
+    global _worker_source, _worker_options, _worker_transform, _worker_features
+    _worker_source = open_source(source_path)
+    _worker_options = options
+    if options.get("features"):
+        from .keypoint_features import FeatureTransform
+        _worker_transform = FeatureTransform(options["features"], options["n_frames"])
+    if options.get("feature_path"):
+        _worker_features = np.load(options["feature_path"], mmap_mode="r")
+
+def build_batch(indices, seed):
+    """
+    Read, resample and augment the clips at indices with a generator seeded for this batch.
+    Return (keypoints (B, n_frames, N_LANDMARKS, 3) float32, mask (B, n_frames) uint8, labels (B,) int64).
+    With features the keypoints are replaced by their (B, n_frames, dim) keypoint_features, read from
+    the feature cache when the clips are not augmented.
+    """
+
+    start_time = time.perf_counter()
+    n_frames = _worker_options["n_frames"]
+    rng = np.random.default_rng(seed)
+    keypoints = np.empty((len(indices), n_frames, N_LANDMARKS, 3), dtype=np.float32)
+    mask = np.empty((len(indices), n_frames), dtype=np.uint8)
+    labels = np.empty(len(indices), dtype=np.int64)
+    for row, i in enumerate(indices):
+        clip, clip_mask, _ = _worker_source[i]
+        frames = fixed_length(len(clip), n_frames)
+        mask[row] = clip_mask[frames]
+        labels[row] = _worker_source.label(i)
+        if _worker_features is not None:
+            continue
+        clip = np.asarray(clip[frames])
+        if rng.random() < _worker_options["augment_prob"]:
+            clip = aug.augment_clip(clip, 1, rng, noise_scale=_worker_options["noise_scale"])[0]
+        keypoints[row] = clip
+    if _worker_features is not None:
+        keypoints = np.asarray(_worker_features[indices])
+    elif _worker_transform is not None:
+        keypoints = _worker_transform(keypoints, mask)
+    metrics.observe("augment_batch_ms", 1000 * (time.perf_counter() - start_time))
+    metrics.counter("augmented_samples", len(indices))
+    return keypoints, mask, labels
+
+class AugmentedLoader:
+    """
+    Iterable over augmented batches. Every epoch draws a new shuffled order and new augmentation
+    parameters per sample (a fresh k and K_BODY for every clip), seeded from seed, epoch and batch.
+    num_workers=0 builds batches in the calling process.
+    features names keypoint_features.FEATURES to yield instead of the keypoints; without augmentation
+    (augment_prob=0) and with a feature_cache directory they are computed once and read every epoch.
+    """
+
+    def __init__(self, source_path, batch_size=BATCH_SIZE, n_frames=K, num_workers=None, prefetch=PREFETCH,
+                 seed=0, shuffle=True, drop_last=False, augment_prob=1.0, noise_scale=1.0, features=None,
+                 feature_cache=None):
+        self.source_path = source_path
+        self.batch_size = batch_size
+        self.num_workers = os.cpu_count() if num_workers is None else num_workers
+        self.prefetch = prefetch
+        self.seed = seed
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.options = {"n_frames": n_frames, "augment_prob": augment_prob, "noise_scale": noise_scale,
+                        "features": list(features) if features else None}
+        if features and feature_cache and augment_prob == 0:
+            from .keypoint_features import FeatureTransform, FeatureCache
+            cache = FeatureCache(feature_cache)
+            transform = FeatureTransform(features, n_frames)
+            cache.get(source_path, transform)
+            self.options["feature_path"] = cache.path(cache.key(source_path, transform))
+        self.n_clips = len(open_source(source_path))
+        self.epoch = 0
+        self.pool = None
+
+    def __len__(self):
+        if self.drop_last:
+            return self.n_clips // self.batch_size
+        return -(-self.n_clips // self.batch_size)
+
+    def batches(self, epoch):
+        """(indices, seed) of every batch of one epoch."""
+
+        order = np.arange(self.n_clips)
+        if self.shuffle:
+            np.random.default_rng([self.seed, epoch]).shuffle(order)
+        for batch_index in range(len(self)):
+            indices = order[batch_index * self.batch_size:(batch_index + 1) * self.batch_size]
+            yield indices, batch_seed(self.seed, epoch, batch_index)
+
+    def _start(self):
+        if self.pool is None and self.num_workers > 0:
+            self.pool = Pool(self.num_workers, initializer=init_worker, initargs=(self.source_path, self.options))
+        elif self.num_workers == 0:
+            init_worker(self.source_path, self.options)
+
+    def __iter__(self):
+        """Yield the batches of the next epoch, keeping up to prefetch * num_workers batches in flight."""
+
+        self._start()
+        epoch = self.epoch
+        self.epoch += 1
+        if self.pool is None:
+            for indices, seed in self.batches(epoch):
+                yield build_batch(indices, seed)
+            return
+        pending = deque()
+        for indices, seed in self.batches(epoch):
+            pending.append(self.pool.apply_async(build_batch, (indices, seed)))
+            if len(pending) >= self.prefetch * self.num_workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure augmented batch throughput of a keypoint dataset.")
+    parser.add_argument("source", help="packed dataset directory or folder of dense clips")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=1)
+    args = parser.parse_args()
+
+    metrics.configure()
+    with AugmentedLoader(args.source, batch_size=args.batch_size, num_workers=args.workers) as loader:
+        for epoch in range(args.epochs):
+            start_time = time.time()
+            n_samples = 0
+            for keypoints, mask, labels in loader:
+                n_samples += len(labels)
+            elapsed = time.time() - start_time
+            print(f"Epoch {epoch}: {n_samples} samples in {elapsed:.2f}s ({n_samples / max(elapsed, 1e-9):.0f} samples/s), "
+                  f"batch shape {keypoints.shape}")
@@ -0,0 +1,166 @@
+"""
+Vectorized version of the create_point augmentation over dense (frames, N_LANDMARKS, 3) clips.
+
+Every landmark n except the right shoulder (pose 12) hangs off a parent landmark p, and
+create_point always moves n along the source bone p -> n:
+    out[n] = out[p] + k_n * (src[n] - src[p]) + noise_n
+Unrolling the chain, out[n] = out[root] + sum of (k_m * bone_m + noise_m) over the path root -> n,
+which is one product with the precomputed PATH matrix for all frames and copies at once.
+"""
+
+import os
+import numpy as np
+from . import keypoint_format as kf
+from .config import (N_LANDMARKS, N_HAND_LANDMARKS, N_POSE_LANDMARKS, LEFT_HAND_OFFSET, RIGHT_HAND_OFFSET,
+                    POSE_OFFSET, EPSILON_BODY, EPSILON_HAND_FINGER, EPSILON_EYE)
+
+K_RANGE = (0.8, 1.2)                                        # bone scale of the first frame (k in create_frame_0)
+K_BODY_RANGE = (0.85, 1.25)                                 # root displacement scale of later frames (K_BODY)
+EPSILON_ROOT = 0.01
+
+def _pose(i):
+    return POSE_OFFSET + i
+
+def _hand_parents(offset):
+    """Parent of every finger landmark: the finger chains plus the 0-5-9-13-17 palm."""
+
+    parents = {}
+    for i in range(1, N_HAND_LANDMARKS):
+        if i % 4 != 1 or i == 1:
+            parents[offset + i] = offset + i - 1
+        elif i == 5:
+            parents[offset + i] = offset
+        else:
+            parents[offset + i] = offset + i - 4
+    return parents
+
+def _build_parents():
+    """Kinematic tree of create_frame_0/create_frame_t as a parent index array (-1 for the root)."""
+
+    # (child, parent) in UPPER_BODY_CONNECTIONS positions: 15/16 are landmarks 23/24
+    pose_chain = [(14, 12), (11, 12), (13, 11), (16, 12), (15, 16), (10, 12), (9, 10), (0, 10),
+                  (1, 0), (2, 1), (3, 2), (7, 3), (4, 0), (5, 4), (6, 5), (8, 6)]
+    parents = np.full(N_LANDMARKS, -1, dtype=np.int64)
+    for child, parent in pose_chain:
+        parents[_pose(child)] = _pose(parent)
+    parents[LEFT_HAND_OFFSET] = _pose(13)
+    parents[RIGHT_HAND_OFFSET] = _pose(14)
+    for child, parent in {**_hand_parents(LEFT_HAND_OFFSET), **_hand_parents(RIGHT_HAND_OFFSET)}.items():
+        parents[child] = parent
+    return parents
+
+def _build_path(parents):
+    """PATH[n, m] = 1 when landmark m lies on the chain from the root (excluded) to n."""
+
+    path = np.zeros((N_LANDMARKS, N_LANDMARKS), dtype=np.float64)
+    for n in range(N_LANDMARKS):
+        m = n
+        while parents[m] >= 0:
+            path[n, m] = 1
+            m = parents[m]
+    return path
+
+ROOT = _pose(12)
+PARENTS = _build_parents()
+PATH = _build_path(PARENTS)
+# Source bone of every landmark; the root has no bone
+CHILD_IDX = np.flatnonzero(PARENTS >= 0)
+PARENT_IDX = PARENTS[CHILD_IDX]
+
+# Noise that propagates down the chain (drawn when a point is created)
+FIRST_FRAME_EPS = np.zeros(N_LANDMARKS)
+FIRST_FRAME_EPS[ROOT] = EPSILON_ROOT
+FIRST_FRAME_EPS[[_pose(14), _pose(11), _pose(13), LEFT_HAND_OFFSET, RIGHT_HAND_OFFSET]] = EPSILON_BODY
+FIRST_FRAME_EPS[LEFT_HAND_OFFSET + 1:LEFT_HAND_OFFSET + N_HAND_LANDMARKS] = EPSILON_HAND_FINGER
+FIRST_FRAME_EPS[RIGHT_HAND_OFFSET + 1:RIGHT_HAND_OFFSET + N_HAND_LANDMARKS] = EPSILON_HAND_FINGER
+NEXT_FRAME_EPS = np.zeros(N_LANDMARKS)
+NEXT_FRAME_EPS[LEFT_HAND_OFFSET + 2:LEFT_HAND_OFFSET + N_HAND_LANDMARKS] = EPSILON_HAND_FINGER
+NEXT_FRAME_EPS[RIGHT_HAND_OFFSET + 2:RIGHT_HAND_OFFSET + N_HAND_LANDMARKS] = EPSILON_HAND_FINGER
+# Noise added to the output pose only (face points get the smaller EPSILON_EYE)
+OUTPUT_EPS = np.zeros(N_LANDMARKS)
+OUTPUT_EPS[POSE_OFFSET:POSE_OFFSET + 11] = EPSILON_EYE
+OUTPUT_EPS[POSE_OFFSET + 11:POSE_OFFSET + N_POSE_LANDMARKS] = EPSILON_BODY
+
+def _bones(frames):
+    """Bone vectors src[n] - src[parent[n]] for every landmark (zero for the root)."""
+
+    bones = np.zeros_like(frames)
+    bones[..., CHILD_IDX, :] = frames[..., CHILD_IDX, :] - frames[..., PARENT_IDX, :]
+    return bones
+
+def augment_clip(keypoints, n_copies=1, rng=None, k_range=K_RANGE, k_body_range=K_BODY_RANGE, noise_scale=1.0):
+    """
+    Produce n_copies augmented versions of one dense clip in a single pass.
+    Equivalent to create_frame_0 for the first frame and create_frame_t for the others,
+    with a fresh k and K_BODY drawn per copy. Returns (n_copies, frames, N_LANDMARKS, 3) float32.
+    """
+
+    rng = np.random.default_rng(rng)
+    src = np.asarray(keypoints, dtype=np.float64).reshape(-1, N_LANDMARKS, 3)
+    n_frames = src.shape[0]
+    k = rng.uniform(*k_range, size=(n_copies, 1, 1))
+    k_body = rng.uniform(*k_body_range, size=(n_copies, 1, 1))
+    # noise[:, :, 0] propagates along the chain, noise[:, :, 1] only perturbs the output
+    noise = rng.uniform(-noise_scale, noise_scale, size=(n_copies, n_frames, 2, N_LANDMARKS, 2))
+    creation_eps = np.vstack([FIRST_FRAME_EPS, np.broadcast_to(NEXT_FRAME_EPS, (n_frames - 1, N_LANDMARKS))])
+    creation = noise[:, :, 0] * creation_eps[None, :, :, None]
+    output_noise = noise[:, :, 1] * OUTPUT_EPS[None, None, :, None]
+
+    xy = src[..., :2]
+    bones = _bones(src)[..., :2]
+    result = np.zeros((n_copies, n_frames, N_LANDMARKS, 3), dtype=np.float32)
+
+    # First frame: every bone scaled by the same k, chained from a jittered right shoulder
+    root_0 = xy[0, ROOT] + creation[:, 0, ROOT]
+    steps_0 = k * bones[0] + creation[:, 0]
+    frame_0 = root_0[:, None] + PATH @ steps_0 + output_noise[:, 0]
+    result[:, 0, :, :2] = frame_0
+    if n_frames == 1:
+        return result
+
+    # Later frames: bones keep the per-bone length ratio of frame_0 against the source first frame
+    length_src = np.linalg.norm(_bones(src[0]), axis=-1)
+    length_src[length_src == 0] = 1
+    length_aug = np.linalg.norm(_bones(frame_0), axis=-1)
+    bone_k = length_aug / length_src
+    root_t = frame_0[:, None, ROOT] + k_body * (xy[None, 1:, ROOT] - xy[0, ROOT])
+    steps_t = bone_k[:, None, :, None] * bones[None, 1:] + creation[:, 1:]
+    result[:, 1:, :, :2] = (root_t[:, :, None] + PATH @ steps_t
+                            + output_noise[:, 1:])
+    return result
+
+def augment_dir(input_dir, output_dir, n_copies=1, seed=0, noise_scale=1.0):
+    """
+    Write n_copies augmented versions of every dense clip under input_dir to output_dir as
+    <name>_aug<i>.npy, keeping the folder layout and the source presence mask. Returns the clips written.
+    """
+
+    rng = np.random.default_rng(seed)
+    n_written = 0
+    for root, _, files in sorted(os.walk(input_dir)):
+        for name in sorted(files):
+            if not kf.is_keypoint_file(name):
+                continue
+            keypoints, mask = kf.load_keypoints(os.path.join(root, name))
+            target_dir = os.path.join(output_dir, os.path.relpath(root, input_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            for i, copy in enumerate(augment_clip(keypoints, n_copies, rng, noise_scale=noise_scale)):
+                kf.save_keypoints(os.path.join(target_dir, f"{name[:-len('.npy')]}_aug{i}.npy"), copy, mask)
+                n_written += 1
+    return n_written
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Write augmented copies of a folder of dense keypoint clips.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--copies", type=int, default=1, help="augmented copies per clip")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--noise-scale", type=float, default=1.0)
+    args = parser.parse_args(argv)
+    n_written = augment_dir(args.input_dir, args.output_dir, args.copies, args.seed, args.noise_scale)
+    print(f"Wrote {n_written} augmented clips to {args.output_dir}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import argparse
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from . import metrics
+
+from . import create_numpy_data as cnd
+from . import keypoint_extract as md
+from . import keypoint_format as kf
+from .extraction_cache import ExtractionCache
+from .proxy_cache import ProxyCache, MJPG, FORMATS
+from . import frame_selection as fsel
+
+MIN_DETECTION_CONFIDENCE = 0.5
+MIN_TRACKING_CONFIDENCE = 0.5
+
+# One Holistic graph per worker process, created by init_worker
+_worker_model = None
+_worker_dense = True
+_worker_selector = "kmeans"
+_worker_sampling = None
+_worker_cache = None
+_worker_proxies = None
+
+def init_worker(min_detection_confidence=MIN_DETECTION_CONFIDENCE, min_tracking_confidence=MIN_TRACKING_CONFIDENCE,
+                dense=True, selector="kmeans", sampling=None, cache_dir=None, metrics_path=metrics.METRICS_PATH,
+                proxy_dir=None, proxy_format=MJPG):
+    """Create the Holistic graph (and extraction and proxy cache connections) owned by this worker process."""
+
+    global _worker_model, _worker_dense, _worker_selector, _worker_sampling, _worker_cache, _worker_proxies
+    _worker_dense = dense
+    _worker_selector = selector
+    _worker_sampling = sampling
+    _worker_cache = ExtractionCache(cache_dir) if cache_dir else None
+    _worker_proxies = ProxyCache(proxy_dir, fmt=proxy_format) if proxy_dir else None
+    # Pool workers leave through os._exit, so atexit never runs: flush metrics from a finalizer
+    metrics.configure(path=metrics_path)
+    Finalize(None, metrics.flush, exitpriority=10)
+    _worker_model = md.HolisticRunner(min_detection_confidence=min_detection_confidence,
+                                      min_tracking_confidence=min_tracking_confidence)
+
+def is_up_to_date(source_path, output_path):
+    """Check whether output file exists and is newer than its source video."""
+
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+
+def load_word_labels(metadata_path):
+    """Map video id to word label (keypoint_format.word_label) from metadata.jsonl records."""
+
+    labels = {}
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                labels[record["id"]] = kf.word_label(record)
+    return labels
+
+def collect_jobs(input_dir, output_dir, metadata_path=None, force=False):
+    """
+    List (source_path, output_dir, file_name) jobs for every video in input_dir.
+    With metadata_path, outputs go into one folder per word label (see keypoint_format.clip_path).
+    """
+
+    labels = load_word_labels(metadata_path) if metadata_path else {}
+    jobs = []
+    skipped = 0
+    for name in sorted(os.listdir(input_dir)):
+        if not name.endswith(".mp4"):
+            continue
+        video_id = os.path.splitext(name)[0]
+        source_path = os.path.join(input_dir, name)
+        output_path = kf.clip_path(output_dir, video_id, labels.get(video_id))
+        target_dir, file_name = os.path.split(output_path)
+        # Videos without a valid frame left an empty marker instead of a clip
+        if not force and (is_up_to_date(source_path, output_path) or
+                          is_up_to_date(source_path, kf.empty_path(output_path))):
+            skipped += 1
+            continue
+        os.makedirs(target_dir, exist_ok=True)
+        jobs.append((source_path, target_dir, file_name))
+    return jobs, skipped
+
+def repair_jobs(repair_path):
+    """Jobs of every clip a dataset_check repair list marks for re-extraction."""
+
+    from .dataset_check import load_repairs
+
+    jobs = []
+    for entry in load_repairs(repair_path)["reextract"]:
+        target_dir, file_name = os.path.split(entry["output_path"])
+        os.makedirs(target_dir, exist_ok=True)
+        jobs.append((entry["source_path"], target_dir, file_name))
+    return jobs
+
+def extract_one(job):
+    """Run write_data for one job with the worker's Holistic graph."""
+
+    source_path, output_dir, file_name = job
+    start_time = time.time()
+    before = dict(_worker_model.totals)
+    n_frames = cnd.write_data(output_dir, source_path, file_name, model=_worker_model, dense=_worker_dense,
+                              selector=_worker_selector, sampling=_worker_sampling, cache=_worker_cache,
+                              proxies=_worker_proxies)
+    stages = {stage: total - before[stage] for stage, total in _worker_model.totals.items()}
+    return source_path, n_frames, time.time() - start_time, stages
+
+def extract_all(jobs, num_workers=None, chunk_size=1,
+                min_detection_confidence=MIN_DETECTION_CONFIDENCE, min_tracking_confidence=MIN_TRACKING_CONFIDENCE,
+                dense=True, selector="kmeans", sampling=None, cache_dir=None, metrics_path=metrics.METRICS_PATH,
+                proxy_dir=None, proxy_format=MJPG):
+    """Spread extraction jobs across a process pool and report aggregate throughput."""
+
+    num_workers = num_workers or os.cpu_count()
+    total_frames = 0
+    stage_seconds = dict.fromkeys(md.HolisticRunner.STAGES, 0.0)
+    done = 0
+    start_time = time.time()
+    with Pool(processes=num_workers, initializer=init_worker,
+              initargs=(min_detection_confidence, min_tracking_confidence, dense, selector, sampling,
+                        cache_dir, metrics_path, proxy_dir, proxy_format)) as pool:
+        for source_path, n_frames, elapsed, stages in pool.imap_unordered(extract_one, jobs, chunksize=chunk_size):
+            done += 1
+            total_frames += n_frames
+            for stage, seconds in stages.items():
+                stage_seconds[stage] += seconds
+            print(f"[{done}/{len(jobs)}] {source_path}: {n_frames} frames in {elapsed:.2f}s")
+        # Let workers exit normally so their finalizers flush metrics
+        pool.close()
+        pool.join()
+
+    elapsed = time.time() - start_time
+    stats = {
+        "videos": done,
+        "frames": total_frames,
+        "seconds": elapsed,
+        "frames_per_sec": total_frames / elapsed if elapsed > 0 else 0.0,
+        "workers": num_workers,
+        "stage_ms_per_frame": {stage: 1000 * seconds / max(total_frames, 1) for stage, seconds in stage_seconds.items()},
+    }
+    print(f"Extracted {done} videos ({total_frames} frames) in {elapsed:.2f}s "
+          f"with {num_workers} workers: {stats['frames_per_sec']:.1f} frames/s")
+    print("Per frame: " + ", ".join(f"{stage} {ms:.2f} ms" for stage, ms in stats["stage_ms_per_frame"].items()))
+    return stats
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Extract keypoints from a directory of videos in parallel.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--metadata", default=None, help="metadata.jsonl used to group outputs by word")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="re-extract outputs that are up to date")
+    parser.add_argument("--legacy", action="store_true", help="write object-dtype .npy instead of dense float32")
+    parser.add_argument("--selector", default="kmeans", choices=sorted(fsel.SELECTORS),
+                        help="keyframe selection strategy")
+    parser.add_argument("--stride", type=int, default=1, help="run Holistic on every n-th frame only")
+    parser.add_argument("--target-fps", type=float, default=None, help="decimate frames down to this rate")
+    parser.add_argument("--max-side", type=int, default=None, help="downscale frames to this longer side")
+    parser.add_argument("--candidates", type=int, default=None,
+                        help="two-stage mode: infer only this many frames picked by a motion pass")
+    parser.add_argument("--cache", default=None, metavar="DIR",
+                        help="extraction cache directory, reruns only recompute what changed")
+    parser.add_argument("--metrics", default=metrics.METRICS_PATH, help="JSON-lines metrics output")
+    parser.add_argument("--proxies", default=None, metavar="DIR",
+                        help="proxy cache directory (see proxy_cache), videos are decoded from their proxies")
+    parser.add_argument("--proxy-format", choices=FORMATS, default=MJPG)
+    parser.add_argument("--repair", default=None, metavar="FILE",
+                        help="dataset_check repair list: extract only the clips it lists, even if up to date")
+    args = parser.parse_args(argv)
+
+    if args.repair:
+        jobs = repair_jobs(args.repair)
+        print(f"{len(jobs)} videos to extract again from {args.repair}.")
+    else:
+        jobs, skipped = collect_jobs(args.input_dir, args.output_dir, args.metadata, args.force)
+        print(f"{len(jobs)} videos to extract, {skipped} up to date.")
+    extract_all(jobs, num_workers=args.workers, chunk_size=args.chunk_size, dense=not args.legacy,
+                selector=args.selector,
+                sampling={"stride": args.stride, "target_fps": args.target_fps, "max_side": args.max_side,
+                          "n_candidates": args.candidates},
+                cache_dir=args.cache, metrics_path=args.metrics, proxy_dir=args.proxies,
+                proxy_format=args.proxy_format)
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,10 @@ N_LANDMARKS = N_POSE_LANDMARKS + N_HAND_LANDMARKS*2         # Total number of la
 K = 20
 EPSILON_BODY=0.005
 EPSILON_HAND_FINGER=0.003
-EPSILON_EYE=0.001
\ No newline at end of file
+EPSILON_EYE=0.001
+# Dense keypoint layout along the landmark axis: left hand, right hand, then upper pose (same order as concate_array)
+LEFT_HAND_OFFSET = 0
+RIGHT_HAND_OFFSET = LEFT_HAND_OFFSET + N_HAND_LANDMARKS
+POSE_OFFSET = RIGHT_HAND_OFFSET + N_HAND_LANDMARKS
+LEFT_HAND_PRESENT = 1                                       # Presence bitmask flags per frame
+RIGHT_HAND_PRESENT = 2
@@ -1,34 +1,146 @@
 import os
-import mediapipe as mp
 import cv2
-import MediaPipeProcess.keypoint_extract as md
+from contextlib import nullcontext
+from . import keypoint_extract as md
+from . import keypoint_format as kf
 import numpy as np
-from config import K
-from sklearn.cluster import KMeans
-from scipy.spatial.distance import cdist
+from . import metrics
+from .config import K, N_LANDMARKS
+from . import frame_selection as fsel
+from . import frame_sampling as fsam
 
-mp_holistic = mp.solutions.holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+_runner = None
 
-def get_list_frame(source_path):
-    """Extract keypoints sequences from one video."""
+def default_runner():
+    """Holistic graph shared by the calls that get no model, created on first use."""
+
+    global _runner
+    if _runner is None:
+        _runner = md.HolisticRunner()
+    return _runner
+
+def iter_frames(cap, model):
+    """Yield (left_hand, right_hand, pose) keypoints of each frame read from an opened capture."""
     
-    frames_keypoints = []
-    cap = cv2.VideoCapture(source_path)
-    while cap.isOpened():
-        # read video frame
-        success, image = cap.read()
-
-        # skip empty frames
-        if not success:
-            break
-        
+    model = md.as_runner(model)
+    for _, image in model.frames(cap):
         # MediaPipe Holistic processing
-        _, results = md.mediapipe_detection(image, mp_holistic)
-        pose_landmarks, left_hand_landmarks, right_hand_landmarks = md.extract_keypoints(results)
-        
-        frames_keypoints.append([left_hand_landmarks, right_hand_landmarks, pose_landmarks])
+        results = model.process(image)
+        pose_landmarks, left_hand_landmarks, right_hand_landmarks = model.extract(results)
+        yield left_hand_landmarks, right_hand_landmarks, pose_landmarks
+
+def get_list_frame(source_path, model=None):
+    """Extract keypoints sequences from one video."""
+    
+    model = md.as_runner(model or default_runner())
+    model.start_video()
+    cap = fsam.open_video(source_path)
+    frames_keypoints = [list(frame) for frame in iter_frames(cap, model)]
     cap.release()
     return frames_keypoints
+
+def get_valid_frames(source_path, model=None, stride=1, target_fps=None, max_side=None, n_candidates=None):
+    """
+    Stream the keypoints of one video into a preallocated float32 buffer, one
+    concate_array-layout row per frame, dropping frames where both hands are missing.
+    Frames can be decimated to every stride-th frame or to target_fps, downscaled to max_side
+    before inference, or limited to n_candidates picked by a cheap motion pass (see frame_sampling).
+    model is a Holistic graph or a HolisticRunner, which is reset before the first frame.
+    Return (X, n_frames) with X the (n_valid, N_LANDMARKS*3) filled part of the buffer and
+    n_frames the number of frames run through Holistic.
+    """
+    
+    model = md.as_runner(model or default_runner())
+    model.start_video()
+    cap, stride, frame_ids, capacity = open_sampled(source_path, stride, target_fps, n_candidates)
+    X = np.empty((capacity, N_LANDMARKS * 3), dtype=np.float32)
+    n_valid = 0
+    n_frames = 0
+    for _, image in model.frames(cap, stride, frame_ids):
+        n_frames += 1
+        results = model.process(fsam.downscale(image, max_side))
+        # Landmarks land in the next free row, which is only kept when a hand was detected
+        if model.extract_into(results, X[n_valid]):
+            n_valid += 1
+            if n_valid == len(X):
+                X = np.concatenate([X, np.empty_like(X)])
+    cap.release()
+    return X[:n_valid], n_frames
+
+def open_sampled(source_path, stride=1, target_fps=None, n_candidates=None):
+    """Open source_path and resolve its sampling: (cap, stride, frame_ids, buffer capacity)."""
+
+    cap = fsam.open_video(source_path)
+    stride = fsam.sampling_stride(cap, stride, target_fps)
+    frame_ids = None
+    if n_candidates:
+        frame_ids = fsam.motion_candidates(source_path, n_candidates, stride)
+    # Frame count from the container is an estimate, buffers grow if it is exceeded
+    capacity = len(frame_ids) if frame_ids is not None else int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) // stride
+    return cap, stride, frame_ids, max(capacity, 1) + 1
+
+def get_raw_frames(source_path, model=None, stride=1, target_fps=None, max_side=None, n_candidates=None):
+    """
+    Same sampling as get_valid_frames but keep every inferred frame with all Holistic landmarks
+    unfiltered (see keypoint_extract.extract_raw_into), for the extraction cache.
+    Return (raw, presence) with raw (n_frames, N_RAW_LANDMARKS, 4) and presence the hand bits of every frame.
+    """
+
+    model = md.as_runner(model or default_runner())
+    model.start_video()
+    cap, stride, frame_ids, capacity = open_sampled(source_path, stride, target_fps, n_candidates)
+    raw = np.empty((capacity, md.N_RAW_LANDMARKS, 4), dtype=np.float32)
+    presence = np.zeros(capacity, dtype=np.uint8)
+    n_frames = 0
+    for _, image in model.frames(cap, stride, frame_ids):
+        if n_frames == len(raw):
+            raw = np.concatenate([raw, np.empty_like(raw)])
+            presence = np.concatenate([presence, np.zeros_like(presence)])
+        results = model.process(fsam.downscale(image, max_side))
+        presence[n_frames] = model.extract_raw_into(results, raw[n_frames])
+        n_frames += 1
+    cap.release()
+    return raw[:n_frames], presence[:n_frames]
+
+def source_video(source_path, proxies=None):
+    """Context giving the path to decode: the leased proxy of source_path with a ProxyCache, else itself."""
+
+    return proxies.lease(source_path) if proxies else nullcontext(source_path)
+
+def cached_keyframes(cache, source_path, model=None, selector="kmeans", sampling=None, visibility_thres=0.5,
+                     proxies=None):
+    """
+    Keyframes of one video through the two-level extraction cache: derived keyframes are reused when
+    config.py, the selector and visibility_thres are unchanged, raw landmarks when only those changed,
+    and Holistic only runs on a full miss. Return (keyframes, n_frames) with n_frames the inferred frames.
+    With a proxy_cache.ProxyCache the proxy is decoded instead of the source and its settings join the key.
+    A graph whose settings are unknown (model.config is None, see as_runner) is run without the cache.
+    """
+
+    model = md.as_runner(model or default_runner())
+    raw_key = derived_key = None
+    if model.config is not None:
+        raw_key = cache.raw_key(source_path, model.config, sampling, proxies.settings() if proxies else None)
+        derived_key = cache.derived_key(raw_key, selector=selector, visibility_thres=visibility_thres)
+        keyframes = cache.get_derived(derived_key)
+        if keyframes is not None:
+            return keyframes, 0
+
+    n_frames = 0
+    cached = cache.get_raw(raw_key) if raw_key else None
+    if cached is None:
+        with source_video(source_path, proxies) as video_path:
+            cached = get_raw_frames(video_path, model, **(sampling or {}))
+        n_frames = len(cached[0])
+        if raw_key:
+            cache.put_raw(raw_key, *cached, source_path=source_path)
+    X = md.raw_to_rows(*cached, visibility_thres=visibility_thres)
+    if len(X) == 0:
+        return X, n_frames
+    keyframes = X[fsel.select_keyframes(X, K, selector)]
+    if derived_key:
+        cache.put_derived(derived_key, keyframes, source_path=source_path)
+    return keyframes, n_frames
     
 def concate_array(left_hand_landmarks, right_hand_landmarks, pose_landmarks):
     """ """
@@ -44,36 +156,55 @@ def check_zeros(list_landmarks):
         return True
     return False
     
-def write_data(output_dir, source_path, file_name):
-    """Write keypoints sequence into numpy file from original video."""
+def write_data(output_dir, source_path, file_name, model=None, dense=True, selector="kmeans", sampling=None,
+               cache=None, proxies=None):
+    """Write keypoints sequence into numpy file from original video.
+    
+    With dense=True the clip is saved as a (K, N_LANDMARKS, 3) float32 array plus a
+    hand presence bitmask (see keypoint_format); dense=False keeps the legacy object array.
+    selector names the keyframe strategy in frame_selection.SELECTORS ("kmeans" is the reference).
+    sampling holds get_valid_frames decimation arguments (stride, target_fps, max_side, n_candidates).
+    With an extraction_cache.ExtractionCache only changed stages are recomputed (see cached_keyframes).
+    With a proxy_cache.ProxyCache frames are decoded from the normalized proxy of the video.
+    A video without any valid frame leaves an empty marker (keypoint_format.empty_path) instead,
+    so incremental runs skip it until the video changes.
+    Return the number of inferred frames so batch drivers can report throughput.
+    """
     
-    try:
-        list_fr = get_list_frame(source_path)
-        X = []
-        list_idx = []
-        for i in range(len(list_fr)):
-            if check_zeros(list_fr[i][0]) and check_zeros(list_fr[i][1]):
-                continue
-            X.append(concate_array(list_fr[i][0], list_fr[i][1], list_fr[i][2]))
-            list_idx.append(i)
-        if len(X) == 0:
-            print("no valid frame to save in: " + source_path)
-            return
-        
-        # filtering frame
-        X_new = np.array(X)
-        kmeans = KMeans(n_clusters=K)
-        kmeans.fit(X_new)
-        cluster_centers = kmeans.cluster_centers_
-        distances = cdist(X_new, cluster_centers, 'euclidean')
-        nearest_indices = np.argmin(distances, axis=0)
-        index = np.sort(nearest_indices)
-        
-        data = []
-        for i in index:
-            data.append(list_fr[list_idx[i]])
-        data_save = np.asarray(data, dtype="object")
-        np.save(os.path.join(output_dir, file_name), data_save)
-        print("ok write npy from file: " + source_path) 
-    except Exception as e:
-        print(f"error write: {source_path} with {e}")
\ No newline at end of file
+    output_path = os.path.join(output_dir, file_name)
+    n_frames = 0
+    with metrics.span("extract_video") as span:
+        span["video"] = source_path
+        try:
+            if cache is not None:
+                keyframes, n_frames = cached_keyframes(cache, source_path, model, selector, sampling,
+                                                       proxies=proxies)
+            else:
+                with source_video(source_path, proxies) as video_path:
+                    X_new, n_frames = get_valid_frames(video_path, model, **(sampling or {}))
+                # filtering frame
+                keyframes = X_new[fsel.select_keyframes(X_new, K, selector)] if len(X_new) else X_new
+            span["frames"] = n_frames
+            if len(keyframes) == 0:
+                print("no valid frame to save in: " + source_path)
+                open(kf.empty_path(output_path), "w").close()
+                metrics.counter("videos_empty")
+                span["status"] = "empty"
+                return n_frames
+            
+            if dense:
+                kf.save_keypoints(output_path, keyframes)
+            else:
+                data = kf.array_to_frames(keyframes.reshape(-1, N_LANDMARKS, 3))
+                data_save = np.asarray(data, dtype="object")
+                np.save(output_path, data_save)
+            if os.path.exists(kf.empty_path(output_path)):
+                os.remove(kf.empty_path(output_path))
+            print("ok write npy from file: " + source_path) 
+            metrics.counter("videos_written")
+        except Exception as e:
+            print(f"error write: {source_path} with {e}")
+            metrics.counter("videos_failed", error=type(e).__name__)
+            span["status"] = "error"
+            span["error"] = f"{type(e).__name__}: {e}"
+    return n_frames
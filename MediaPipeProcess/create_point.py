@@ -1,16 +1,18 @@
-from config import N_HAND_LANDMARKS, N_POSE_LANDMARKS, EPSILON_BODY, EPSILON_HAND_FINGER, EPSILON_EYE
+from .config import N_HAND_LANDMARKS, N_POSE_LANDMARKS, EPSILON_BODY, EPSILON_HAND_FINGER, EPSILON_EYE
+from .augmentation import K_RANGE, K_BODY_RANGE
 import random
 import numpy as np
 
-K_BODY = random.uniform(0.85, 1.25)
-K_FINGER = 0.9*K_BODY
+# Augmentation parameters are drawn per clip by the caller (see augment_frames), never at import:
+# k scales the bones of the first frame, k_body the root displacement of the later frames.
+# rng is any object with a uniform method, the random module by default.
 
-def create_noise_point(point, eps):
+def create_noise_point(point, eps, rng=random):
     """Create new point displaced any epsilon from the origin point."""
     
     x, y, z = tuple(point)
-    ex = random.uniform(-eps, eps)
-    ey = random.uniform(-eps, eps)
+    ex = rng.uniform(-eps, eps)
+    ey = rng.uniform(-eps, eps)
     # ez = random.uniform(-0.5, 0.5)
     return [x + ex, y + ey, 0]
 
@@ -40,8 +42,8 @@ def calculate_k(A1, B1, M1, N1):
     k1 = h1 / d1
     return k1
 
-def calculate_start_point(A1, B1, A2, B2, M1, N1):
-    k0 = K_BODY
+def calculate_start_point(A1, B1, A2, B2, M1, N1, k_body):
+    k0 = k_body
     M2 = create_point_by_k(A1, A2, M1, k0)
     k1 = calculate_k(A1, B1, M1, N1)
     N2 = create_point_by_k(A2, B2, M2, k1)
@@ -52,10 +54,10 @@ def create_next_point(A1, B1, A2, B2, M1, N1, M2):
     N2 = create_point_by_k(A2, B2, M2, k1)
     return N2
 
-def create_frame_0(list_frames_keypoints):
+def create_frame_0(list_frames_keypoints, k=None, rng=random):
     """
     Choose right_shoulder as the main point to generate other points.
-    k: the global body transformation rate.
+    k: the global body transformation rate, drawn from K_RANGE when not given.
     """
     
     right_hand_result = []
@@ -67,56 +69,57 @@ def create_frame_0(list_frames_keypoints):
     # start_frame[1]: right_hand_landmarks
     # start_frame[2]: pose_landmarks
     
-    point_12 = create_noise_point(start_frame[2][12], 0.01)
-    k =  random.uniform(0.8, 1.2)
+    point_12 = create_noise_point(start_frame[2][12], 0.01, rng)
+    if k is None:
+        k = rng.uniform(*K_RANGE)
     point_14 = create_point_by_k(start_frame[2][12], start_frame[2][14], point_12, k)
-    point_14 = create_noise_point(point_14, EPSILON_BODY)
+    point_14 = create_noise_point(point_14, EPSILON_BODY, rng)
     point_16 = create_point_by_k(start_frame[2][14], start_frame[1][0], point_14, k)
-    point_16 = create_noise_point(point_16, EPSILON_BODY)
+    point_16 = create_noise_point(point_16, EPSILON_BODY, rng)
     point_1_r = create_point_by_k(start_frame[1][0], start_frame[1][1], point_16, k)
-    point_1_r = create_noise_point(point_1_r, EPSILON_HAND_FINGER)
+    point_1_r = create_noise_point(point_1_r, EPSILON_HAND_FINGER, rng)
     right_hand_result.append(point_16)
     right_hand_result.append(point_1_r)
     for i in range(2, 21):
         if i % 4 != 1:
             point_r = create_point_by_k(start_frame[1][i-1], start_frame[1][i], right_hand_result[i-1], k)
-            point_r = create_noise_point(point_r, EPSILON_HAND_FINGER)
+            point_r = create_noise_point(point_r, EPSILON_HAND_FINGER, rng)
             right_hand_result.append(point_r)
         else:
             if i == 5:
                 point_5_r = create_point_by_k(start_frame[1][0], start_frame[1][5], right_hand_result[0], k)
-                point_5_r = create_noise_point(point_5_r, EPSILON_HAND_FINGER)
+                point_5_r = create_noise_point(point_5_r, EPSILON_HAND_FINGER, rng)
                 right_hand_result.append(point_5_r)
             else:
                 point_r = create_point_by_k(start_frame[1][i-4], start_frame[1][i], right_hand_result[i-4], k)
-                point_r = create_noise_point(point_r, EPSILON_HAND_FINGER)
+                point_r = create_noise_point(point_r, EPSILON_HAND_FINGER, rng)
                 right_hand_result.append(point_r)
     
     # 11 - left_shoulder, 13 - left_elbow 
     point_11 = create_point_by_k(start_frame[2][12], start_frame[2][11], point_12, k)
-    point_11 = create_noise_point(point_11, EPSILON_BODY)
+    point_11 = create_noise_point(point_11, EPSILON_BODY, rng)
     point_13 = create_point_by_k(start_frame[2][11], start_frame[2][13], point_11, k)
-    point_13 = create_noise_point(point_13, EPSILON_BODY)
+    point_13 = create_noise_point(point_13, EPSILON_BODY, rng)
     # 15 - left_wrist
     point_15 = create_point_by_k(start_frame[2][13], start_frame[0][0], point_13, k)
-    point_15 = create_noise_point(point_15, EPSILON_BODY)
+    point_15 = create_noise_point(point_15, EPSILON_BODY, rng)
     point_1_l = create_point_by_k(start_frame[0][0], start_frame[0][1], point_15, k)
-    point_1_l = create_noise_point(point_1_l, EPSILON_HAND_FINGER)
+    point_1_l = create_noise_point(point_1_l, EPSILON_HAND_FINGER, rng)
     left_hand_result.append(point_15)
     left_hand_result.append(point_1_l)
     for i in range(2, 21):
         if i % 4 != 1:
             point_l = create_point_by_k(start_frame[0][i - 1], start_frame[0][i], left_hand_result[i - 1], k)
-            point_l = create_noise_point(point_l, EPSILON_HAND_FINGER)
+            point_l = create_noise_point(point_l, EPSILON_HAND_FINGER, rng)
             left_hand_result.append(point_l)
         else:
             if i == 5:
                 point_5_l = create_point_by_k(start_frame[0][0], start_frame[0][5], left_hand_result[0], k)
-                point_5_l = create_noise_point(point_5_l, EPSILON_HAND_FINGER)
+                point_5_l = create_noise_point(point_5_l, EPSILON_HAND_FINGER, rng)
                 left_hand_result.append(point_5_l)
             else:
                 point_l = create_point_by_k(start_frame[0][i - 4], start_frame[0][i], left_hand_result[i - 4], k)
-                point_l = create_noise_point(point_l, EPSILON_HAND_FINGER)
+                point_l = create_noise_point(point_l, EPSILON_HAND_FINGER, rng)
                 left_hand_result.append(point_l)
     
     point_24 = create_point_by_k(start_frame[2][12], start_frame[2][16], point_12, k)
@@ -142,14 +145,19 @@ def create_frame_0(list_frames_keypoints):
 
     for i in range(0, 17):
         if i < 11:
-            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_EYE)
+            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_EYE, rng)
         else:
-            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_BODY)
+            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_BODY, rng)
             
     frame_0 = [left_hand_result, right_hand_result, pose_result]
     return frame_0
     
-def create_frame_t(t, list_frames_keypoints, frame_start):
+def create_frame_t(t, list_frames_keypoints, frame_start, k_body, rng=random):
+    """
+    Frame t of an augmented copy started by frame_start.
+    k_body: the root displacement rate, drawn once per copy and shared by all its frames (see augment_frames).
+    """
+
     pose_result = [[0, 0, 0]] * N_POSE_LANDMARKS
     right_hand_result = []
     left_hand_result = []
@@ -157,7 +165,7 @@ def create_frame_t(t, list_frames_keypoints, frame_start):
     frame_0 = list_frames_keypoints[0]  # A1B1
     
     point_12, point_14 = calculate_start_point(frame_0[2][12], frame_0[2][14], frame_current[2][12],
-                                               frame_current[2][14], frame_start[2][12], frame_start[2][14])
+                                               frame_current[2][14], frame_start[2][12], frame_start[2][14], k_body)
     point_16 = create_next_point(frame_0[2][14], frame_0[1][0], frame_current[2][14], frame_current[1][0],
                                  frame_start[2][14], frame_start[1][0], point_14)
     point_11 = create_next_point(frame_0[2][12], frame_0[2][11], frame_current[2][12], frame_current[2][11],
@@ -198,9 +206,9 @@ def create_frame_t(t, list_frames_keypoints, frame_start):
     
     for i in range(0, 17):
         if i < 11:
-            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_EYE)
+            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_EYE, rng)
         else:
-            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_BODY)
+            pose_result[i] = create_noise_point(list_pose_points[i], EPSILON_BODY, rng)
     
     left_hand_result.append(point_15)
     point_1_l = create_next_point(frame_0[0][0], frame_0[0][1], frame_current[0][0], frame_current[0][1],
@@ -211,19 +219,19 @@ def create_frame_t(t, list_frames_keypoints, frame_start):
             point_l = create_next_point(frame_0[0][i - 1], frame_0[0][i], frame_current[0][i - 1], frame_current[0][i],
                                         frame_start[0][i - 1], frame_start[0][i],
                                         left_hand_result[i - 1])
-            point_l = create_noise_point(point_l, EPSILON_HAND_FINGER)
+            point_l = create_noise_point(point_l, EPSILON_HAND_FINGER, rng)
             left_hand_result.append(point_l)
         else:
             if i == 5:
                 point_5_l = create_next_point(frame_0[0][0], frame_0[0][5], frame_current[0][0], frame_current[0][5],
                                               frame_start[0][0], frame_start[0][5], left_hand_result[0])
-                point_5_l = create_noise_point(point_5_l, EPSILON_HAND_FINGER)
+                point_5_l = create_noise_point(point_5_l, EPSILON_HAND_FINGER, rng)
                 left_hand_result.append(point_5_l)
             else:
                 point_l = create_next_point(frame_0[0][i - 4], frame_0[0][i], frame_current[0][i - 4],
                                             frame_current[0][i],
                                             frame_start[0][i - 4], frame_start[0][i], left_hand_result[i - 4])
-                point_l = create_noise_point(point_l, EPSILON_HAND_FINGER)
+                point_l = create_noise_point(point_l, EPSILON_HAND_FINGER, rng)
                 left_hand_result.append(point_l)
                 
     right_hand_result.append(point_16)
@@ -235,19 +243,28 @@ def create_frame_t(t, list_frames_keypoints, frame_start):
             point_r = create_next_point(frame_0[1][i - 1], frame_0[1][i], frame_current[1][i - 1], frame_current[1][i],
                                         frame_start[1][i - 1], frame_start[1][i],
                                         right_hand_result[i - 1])
-            point_r = create_noise_point(point_r, EPSILON_HAND_FINGER)
+            point_r = create_noise_point(point_r, EPSILON_HAND_FINGER, rng)
             right_hand_result.append(point_r)
         else:
             if i == 5:
                 point_5_r = create_next_point(frame_0[1][0], frame_0[1][5], frame_current[1][0], frame_current[1][5],
                                               frame_start[1][0], frame_start[1][5], right_hand_result[0])
-                point_5_r = create_noise_point(point_5_r, EPSILON_HAND_FINGER)
+                point_5_r = create_noise_point(point_5_r, EPSILON_HAND_FINGER, rng)
                 right_hand_result.append(point_5_r)
             else:
                 point_r = create_next_point(frame_0[1][i - 4], frame_0[1][i], frame_current[1][i - 4],
                                             frame_current[1][i],
                                             frame_start[1][i - 4], frame_start[1][i], right_hand_result[i - 4])
-                point_r = create_noise_point(point_r, EPSILON_HAND_FINGER)
+                point_r = create_noise_point(point_r, EPSILON_HAND_FINGER, rng)
                 right_hand_result.append(point_r)
                 
-    return [left_hand_result, right_hand_result, pose_result]
\ No newline at end of file
+    return [left_hand_result, right_hand_result, pose_result]
+
+def augment_frames(list_frames_keypoints, rng=None):
+    """One augmented copy of a clip: k and k_body are drawn once from rng and shared by all its frames."""
+
+    rng = rng or random.Random()
+    k_body = rng.uniform(*K_BODY_RANGE)
+    frame_0 = create_frame_0(list_frames_keypoints, rng=rng)
+    return [frame_0] + [create_frame_t(t, list_frames_keypoints, frame_0, k_body, rng)
+                        for t in range(1, len(list_frames_keypoints))]
@@ -0,0 +1,399 @@
+"""
+Integrity check of a crawled and extracted dataset: videos, metadata.jsonl and keypoint clips.
+Every file is measured once by a process pool (size, sha256, an OpenCV header probe with a read
+of the first and last frame, or the shape of a keypoint clip) and its measurements are kept in an
+SQLite manifest keyed by path, size and mtime, so re-verifying only measures what changed.
+Measurements are then checked against the metadata, the crawl state (recorded size and checksum)
+and optionally the Content-Length of every video url. The result is a repair list: videos to
+download again (data_crawling.apply_repairs) and clips to extract again (batch_extract --repair).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import numpy as np
+import cv2
+from . import keypoint_format as kf
+from .extraction_cache import file_sha256
+from .config import K, N_LANDMARKS
+
+VIDEO_DIR = "dataset/videos"
+METADATA_PATH = "dataset/metadata.jsonl"
+STATE_PATH = "dataset/crawl_state.sqlite"                   # crawl_state.STATE_PATH
+MANIFEST_PATH = "dataset/manifest.sqlite"
+REPAIR_PATH = "dataset/repair.json"
+PART_SUFFIX = ".part"                                       # downloader.PART_SUFFIX
+MIN_DURATION = 0.2                                          # seconds, a dictionary sign is never shorter
+MAX_DURATION = 60.0
+HEAD_WORKERS = 8
+CHECK_VERSION = 1                                           # bump when the measurements change
+VIDEO = "video"
+KEYPOINTS = "keypoints"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    kind TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    version INTEGER,
+    facts TEXT,
+    checked_at REAL
+);
+"""
+
+def probe_video(path):
+    """Hash of a video and what OpenCV reads of it: header, frame count, first and last frame."""
+
+    facts = {"sha256": file_sha256(path)}
+    cap = cv2.VideoCapture(path)
+    facts["opened"] = cap.isOpened()
+    if facts["opened"]:
+        facts["frames"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        facts["fps"] = cap.get(cv2.CAP_PROP_FPS)
+        facts["first_frame"] = cap.read()[0]
+        # A truncated download keeps its header but loses the end of the stream
+        if facts["frames"] > 1:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, facts["frames"] - 1)
+        facts["last_frame"] = cap.read()[0] if facts["frames"] > 1 else facts["first_frame"]
+    cap.release()
+    return facts
+
+def probe_keypoints(path):
+    """Shape, dtype and finiteness of a dense keypoint clip and the length of its mask."""
+
+    try:
+        keypoints, mask = kf.load_keypoints(path)
+        return {"shape": list(keypoints.shape), "dtype": str(keypoints.dtype),
+                "finite": bool(np.isfinite(keypoints).all()), "mask_frames": len(mask),
+                "has_mask": os.path.exists(kf.mask_path(path))}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+PROBES = {VIDEO: probe_video, KEYPOINTS: probe_keypoints}
+
+def check_file(job):
+    """Measure one (kind, path) in a worker process; returns (kind, path, size, mtime_ns, facts)."""
+
+    kind, path = job
+    stat = os.stat(path)
+    try:
+        facts = PROBES[kind](path)
+    except Exception as e:
+        facts = {"error": f"{type(e).__name__}: {e}"}
+    return kind, path, stat.st_size, stat.st_mtime_ns, facts
+
+class Manifest:
+    """Measurements of every checked file, reused while its size and mtime are unchanged."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def entries(self):
+        """{path: (size, mtime_ns, version, facts)} of every file in the manifest."""
+
+        rows = self.conn.execute("SELECT path, size, mtime_ns, version, facts FROM files").fetchall()
+        return {path: (size, mtime_ns, version, json.loads(facts)) for path, size, mtime_ns, version, facts in rows}
+
+    def put(self, kind, path, size, mtime_ns, facts):
+        self.conn.execute("INSERT OR REPLACE INTO files(path, kind, size, mtime_ns, version, facts, checked_at) "
+                          "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (path, kind, size, mtime_ns, CHECK_VERSION, json.dumps(facts), time.time()))
+
+    def prune(self):
+        """Forget files that are no longer on disk."""
+
+        gone = [path for path, in self.conn.execute("SELECT path FROM files") if not os.path.exists(path)]
+        self.conn.executemany("DELETE FROM files WHERE path=?", [(path,) for path in gone])
+        self.conn.commit()
+        return len(gone)
+
+def measure(files, manifest, num_workers=None, chunk_size=4):
+    """
+    {path: (size, mtime_ns, facts)} of every (kind, path) in files, probing only those that are new
+    or changed since the manifest saw them. Returns (measurements, number of files probed).
+    """
+
+    from multiprocessing import Pool
+
+    known = manifest.entries()
+    measurements = {}
+    jobs = []
+    for kind, path in files:
+        stat = os.stat(path)
+        entry = known.get(path)
+        if entry and entry[:3] == (stat.st_size, stat.st_mtime_ns, CHECK_VERSION):
+            measurements[path] = (stat.st_size, stat.st_mtime_ns, entry[3])
+        else:
+            jobs.append((kind, path))
+    if jobs:
+        with Pool(min(num_workers or os.cpu_count(), len(jobs))) as pool:
+            for done, (kind, path, size, mtime_ns, facts) in enumerate(
+                    pool.imap_unordered(check_file, jobs, chunksize=chunk_size), 1):
+                manifest.put(kind, path, size, mtime_ns, facts)
+                measurements[path] = (size, mtime_ns, facts)
+                if done % 500 == 0:
+                    manifest.conn.commit()
+                    print(f"[{done}/{len(jobs)}] files measured")
+    manifest.conn.commit()
+    manifest.prune()
+    return measurements, len(jobs)
+
+def read_metadata(metadata_path):
+    """(records by id, malformed line numbers, {id: line numbers} of ids on more than one line)."""
+
+    records, lines, malformed = {}, {}, []
+    if not os.path.exists(metadata_path):
+        return records, malformed, {}
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                video_id = record["id"]
+            except (ValueError, KeyError, TypeError):
+                malformed.append(line_num)
+                continue
+            # Last record wins, like batch_extract.load_word_labels
+            records[video_id] = record
+            lines.setdefault(video_id, []).append(line_num)
+    return records, malformed, {video_id: nums for video_id, nums in lines.items() if len(nums) > 1}
+
+def read_state(state_path):
+    """{id: {url, size, checksum, status}} from the crawl state, empty when there is none."""
+
+    if not state_path or not os.path.exists(state_path):
+        return {}
+    conn = sqlite3.connect(f"file:{os.path.abspath(state_path)}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT id, url, size, checksum, status FROM videos").fetchall()
+    finally:
+        conn.close()
+    return {video_id: {"url": url, "size": size, "checksum": checksum, "status": status}
+            for video_id, url, size, checksum, status in rows}
+
+def remote_sizes(urls, workers=HEAD_WORKERS, timeout=10):
+    """{url: Content-Length} from HEAD requests over one pooled session; urls that fail are left out."""
+
+    import requests
+    from requests.adapters import HTTPAdapter
+    from concurrent.futures import ThreadPoolExecutor
+
+    session = requests.Session()
+    session.verify = False
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def head(url):
+        try:
+            response = session.head(url, allow_redirects=True, timeout=timeout)
+            response.raise_for_status()
+            length = response.headers.get("content-length")
+            return url, int(length) if length else None
+        except Exception as e:
+            print(f"error head: {url} with {e}")
+            return url, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sizes = {url: size for url, size in executor.map(head, urls) if size is not None}
+    session.close()
+    return sizes
+
+def video_problems(size, facts, recorded=None, remote_size=None):
+    """Reasons a measured video must be downloaded again (empty when it is fine)."""
+
+    if "error" in facts:
+        return ["error: " + facts["error"]]
+    problems = []
+    if recorded and recorded.get("size") is not None and recorded["size"] != size:
+        problems.append(f"size {size} != recorded {recorded['size']}")
+    elif recorded and recorded.get("checksum") and recorded["checksum"] != facts["sha256"]:
+        problems.append("sha256 differs from the recorded checksum")
+    if remote_size is not None and remote_size != size:
+        problems.append(f"size {size} != content-length {remote_size}")
+    if not facts["opened"]:
+        return problems + ["cannot be opened"]
+    if facts["frames"] <= 0 or not facts["fps"]:
+        return problems + ["no frame count or fps in the header"]
+    if not facts["first_frame"]:
+        problems.append("first frame cannot be decoded")
+    elif not facts["last_frame"]:
+        problems.append("last frame cannot be decoded (truncated)")
+    duration = facts["frames"] / facts["fps"]
+    if not MIN_DURATION <= duration <= MAX_DURATION:
+        problems.append(f"duration {duration:.2f}s outside [{MIN_DURATION}, {MAX_DURATION}]")
+    return problems
+
+def keypoint_problems(facts, mtime_ns, source_mtime_ns):
+    """Reasons a keypoint clip must be extracted again (empty when it is fine)."""
+
+    if "error" in facts:
+        return ["unreadable: " + facts["error"]]
+    problems = []
+    if facts["shape"] != [K, N_LANDMARKS, 3]:
+        problems.append(f"shape {tuple(facts['shape'])} != {(K, N_LANDMARKS, 3)}")
+    if facts["dtype"] != "float32":
+        problems.append(f"dtype {facts['dtype']}")
+    if not facts["finite"]:
+        problems.append("non-finite values")
+    if not facts["has_mask"] or facts["mask_frames"] != facts["shape"][0]:
+        problems.append("missing or mismatched presence mask")
+    if mtime_ns < source_mtime_ns:
+        problems.append("older than its video")
+    return problems
+
+def verify_dataset(video_dir=VIDEO_DIR, metadata_path=METADATA_PATH, keypoints_dir=None, state_path=STATE_PATH,
+                   manifest_path=MANIFEST_PATH, num_workers=None, head=False):
+    """Check videos, metadata and (with keypoints_dir) keypoint clips; return the repair list."""
+
+    start_time = time.time()
+    # Manifest entries are keyed by absolute path, so runs from another directory reuse them
+    video_dir = os.path.abspath(video_dir)
+    keypoints_dir = os.path.abspath(keypoints_dir) if keypoints_dir else None
+    records, malformed, duplicates = read_metadata(metadata_path)
+    # Reported on their own: their clips are written flat and cannot be labelled
+    without_word = sorted(video_id for video_id, record in records.items() if kf.word_label(record) is None)
+    state = read_state(state_path)
+    names = sorted(os.listdir(video_dir)) if os.path.isdir(video_dir) else []
+    videos = {os.path.splitext(name)[0]: os.path.join(video_dir, name) for name in names if name.endswith(".mp4")}
+    partial = {name[:-len(".mp4" + PART_SUFFIX)] for name in names if name.endswith(".mp4" + PART_SUFFIX)}
+
+    files = [(VIDEO, path) for path in videos.values()]
+    outputs = {}
+    if keypoints_dir:
+        # Same layout as batch_extract.collect_jobs writes
+        outputs = {video_id: kf.clip_path(keypoints_dir, video_id, kf.word_label(records.get(video_id)))
+                   for video_id in videos}
+        files += [(KEYPOINTS, path) for path in outputs.values() if os.path.exists(path)]
+    with Manifest(manifest_path) as manifest:
+        measurements, n_probed = measure(files, manifest, num_workers)
+    sizes = {}
+    if head:
+        urls = [state[video_id]["url"] for video_id in videos if state.get(video_id, {}).get("url")]
+        sizes = remote_sizes(urls)
+
+    redownload = {}
+    def add_redownload(video_id, reasons):
+        record = records.get(video_id, {})
+        entry = redownload.setdefault(video_id, {"id": video_id, "word": kf.word_label(record),
+                                                 "url": state.get(video_id, {}).get("url"), "reasons": []})
+        entry["reasons"] += reasons
+
+    for video_id, path in videos.items():
+        size, _, facts = measurements[path]
+        recorded = state.get(video_id)
+        problems = video_problems(size, facts, recorded, sizes.get((recorded or {}).get("url")))
+        if problems:
+            add_redownload(video_id, problems)
+    for video_id in sorted(set(records) - set(videos)):
+        add_redownload(video_id, ["in metadata but not downloaded"])
+    for video_id in sorted(partial - set(videos)):
+        add_redownload(video_id, ["only a partial download"])
+
+    reextract = []
+    n_empty = 0
+    for video_id, output_path in outputs.items():
+        if video_id in redownload:
+            continue
+        if not os.path.exists(output_path):
+            empty_path = kf.empty_path(output_path)
+            if os.path.exists(empty_path) and os.stat(empty_path).st_mtime_ns >= measurements[videos[video_id]][1]:
+                # Extracted already, without any frame with a hand
+                n_empty += 1
+                continue
+            problems = ["no keypoint output"]
+        else:
+            _, mtime_ns, facts = measurements[output_path]
+            problems = keypoint_problems(facts, mtime_ns, measurements[videos[video_id]][1])
+        if problems:
+            reextract.append({"id": video_id, "source_path": videos[video_id], "output_path": output_path,
+                              "reasons": problems})
+
+    report = {
+        "created_at": time.time(),
+        "video_dir": video_dir,
+        "keypoints_dir": keypoints_dir,
+        "redownload": list(redownload.values()),
+        "reextract": reextract,
+        "metadata": {
+            "malformed_lines": malformed,
+            "duplicate_ids": duplicates,
+            "videos_without_record": sorted(set(videos) - set(records)),
+            "records_without_word": without_word,
+        },
+        "summary": {
+            "videos": len(videos),
+            "records": len(records),
+            "keypoint_files": sum(os.path.exists(path) for path in outputs.values()),
+            "empty_videos": n_empty,
+            "files_probed": n_probed,
+            "files_reused": len(files) - n_probed,
+            "redownload": len(redownload),
+            "reextract": len(reextract),
+            "duplicate_ids": len(duplicates),
+            "malformed_lines": len(malformed),
+            "records_without_word": len(without_word),
+            "seconds": time.time() - start_time,
+        },
+    }
+    return report
+
+def save_repairs(report, path=REPAIR_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+def load_repairs(path=REPAIR_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Verify videos, metadata and keypoint clips and "
+                                                            "write a repair list.")
+    parser.add_argument("--videos", default=VIDEO_DIR)
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--keypoints", default=None, help="batch_extract output directory to verify")
+    parser.add_argument("--state", default=STATE_PATH, help="crawl state with the recorded sizes and checksums")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--output", default=REPAIR_PATH, help="repair list written as JSON")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--head", action="store_true", help="compare sizes with the Content-Length of every url")
+    args = parser.parse_args(argv)
+
+    report = verify_dataset(args.videos, args.metadata, args.keypoints, args.state, args.manifest, args.workers,
+                            args.head)
+    save_repairs(report, args.output)
+    for entry in report["redownload"]:
+        print(f"redownload {entry['id']}: {'; '.join(entry['reasons'])}")
+    for entry in report["reextract"]:
+        print(f"reextract {entry['id']}: {'; '.join(entry['reasons'])}")
+    for video_id, line_nums in report["metadata"]["duplicate_ids"].items():
+        print(f"duplicate metadata id {video_id} on lines {line_nums}")
+    for video_id in report["metadata"]["records_without_word"]:
+        print(f"metadata record {video_id} has no word")
+    print(json.dumps(report["summary"], indent=2))
+    print(f"Repair list written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Two-level on-disk cache for keypoint extraction. Level "raw" holds every Holistic landmark
+of the inferred frames, keyed by the video content hash, the MediaPipe settings and the frame
+sampling. Level "derived" holds the selected keyframes, keyed by the raw key plus the values
+of config.py and the selection parameters. Changing K, UPPER_BODY_CONNECTIONS or the
+selector only recomputes the cheap derived level. Each level is bounded in bytes and
+evicted least recently used first.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import zipfile
+import numpy as np
+from . import config
+
+CACHE_DIR = "dataset/extraction_cache"
+RAW_MAX_BYTES = 20 * 1024**3
+DERIVED_MAX_BYTES = 2 * 1024**3
+RAW = "raw"
+DERIVED = "derived"
+FORMAT_VERSION = 1                                          # bump when the stored layout changes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    level TEXT,
+    source TEXT,
+    size INTEGER,
+    last_access REAL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries(level, last_access);
+CREATE INDEX IF NOT EXISTS entries_source ON entries(source);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    sha256 TEXT
+);
+"""
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024*1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cached_sha256(conn, path):
+    """Content hash of a file, recomputed only when its size or mtime changed (conn holds the hashes table)."""
+
+    stat = os.stat(path)
+    path = os.path.abspath(path)
+    row = conn.execute("SELECT size, mtime, sha256 FROM hashes WHERE path=?", (path,)).fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+        return row[2]
+    sha256 = file_sha256(path)
+    conn.execute("INSERT OR REPLACE INTO hashes(path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                 (path, stat.st_size, stat.st_mtime, sha256))
+    conn.commit()
+    return sha256
+
+def fingerprint(*values):
+    """Stable hash of JSON-serialisable values."""
+
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def config_values():
+    """Every upper-case setting of config.py, so editing any of them invalidates derived outputs."""
+
+    return {name: getattr(config, name) for name in dir(config) if name.isupper()}
+
+def normalize_sampling(sampling=None):
+    """get_valid_frames sampling arguments with defaults filled in, so equal samplings share a key."""
+
+    return {"stride": 1, "target_fps": None, "max_side": None, "n_candidates": None, **(sampling or {})}
+
+class ExtractionCache:
+    """Content-addressed cache of raw landmarks and derived keyframes, safe to share between worker processes."""
+
+    def __init__(self, root=CACHE_DIR, raw_max_bytes=RAW_MAX_BYTES, derived_max_bytes=DERIVED_MAX_BYTES):
+        self.root = root
+        self.max_bytes = {RAW: raw_max_bytes, DERIVED: derived_max_bytes}
+        for level in (RAW, DERIVED):
+            os.makedirs(os.path.join(root, level), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, "cache.sqlite"), timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def video_hash(self, path):
+        """Content hash of a video, recomputed only when its size or mtime changed."""
+
+        return cached_sha256(self.conn, path)
+
+    def raw_key(self, source_path, mediapipe_config, sampling=None, proxy=None):
+        """Key of the raw landmarks; proxy holds the settings of the proxy video decoded instead of the source."""
+
+        values = [RAW, FORMAT_VERSION, self.video_hash(source_path), mediapipe_config, normalize_sampling(sampling)]
+        if proxy is not None:
+            values.append(proxy)
+        return fingerprint(*values)
+
+    def derived_key(self, raw_key, **params):
+        return fingerprint(DERIVED, FORMAT_VERSION, raw_key, config_values(), params)
+
+    def _path(self, level, key):
+        return os.path.join(self.root, level, key + (".npz" if level == RAW else ".npy"))
+
+    def _load(self, level, key, loader):
+        path = self._path(level, key)
+        try:
+            value = loader(path)
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+            # Missing or torn file: forget the entry and recompute
+            self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+            self.conn.commit()
+            return None
+        self.conn.execute("UPDATE entries SET last_access=? WHERE key=?", (time.time(), key))
+        self.conn.commit()
+        return value
+
+    def _store(self, level, key, source_path, writer):
+        path = self._path(level, key)
+        # Write next to the target then rename, so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+        self.conn.execute("INSERT OR REPLACE INTO entries(key, level, source, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                          (key, level, os.path.abspath(source_path) if source_path else None, os.path.getsize(path),
+                           time.time()))
+        self.conn.commit()
+        self.evict(level)
+
+    def get_raw(self, key):
+        """(raw, presence) stored under key, or None."""
+
+        def load(path):
+            with np.load(path) as data:
+                return data["raw"], data["presence"]
+        return self._load(RAW, key, load)
+
+    def put_raw(self, key, raw, presence, source_path=None):
+        self._store(RAW, key, source_path, lambda f: np.savez(f, raw=raw, presence=presence))
+
+    def get_derived(self, key):
+        return self._load(DERIVED, key, np.load)
+
+    def put_derived(self, key, keyframes, source_path=None):
+        self._store(DERIVED, key, source_path, lambda f: np.save(f, keyframes))
+
+    def size(self, level):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE level=?", (level,)).fetchone()[0]
+
+    def evict(self, level, max_bytes=None):
+        """Drop least recently used entries of level until it fits in max_bytes; returns the number dropped."""
+
+        max_bytes = self.max_bytes[level] if max_bytes is None else max_bytes
+        total = self.size(level)
+        dropped = 0
+        if total <= max_bytes:
+            return dropped
+        for key, size in self.conn.execute("SELECT key, size FROM entries WHERE level=? ORDER BY last_access",
+                                           (level,)).fetchall():
+            if total <= max_bytes:
+                break
+            self._remove(level, key)
+            total -= size
+            dropped += 1
+        self.conn.commit()
+        return dropped
+
+    def _remove(self, level, key):
+        try:
+            os.remove(self._path(level, key))
+        except FileNotFoundError:
+            pass
+        self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+
+    def invalidate(self, source_path=None, level=None):
+        """Drop the entries of one video, of one level, or everything; returns the number dropped."""
+
+        query = "SELECT key, level FROM entries WHERE 1=1"
+        params = []
+        if source_path is not None:
+            query += " AND source=?"
+            params.append(os.path.abspath(source_path))
+        if level is not None:
+            query += " AND level=?"
+            params.append(level)
+        rows = self.conn.execute(query, params).fetchall()
+        for key, entry_level in rows:
+            self._remove(entry_level, key)
+        self.conn.commit()
+        return len(rows)
+
+    def stats(self):
+        return {level: {"entries": self.conn.execute("SELECT COUNT(*) FROM entries WHERE level=?",
+                                                     (level,)).fetchone()[0],
+                        "bytes": self.size(level), "max_bytes": self.max_bytes[level]}
+                for level in (RAW, DERIVED)}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or trim the keypoint extraction cache.")
+    parser.add_argument("command", choices=["stats", "evict", "clear"])
+    parser.add_argument("--root", default=CACHE_DIR)
+    parser.add_argument("--level", choices=[RAW, DERIVED], default=None)
+    parser.add_argument("--source", default=None, help="clear only the entries of this video")
+    parser.add_argument("--max-bytes", type=int, default=None, help="size bound used by evict")
+    args = parser.parse_args()
+
+    with ExtractionCache(args.root) as cache:
+        if args.command == "evict":
+            for level in [args.level] if args.level else [RAW, DERIVED]:
+                print(f"{level}: dropped {cache.evict(level, args.max_bytes)} entries")
+        elif args.command == "clear":
+            print(f"dropped {cache.invalidate(args.source, args.level)} entries")
+        print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,214 @@
+"""
+Frame decimation for extraction: decode every stride-th frame (or down to a target fps),
+downscale before inference, or run Holistic only on candidate frames picked by a cheap
+motion pass. Only K frames survive write_data, so most of the inference is spent on
+frames that are thrown away.
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+from .config import K
+
+PROBE_SIDE = 64                                             # longer side of the grayscale frames of the motion pass
+CANDIDATE_FACTOR = 3                                        # default candidates per kept frame in two-stage mode
+RAW_VIDEO_SUFFIX = ".frames.npy"                            # decoded BGR frames, see RawVideo
+
+class RawVideo:
+    """
+    Read-only cv2.VideoCapture stand-in over a (frames, height, width, 3) uint8 .npy of decoded
+    BGR frames with its fps in a .json next to it. Frames are memory-mapped, retrieve copies nothing.
+    """
+
+    def __init__(self, path):
+        import json
+
+        self.frames = np.load(path, mmap_mode="r")
+        with open(path[:-len(".npy")] + ".json", "r", encoding="utf-8") as f:
+            self.fps = json.load(f)["fps"]
+        self.position = 0
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def grab(self):
+        if not self.opened or self.position >= len(self.frames):
+            return False
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        if self.position == 0:
+            return False, None
+        return True, np.asarray(self.frames[self.position - 1])
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        values = {cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_COUNT: len(self.frames),
+                  cv2.CAP_PROP_FRAME_HEIGHT: self.frames.shape[1], cv2.CAP_PROP_FRAME_WIDTH: self.frames.shape[2],
+                  cv2.CAP_PROP_POS_FRAMES: self.position}
+        return float(values.get(prop, 0))
+
+    def release(self):
+        self.opened = False
+        self.frames = None
+
+def open_video(path):
+    """RawVideo for decoded-frame files, cv2.VideoCapture for everything else."""
+
+    # cv2.VideoCapture opens a missing file as a video without frames, which would pass for an empty clip
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no video at {path}")
+    if path.endswith(RAW_VIDEO_SUFFIX):
+        return RawVideo(path)
+    return cv2.VideoCapture(path)
+
+def sampling_stride(cap, stride=1, target_fps=None):
+    """Frame stride to use on cap, derived from its fps when target_fps is given."""
+
+    if target_fps:
+        fps = cap.get(cv2.CAP_PROP_FPS) or target_fps
+        stride = max(int(round(fps / target_fps)), 1)
+    return max(int(stride), 1)
+
+def downscale(image, max_side=None):
+    """Shrink image so its longer side is at most max_side, keeping the aspect ratio."""
+
+    if not max_side:
+        return image
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (int(round(width * scale)), int(round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def iter_sampled(cap, stride=1, frame_ids=None):
+    """
+    Yield (frame_index, image) of every stride-th frame, or only of the sorted frame_ids.
+    Skipped frames are grabbed without being retrieved, which saves the colour conversion and copy.
+    """
+
+    wanted = iter(frame_ids) if frame_ids is not None else None
+    next_id = next(wanted, None) if wanted is not None else 0
+    frame_index = 0
+    while cap.isOpened() and next_id is not None:
+        if not cap.grab():
+            break
+        if frame_index == next_id:
+            success, image = cap.retrieve()
+            if not success:
+                break
+            yield frame_index, image
+            next_id = next(wanted, None) if wanted is not None else next_id + stride
+        frame_index += 1
+
+def motion_candidates(source_path, n_candidates, stride=1, probe_side=PROBE_SIDE):
+    """
+    Cheap first pass: indices of n_candidates frames evenly spaced along the cumulative
+    difference of small grayscale frames, so fast signing gets more candidates than still frames.
+    """
+
+    cap = open_video(source_path)
+    frame_ids = []
+    energy = []
+    previous = None
+    for frame_index, image in iter_sampled(cap, stride):
+        probe = cv2.cvtColor(downscale(image, probe_side), cv2.COLOR_BGR2GRAY).astype(np.float32)
+        energy.append(0.0 if previous is None else float(np.abs(probe - previous).mean()))
+        frame_ids.append(frame_index)
+        previous = probe
+    cap.release()
+    if len(frame_ids) <= n_candidates:
+        return frame_ids
+    cumulative = np.cumsum(energy)
+    if cumulative[-1] == 0:
+        positions = np.linspace(0, len(frame_ids) - 1, n_candidates).round().astype(np.int64)
+    else:
+        positions = np.searchsorted(cumulative, np.linspace(0, cumulative[-1], n_candidates))
+    positions = np.unique(np.minimum(positions, len(frame_ids) - 1))
+    return [frame_ids[i] for i in positions]
+
+def benchmark_sampling(video_paths, configs, labels=None, k=K, selector="kmeans", model_factory=None):
+    """
+    Time get_valid_frames under every sampling config against the all-frames path and report
+    the mean distance of the selected keyframes to the all-frames selection and, with labels,
+    the leave-one-out 1-NN accuracy. configs maps a name to get_valid_frames keyword arguments.
+    """
+
+    from scipy.spatial.distance import cdist
+    from . import create_numpy_data as cnd
+    from . import frame_selection as fsel
+
+    configs = {"all-frames": {}, **configs}
+    selections = {}
+    report = {}
+    for name, sampling in configs.items():
+        start_time = time.perf_counter()
+        keyframes = []
+        n_inferred = 0
+        n_valid = 0
+        for path in video_paths:
+            model = model_factory() if model_factory else None
+            X, n_frames = cnd.get_valid_frames(path, model, **sampling)
+            if model is not None:
+                model.close()
+            n_inferred += n_frames
+            n_valid += len(X)
+            # Clips left with fewer than k valid frames cannot be written and are scored as missing
+            keyframes.append(X[fsel.select_keyframes(X, k, selector, random_state=0)] if len(X) >= k else None)
+        elapsed = time.perf_counter() - start_time
+        selections[name] = keyframes
+        report[name] = {"seconds": elapsed, "ms_per_video": 1000 * elapsed / max(len(video_paths), 1),
+                        "inferred_frames": n_inferred, "valid_frames": n_valid,
+                        "short_clips": sum(X is None for X in keyframes)}
+
+    reference = selections["all-frames"]
+    for name, keyframes in selections.items():
+        pairs = [(X, ref) for X, ref in zip(keyframes, reference) if X is not None and ref is not None]
+        report[name]["reference_gap"] = float(np.mean([cdist(X, ref).min(axis=1).mean() for X, ref in pairs])) \
+            if pairs else float("nan")
+        report[name]["speedup"] = report["all-frames"]["seconds"] / max(report[name]["seconds"], 1e-9)
+        if labels is not None:
+            usable = [i for i, X in enumerate(keyframes) if X is not None and reference[i] is not None]
+            features = np.stack([keyframes[i].reshape(-1) for i in usable])
+            report[name]["knn_accuracy"] = fsel.leave_one_out_accuracy(features, [labels[i] for i in usable])
+    return report
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    from . import keypoint_extract as md
+
+    parser = argparse.ArgumentParser(description="Benchmark frame decimation against the all-frames extraction.")
+    parser.add_argument("input_dir")
+    parser.add_argument("--metadata", default=None, help="metadata.jsonl used to label clips by word")
+    parser.add_argument("--limit", type=int, default=None, help="number of videos to benchmark")
+    args = parser.parse_args()
+
+    names = sorted(name for name in os.listdir(args.input_dir) if name.endswith(".mp4"))[:args.limit]
+    labels = None
+    if args.metadata:
+        words = {}
+        with open(args.metadata, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    words[record["id"]] = record["word"].strip()
+        labels = [words.get(os.path.splitext(name)[0], name) for name in names]
+    configs = {
+        "stride-2": {"stride": 2},
+        "fps-10": {"target_fps": 10},
+        "max-side-480": {"max_side": 480},
+        "fps-10-max-side-480": {"target_fps": 10, "max_side": 480},
+        "two-stage": {"n_candidates": CANDIDATE_FACTOR * K},
+    }
+    # A fresh graph per video so tracking state never leaks between clips of different configs
+    report = benchmark_sampling([os.path.join(args.input_dir, name) for name in names], configs, labels,
+                                model_factory=md.HolisticRunner)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,154 @@
+"""
+Keyframe selectors: each takes the (n_frames, features) valid-frame matrix of one clip
+and returns the sorted indices of the k frames to keep. "kmeans" is the reference
+write_data path; the others trade some fidelity for speed.
+"""
+
+import time
+import numpy as np
+from . import metrics
+from .config import K
+
+# scikit-learn and scipy take about a second to import, so they are loaded by the selectors that use them
+
+def nearest_to_centers(X, centers):
+    """Index of the frame closest to each center, in temporal order."""
+
+    from scipy.spatial.distance import cdist
+    return np.sort(np.argmin(cdist(X, centers, 'euclidean'), axis=0))
+
+def select_kmeans(X, k=K, random_state=None):
+    """Reference strategy: full KMeans, then the frame nearest to every cluster center."""
+
+    from sklearn.cluster import KMeans
+    kmeans = KMeans(n_clusters=k, random_state=random_state)
+    kmeans.fit(X)
+    return nearest_to_centers(X, kmeans.cluster_centers_)
+
+def select_kmeans_warm(X, k=K, random_state=None):
+    """Single KMeans run started from uniformly spaced frames instead of n_init random restarts."""
+
+    from sklearn.cluster import KMeans
+    kmeans = KMeans(n_clusters=k, init=X[select_uniform(X, k)], n_init=1, random_state=random_state)
+    kmeans.fit(X)
+    return nearest_to_centers(X, kmeans.cluster_centers_)
+
+def select_minibatch(X, k=K, random_state=None):
+    """MiniBatchKMeans centers, then the frame nearest to every center."""
+
+    from sklearn.cluster import MiniBatchKMeans
+    kmeans = MiniBatchKMeans(n_clusters=k, n_init=1, random_state=random_state)
+    kmeans.fit(X)
+    return nearest_to_centers(X, kmeans.cluster_centers_)
+
+def select_kmeanspp(X, k=K, random_state=None):
+    """k-means++ seeding only: the seeds are frames already, no Lloyd iterations."""
+
+    from sklearn.cluster import kmeans_plusplus
+    _, indices = kmeans_plusplus(X, n_clusters=k, random_state=random_state)
+    return np.sort(indices)
+
+def select_uniform(X, k=K, random_state=None):
+    """Evenly spaced frames (repeats frames when the clip is shorter than k)."""
+
+    return np.linspace(0, len(X) - 1, k).round().astype(np.int64)
+
+def select_motion(X, k=K, random_state=None):
+    """Frames evenly spaced along the cumulative motion energy, so fast movements get more frames."""
+
+    energy = np.linalg.norm(np.diff(X, axis=0), axis=1)
+    cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+    if cumulative[-1] == 0:
+        return select_uniform(X, k)
+    targets = np.linspace(0, cumulative[-1], k)
+    return np.minimum(np.searchsorted(cumulative, targets), len(X) - 1)
+
+SELECTORS = {
+    "kmeans": select_kmeans,
+    "kmeans-warm": select_kmeans_warm,
+    "minibatch": select_minibatch,
+    "kmeans++": select_kmeanspp,
+    "uniform": select_uniform,
+    "motion": select_motion,
+}
+
+def select_keyframes(X, k=K, strategy="kmeans", random_state=None):
+    """Sorted indices of the k representative frames of X with the named strategy."""
+
+    if strategy not in SELECTORS:
+        raise ValueError(f"unknown keyframe strategy {strategy!r}, expected one of {sorted(SELECTORS)}")
+    start_time = time.perf_counter()
+    index = SELECTORS[strategy](X, k, random_state)
+    metrics.observe("keyframe_select_ms", 1000 * (time.perf_counter() - start_time), strategy=strategy)
+    return index
+
+def leave_one_out_accuracy(features, labels):
+    """1-nearest-neighbour accuracy of each clip against all others, ignoring labels seen once."""
+
+    from scipy.spatial.distance import cdist
+    labels = np.asarray(labels)
+    distances = cdist(features, features)
+    np.fill_diagonal(distances, np.inf)
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    usable = counts[inverse] > 1
+    if not usable.any():
+        return float("nan")
+    predicted = labels[np.argmin(distances, axis=1)]
+    return float(np.mean(predicted[usable] == labels[usable]))
+
+def benchmark_selectors(sequences, labels=None, k=K, strategies=None, random_state=0):
+    """
+    Time every strategy on the same valid-frame sequences and compare it with the reference:
+    mean distance of its frames to the reference selection and, with labels, 1-NN accuracy.
+    """
+
+    from scipy.spatial.distance import cdist
+    strategies = strategies or list(SELECTORS)
+    keep = [i for i, X in enumerate(sequences) if len(X) >= k]
+    sequences = [sequences[i] for i in keep]
+    if labels is not None:
+        labels = [labels[i] for i in keep]
+    reference = [select_kmeans(X, k, random_state) for X in sequences]
+    report = {}
+    for strategy in strategies:
+        start_time = time.perf_counter()
+        selections = [select_keyframes(X, k, strategy, random_state) for X in sequences]
+        elapsed = time.perf_counter() - start_time
+        gap = np.mean([cdist(X[index], X[ref]).min(axis=1).mean()
+                       for X, index, ref in zip(sequences, selections, reference)])
+        result = {"seconds": elapsed, "ms_per_clip": 1000 * elapsed / max(len(sequences), 1),
+                  "reference_gap": float(gap)}
+        if labels is not None:
+            features = np.stack([X[index].reshape(-1) for X, index in zip(sequences, selections)])
+            result["knn_accuracy"] = leave_one_out_accuracy(features, labels)
+        report[strategy] = result
+    return report
+
+if __name__ == "__main__":
+    import os
+    import json
+    import argparse
+    from . import create_numpy_data as cnd
+
+    parser = argparse.ArgumentParser(description="Benchmark keyframe strategies on a directory of videos.")
+    parser.add_argument("input_dir")
+    parser.add_argument("--metadata", default=None, help="metadata.jsonl used to label clips by word")
+    parser.add_argument("--k", type=int, default=K)
+    args = parser.parse_args()
+
+    metrics.configure()
+    labels_by_id = {}
+    if args.metadata:
+        with open(args.metadata, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    labels_by_id[record["id"]] = record["word"].strip()
+    sequences, labels = [], []
+    for name in sorted(os.listdir(args.input_dir)):
+        if name.endswith(".mp4"):
+            X, _ = cnd.get_valid_frames(os.path.join(args.input_dir, name))
+            sequences.append(X)
+            labels.append(labels_by_id.get(os.path.splitext(name)[0], name))
+    report = benchmark_selectors(sequences, labels if args.metadata else None, k=args.k)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,196 @@
+"""
+Compact codec for dense (frames, N_LANDMARKS, 3) keypoint clips, used to store and ship
+extracted datasets. Undetected landmarks (the all-zero triples of missing hands and of pose
+points under the visibility threshold) are kept as a packed bit mask instead of values.
+Detected coordinates are quantized, then delta encoded along time per landmark, stored in
+the narrowest integer type that fits, split into byte planes and deflated.
+
+Quantization is the only lossy step, the deltas are exact:
+    "fixed"    coordinates rounded to multiples of step: |error| <= step / 2 (+ float32 rounding)
+               (FIXED_STEP = 1/4096 gives 1.2e-4, about 0.1 px on a 1280 px frame)
+    "float16"  coordinates rounded to float16: |error| <= |x| * 2**-11, 2.4e-4 on [0, 1]
+Undetected landmarks decode to exact zeros and the presence bitmask is kept as is.
+"""
+
+import io
+import os
+import json
+import numpy as np
+from . import keypoint_format as kf
+from .config import N_LANDMARKS
+
+FIXED = "fixed"
+FLOAT16 = "float16"
+MODES = (FIXED, FLOAT16)
+FIXED_STEP = 1 / 4096
+FORMAT_VERSION = 1
+SUFFIX = ".kpz"
+
+def error_bound(mode=FIXED, step=FIXED_STEP, max_abs=1.0):
+    """Largest reconstruction error of a detected coordinate with |x| <= max_abs."""
+
+    if mode == FIXED:
+        # Plus the float32 rounding of the decoded value
+        return step / 2 + max_abs * 2.0**-24
+    # float16 keeps 11 significant bits, rounding moves a value by at most half a unit in the last place
+    return max(max_abs, 2.0**-14) * 2.0**-11
+
+def _narrowest(values):
+    """values cast to the smallest little-endian signed integer type holding them."""
+
+    largest = int(np.abs(values).max()) if values.size else 0
+    for dtype in ("<i1", "<i2", "<i4"):
+        if largest <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype("<i8")
+
+def _to_planes(values):
+    """Bytes of values grouped by significance: the mostly-zero high bytes deflate far better on their own."""
+
+    return np.ascontiguousarray(values.view(np.uint8).reshape(-1, values.itemsize).T)
+
+def _from_planes(planes, dtype):
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(-1)
+
+def _quantize(keypoints, mode, step):
+    if mode == FIXED:
+        return np.round(keypoints.astype(np.float64) / step).astype(np.int64)
+    # Deltas of the float16 bit patterns are exact, unlike float16 arithmetic
+    return keypoints.astype(np.float16).view(np.int16).astype(np.int64)
+
+def _dequantize(values, mode, step):
+    if mode == FIXED:
+        return (values * step).astype(kf.DTYPE)
+    return values.astype(np.int16).view(np.float16).astype(kf.DTYPE)
+
+def encode(keypoints, mask=None, mode=FIXED, step=FIXED_STEP):
+    """Encode one clip into a dict of arrays (see decode); mask is the per-frame hand presence bitmask."""
+
+    if mode not in MODES:
+        raise ValueError(f"unknown codec mode {mode!r}, expected one of {MODES}")
+    keypoints = np.asarray(keypoints, dtype=kf.DTYPE).reshape(-1, N_LANDMARKS, 3)
+    mask = kf.presence_mask(keypoints) if mask is None else np.asarray(mask, dtype=np.uint8)
+    n_frames = len(keypoints)
+    detected = np.any(keypoints != 0, axis=2)
+    values = _quantize(keypoints, mode, step)
+    values[~detected] = 0
+    # Carry the last detected value over gaps, so a landmark that reappears costs one small delta
+    last = np.where(detected, np.arange(n_frames)[:, None], 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    carried = np.take_along_axis(values, last[:, :, None], axis=0)
+    deltas = _narrowest(np.diff(carried, axis=0, prepend=0)[detected])
+    header = {"version": FORMAT_VERSION, "mode": mode, "step": step, "frames": n_frames, "dtype": deltas.dtype.str}
+    return {"header": np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8),
+            "detected": np.packbits(detected.reshape(-1)),
+            "deltas": _to_planes(deltas),
+            "mask": mask}
+
+def decode(data):
+    """Inverse of encode: (keypoints (frames, N_LANDMARKS, 3) float32, mask (frames,) uint8)."""
+
+    header = json.loads(bytes(data["header"]).decode("utf-8"))
+    if header["version"] > FORMAT_VERSION:
+        raise ValueError(f"keypoint codec version {header['version']} is newer than {FORMAT_VERSION}")
+    n_frames = header["frames"]
+    detected = np.unpackbits(data["detected"], count=n_frames * N_LANDMARKS).astype(bool).reshape(n_frames, N_LANDMARKS)
+    deltas = np.zeros((n_frames, N_LANDMARKS, 3), dtype=np.int64)
+    deltas[detected] = _from_planes(data["deltas"], header["dtype"]).reshape(-1, 3)
+    values = np.cumsum(deltas, axis=0)
+    keypoints = _dequantize(values, header["mode"], header["step"])
+    keypoints[~detected] = 0
+    return keypoints, np.asarray(data["mask"], dtype=np.uint8)
+
+def to_bytes(keypoints, mask=None, mode=FIXED, step=FIXED_STEP):
+    """Encoded clip as deflated npz bytes, ready to write or send."""
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **encode(keypoints, mask, mode, step))
+    return buffer.getvalue()
+
+def from_bytes(payload):
+    with np.load(io.BytesIO(payload)) as data:
+        return decode(data)
+
+def save(path, keypoints, mask=None, mode=FIXED, step=FIXED_STEP):
+    if not path.endswith(SUFFIX):
+        path += SUFFIX
+    with open(path, "wb") as f:
+        f.write(to_bytes(keypoints, mask, mode, step))
+    return path
+
+def load(path):
+    with open(path, "rb") as f:
+        return from_bytes(f.read())
+
+def encode_dir(input_dir, output_dir, mode=FIXED, step=FIXED_STEP, legacy=False):
+    """
+    Encode every clip under input_dir (dense, or object-dtype with legacy=True) into output_dir,
+    keeping the folder layout. Returns (clips, input bytes, output bytes, max error).
+    """
+
+    n_clips = input_bytes = output_bytes = 0
+    max_error = 0.0
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if not kf.is_keypoint_file(name):
+                continue
+            source_path = os.path.join(root, name)
+            if legacy:
+                keypoints, mask = kf.load_legacy(source_path), None
+                input_bytes += os.path.getsize(source_path)
+            else:
+                keypoints, mask = kf.load_keypoints(source_path)
+                input_bytes += os.path.getsize(source_path)
+                if os.path.exists(kf.mask_path(source_path)):
+                    input_bytes += os.path.getsize(kf.mask_path(source_path))
+            target_dir = os.path.join(output_dir, os.path.relpath(root, input_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            target_path = save(os.path.join(target_dir, name[:-len(".npy")]), keypoints, mask, mode, step)
+            output_bytes += os.path.getsize(target_path)
+            decoded, _ = load(target_path)
+            max_error = max(max_error, float(np.abs(decoded - np.asarray(keypoints)).max(initial=0)))
+            n_clips += 1
+    return n_clips, input_bytes, output_bytes, max_error
+
+def decode_dir(input_dir, output_dir):
+    """Write every encoded clip under input_dir back as dense .npy clips with masks."""
+
+    n_clips = 0
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if not name.endswith(SUFFIX):
+                continue
+            keypoints, mask = load(os.path.join(root, name))
+            target_dir = os.path.join(output_dir, os.path.relpath(root, input_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            kf.save_keypoints(os.path.join(target_dir, name[:-len(SUFFIX)] + ".npy"), keypoints, mask)
+            n_clips += 1
+    return n_clips
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Encode keypoint clips for storage and transfer, or decode them back.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    encode_parser = subparsers.add_parser("encode", help="encode a folder of clips and check the error bound")
+    encode_parser.add_argument("input_dir")
+    encode_parser.add_argument("output_dir")
+    encode_parser.add_argument("--mode", choices=MODES, default=FIXED)
+    encode_parser.add_argument("--step", type=float, default=FIXED_STEP, help="fixed-point quantization step")
+    encode_parser.add_argument("--legacy", action="store_true", help="input is object-dtype .npy from the old write_data")
+    decode_parser = subparsers.add_parser("decode", help="decode a folder of encoded clips to dense .npy")
+    decode_parser.add_argument("input_dir")
+    decode_parser.add_argument("output_dir")
+    args = parser.parse_args()
+
+    if args.command == "encode":
+        n_clips, input_bytes, output_bytes, max_error = encode_dir(args.input_dir, args.output_dir, args.mode,
+                                                                   args.step, args.legacy)
+        # Detected coordinates stay within a few units of [0, 1], check against |x| <= 2
+        bound = error_bound(args.mode, args.step, max_abs=2.0)
+        print(f"Encoded {n_clips} clips: {input_bytes / 1e6:.2f} MB -> {output_bytes / 1e6:.2f} MB "
+              f"({input_bytes / max(output_bytes, 1):.1f}x), max error {max_error:.2e} (bound {bound:.2e})")
+        if max_error > bound:
+            raise SystemExit("reconstruction error exceeds the documented bound")
+    else:
+        print(f"Decoded {decode_dir(args.input_dir, args.output_dir)} clips.")
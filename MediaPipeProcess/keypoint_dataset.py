@@ -0,0 +1,165 @@
+import os
+import json
+import argparse
+import numpy as np
+from .config import N_LANDMARKS
+from . import keypoint_format as kf
+
+SHARD_FRAMES = 200_000                                      # ~140MB of float32 keypoints per shard
+INDEX_NAME = "index.jsonl"
+
+def shard_name(shard_id):
+    return f"shard_{shard_id:05d}.npy"
+
+def find_clip(keypoints_dir, record):
+    """Locate the keypoint file of a metadata record (per-word folder first, then flat layout)."""
+
+    for path in (kf.clip_path(keypoints_dir, record["id"], kf.word_label(record)),
+                 kf.clip_path(keypoints_dir, record["id"])):
+        if os.path.exists(path):
+            return path
+    return None
+
+def read_metadata(metadata_path):
+    """Read metadata.jsonl records written by data_crawling.save_jsonl, dropping duplicated ids."""
+
+    records = []
+    seen = set()
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["id"] in seen:
+                continue
+            seen.add(record["id"])
+            records.append(record)
+    return records
+
+def plan_shards(clips, shard_frames=SHARD_FRAMES):
+    """Assign (record, path, length) clips to shards; a clip never spans two shards."""
+
+    shards = [[]]
+    used = 0
+    for clip in clips:
+        length = clip[2]
+        if shards[-1] and used + length > shard_frames:
+            shards.append([])
+            used = 0
+        shards[-1].append(clip)
+        used += length
+    return shards if shards[0] else []
+
+def pack_dataset(metadata_path, keypoints_dir, output_dir, shard_frames=SHARD_FRAMES):
+    """
+    Concatenate dense keypoint clips into a few large shards and write an index
+    mapping each clip id and word to (shard, offset, length).
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    clips = []
+    missing = 0
+    unlabelled = 0
+    for record in read_metadata(metadata_path):
+        # A clip without a word has no class to train on
+        if kf.word_label(record) is None:
+            unlabelled += 1
+            continue
+        path = find_clip(keypoints_dir, record)
+        if path is None:
+            missing += 1
+            continue
+        # mmap only reads the header here
+        length = np.load(path, mmap_mode="r").shape[0]
+        clips.append((record, path, length))
+
+    index = []
+    for shard_id, shard in enumerate(plan_shards(clips, shard_frames)):
+        total = sum(length for _, _, length in shard)
+        name = shard_name(shard_id)
+        data = np.lib.format.open_memmap(os.path.join(output_dir, name), mode="w+", dtype=kf.DTYPE,
+                                         shape=(total, N_LANDMARKS, 3))
+        mask = np.zeros(total, dtype=np.uint8)
+        offset = 0
+        for record, path, length in shard:
+            keypoints, clip_mask = kf.load_keypoints(path)
+            data[offset:offset + length] = keypoints
+            mask[offset:offset + length] = clip_mask
+            index.append({"id": record["id"], "word": kf.word_label(record), "shard": name,
+                          "offset": offset, "length": length})
+            offset += length
+        data.flush()
+        del data
+        np.save(kf.mask_path(os.path.join(output_dir, name)), mask)
+
+    with open(os.path.join(output_dir, INDEX_NAME), "w", encoding="utf-8") as f:
+        for item in index:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    print(f"Packed {len(index)} clips into {len(set(item['shard'] for item in index))} shards, "
+          f"{missing} records without keypoints, {unlabelled} records without a word.")
+    return index
+
+class KeypointDataset:
+    """Random access and sequential streaming over packed, memory-mapped keypoint shards."""
+
+    def __init__(self, dataset_dir):
+        self.dataset_dir = dataset_dir
+        with open(os.path.join(dataset_dir, INDEX_NAME), "r", encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+        self.id_to_idx = {record["id"]: i for i, record in enumerate(self.records)}
+        self.word_to_idx = {}
+        for i, record in enumerate(self.records):
+            self.word_to_idx.setdefault(record["word"], []).append(i)
+        self.words = sorted(self.word_to_idx)
+        self.word_labels = {word: label for label, word in enumerate(self.words)}
+        self._shards = {}
+
+    def _shard(self, name):
+        if name not in self._shards:
+            self._shards[name] = kf.load_keypoints(os.path.join(self.dataset_dir, name))
+        return self._shards[name]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        """Return (keypoints, mask, record) of clip i as views into the shard."""
+
+        record = self.records[i]
+        data, mask = self._shard(record["shard"])
+        start, stop = record["offset"], record["offset"] + record["length"]
+        return data[start:stop], mask[start:stop], record
+
+    def get(self, clip_id):
+        return self[self.id_to_idx[clip_id]]
+
+    def by_word(self, word):
+        """Indices of every clip labelled with word."""
+
+        return self.word_to_idx.get(word, [])
+
+    def label(self, i):
+        """Integer class label of clip i (position of its word in sorted vocabulary)."""
+
+        return self.word_labels[self.records[i]["word"]]
+
+    def __iter__(self):
+        """Stream clips in on-disk order so each shard is read sequentially."""
+
+        order = sorted(range(len(self.records)),
+                       key=lambda i: (self.records[i]["shard"], self.records[i]["offset"]))
+        for i in order:
+            yield self[i]
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Pack per-clip keypoint files into shards.")
+    parser.add_argument("metadata_path")
+    parser.add_argument("keypoints_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--shard-frames", type=int, default=SHARD_FRAMES)
+    args = parser.parse_args(argv)
+    pack_dataset(args.metadata_path, args.keypoints_dir, args.output_dir, args.shard_frames)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,25 @@
+import time
 import cv2
-import mediapipe as mp
 import numpy as np
-from config import N_HAND_LANDMARKS, N_POSE_LANDMARKS, UPPER_BODY_CONNECTIONS
+from . import metrics
+from . import frame_sampling as fsam
+from .config import (N_HAND_LANDMARKS, N_POSE_LANDMARKS, N_LANDMARKS, UPPER_BODY_CONNECTIONS, LEFT_HAND_OFFSET,
+                    RIGHT_HAND_OFFSET, POSE_OFFSET, LEFT_HAND_PRESENT, RIGHT_HAND_PRESENT)
+
+# Raw Holistic output kept by the extraction cache: every pose landmark then both hands,
+# each as x, y, z, visibility (hands have no visibility, stored as 1), so any layout can be derived later
+N_RAW_POSE_LANDMARKS = 33                                   # len(mp.solutions.holistic.PoseLandmark)
+RAW_LEFT_HAND_OFFSET = N_RAW_POSE_LANDMARKS
+RAW_RIGHT_HAND_OFFSET = RAW_LEFT_HAND_OFFSET + N_HAND_LANDMARKS
+N_RAW_LANDMARKS = RAW_RIGHT_HAND_OFFSET + N_HAND_LANDMARKS
 
 def mediapipe_detection(image, model):
     """Convert color space and run Mediapipe model."""
     
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image.flags.writeable = False
-    results = model.process(image)
-    image.flags.writeable = True
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    rgb.flags.writeable = False
+    results = model.process(rgb)
+    # The BGR input is left untouched, no need to convert the RGB copy back
     return image, results
 
 def extract_keypoints(results, visibility_thres=0.5):
@@ -44,6 +53,219 @@ def extract_keypoints(results, visibility_thres=0.5):
     
     return pose_landmarks, left_hand_landmarks, right_hand_landmarks
 
+_ZERO_HAND = memoryview(np.zeros(N_HAND_LANDMARKS*3, dtype=np.float32))
+
+def _write_hand(values, start, hand):
+    """Copy the x, y, z of every hand landmark into values from float index start, zeros if undetected."""
+
+    if not hand:
+        values[start:start + N_HAND_LANDMARKS*3] = _ZERO_HAND
+        return False
+    i = start
+    for lm in hand.landmark:
+        values[i] = lm.x
+        values[i + 1] = lm.y
+        values[i + 2] = lm.z
+        i += 3
+    return True
+
+def extract_keypoints_into(results, out, visibility_thres=0.5):
+    """
+    Write the keypoints of one frame straight into out, a float32 row of length N_LANDMARKS*3
+    in concate_array layout, masking pose landmarks below visibility_thres in the same pass.
+    Return the hand presence bits (LEFT_HAND_PRESENT | RIGHT_HAND_PRESENT) of the frame.
+    """
+
+    # Item assignment through a memoryview skips the numpy scalar conversion of every value
+    values = memoryview(out.reshape(N_LANDMARKS*3))
+    presence = 0
+    if _write_hand(values, LEFT_HAND_OFFSET*3, results.left_hand_landmarks):
+        presence |= LEFT_HAND_PRESENT
+    if _write_hand(values, RIGHT_HAND_OFFSET*3, results.right_hand_landmarks):
+        presence |= RIGHT_HAND_PRESENT
+
+    # Upper pose
+    i = POSE_OFFSET*3
+    landmarks = results.pose_landmarks.landmark if results.pose_landmarks else ()
+    for idx in UPPER_BODY_CONNECTIONS:
+        if idx < len(landmarks) and landmarks[idx].visibility >= visibility_thres:
+            res = landmarks[idx]
+            values[i] = res.x
+            values[i + 1] = res.y
+            values[i + 2] = res.z
+        else:
+            values[i] = values[i + 1] = values[i + 2] = 0.0
+        i += 3
+    return presence
+
+def _write_raw(values, start, landmarks, count, hand=False):
+    """Copy x, y, z, visibility of count landmarks into values from float index start, zeros if undetected."""
+
+    if not landmarks:
+        for i in range(start, start + count*4):
+            values[i] = 0.0
+        return False
+    i = start
+    for lm in landmarks.landmark:
+        values[i] = lm.x
+        values[i + 1] = lm.y
+        values[i + 2] = lm.z
+        values[i + 3] = 1.0 if hand else lm.visibility
+        i += 4
+    return True
+
+def extract_raw_into(results, out):
+    """
+    Write every Holistic landmark of one frame into out, a float32 array of N_RAW_LANDMARKS*4 values,
+    without filtering or masking. Return the hand presence bits of the frame.
+    """
+
+    values = memoryview(out.reshape(N_RAW_LANDMARKS*4))
+    _write_raw(values, 0, results.pose_landmarks, N_RAW_POSE_LANDMARKS)
+    presence = 0
+    if _write_raw(values, RAW_LEFT_HAND_OFFSET*4, results.left_hand_landmarks, N_HAND_LANDMARKS, hand=True):
+        presence |= LEFT_HAND_PRESENT
+    if _write_raw(values, RAW_RIGHT_HAND_OFFSET*4, results.right_hand_landmarks, N_HAND_LANDMARKS, hand=True):
+        presence |= RIGHT_HAND_PRESENT
+    return presence
+
+def raw_to_rows(raw, presence, visibility_thres=0.5):
+    """
+    Derive get_valid_frames rows from raw landmarks: keep frames with a hand, select the
+    UPPER_BODY_CONNECTIONS pose points and zero those below visibility_thres.
+    Return a (n_valid, N_LANDMARKS*3) float32 array, equal to extract_keypoints_into on the same frames.
+    """
+
+    raw = raw[presence != 0]
+    X = np.zeros((len(raw), N_LANDMARKS, 3), dtype=np.float32)
+    X[:, LEFT_HAND_OFFSET:LEFT_HAND_OFFSET + N_HAND_LANDMARKS] = \
+        raw[:, RAW_LEFT_HAND_OFFSET:RAW_LEFT_HAND_OFFSET + N_HAND_LANDMARKS, :3]
+    X[:, RIGHT_HAND_OFFSET:RIGHT_HAND_OFFSET + N_HAND_LANDMARKS] = \
+        raw[:, RAW_RIGHT_HAND_OFFSET:RAW_RIGHT_HAND_OFFSET + N_HAND_LANDMARKS, :3]
+    pose = raw[:, UPPER_BODY_CONNECTIONS]
+    X[:, POSE_OFFSET:POSE_OFFSET + N_POSE_LANDMARKS] = np.where(pose[..., 3:] >= visibility_thres, pose[..., :3], 0)
+    return X.reshape(len(raw), N_LANDMARKS * 3)
+
+class HolisticRunner:
+    """
+    Owns one Holistic graph across videos: the graph is reset at every clip boundary so
+    tracking never carries over, frames are converted into a reused RGB buffer, and the
+    time spent decoding, converting, inferring and extracting is recorded per frame.
+    """
+
+    STAGES = ("decode", "convert", "infer", "extract")
+    DEFAULT_CONFIDENCE = 0.5
+
+    def __init__(self, model=None, min_detection_confidence=None, min_tracking_confidence=None):
+        # mediapipe is imported here rather than at module level: it takes most of a second
+        import mediapipe as mp
+
+        # Settings that determine the raw landmarks, part of the extraction cache key. The settings of a
+        # graph passed in cannot be read back: unless the caller states them config is None and
+        # cached_keyframes does not cache its landmarks
+        self.config = None
+        if model is None:
+            min_detection_confidence = self.DEFAULT_CONFIDENCE if min_detection_confidence is None \
+                else min_detection_confidence
+            min_tracking_confidence = self.DEFAULT_CONFIDENCE if min_tracking_confidence is None \
+                else min_tracking_confidence
+        if min_detection_confidence is not None and min_tracking_confidence is not None:
+            self.config = {"min_detection_confidence": min_detection_confidence,
+                           "min_tracking_confidence": min_tracking_confidence, "mediapipe": mp.__version__}
+        # A graph passed in may already hold tracking state
+        self.tracking = model is not None
+        self.model = model or mp.solutions.holistic.Holistic(min_detection_confidence=min_detection_confidence,
+                                                             min_tracking_confidence=min_tracking_confidence)
+        self.rgb = None
+        self.n_videos = 0
+        self.n_frames = 0
+        self.last = dict.fromkeys(self.STAGES, 0.0)
+        self.totals = dict.fromkeys(self.STAGES, 0.0)
+
+    def _record(self, stage, seconds):
+        self.last[stage] = seconds
+        self.totals[stage] += seconds
+
+    def start_video(self):
+        """Reset the graph before the first frame of a new clip (a graph that saw no frame is kept)."""
+
+        if self.tracking:
+            self.model.reset()
+            self.tracking = False
+        self.n_videos += 1
+
+    def frames(self, cap, stride=1, frame_ids=None):
+        """frame_sampling.iter_sampled over cap, timing the decode of every yielded frame."""
+
+        start_time = time.perf_counter()
+        for frame in fsam.iter_sampled(cap, stride, frame_ids):
+            self._record("decode", time.perf_counter() - start_time)
+            yield frame
+            start_time = time.perf_counter()
+
+    def process(self, image, return_image=False):
+        """Run Holistic on one BGR frame; with return_image the frame is returned with the results like mediapipe_detection."""
+
+        start_time = time.perf_counter()
+        if self.rgb is None or self.rgb.shape != image.shape:
+            self.rgb = np.empty_like(image)
+        self.rgb.flags.writeable = True
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        self.rgb.flags.writeable = False
+        converted_time = time.perf_counter()
+        self._record("convert", converted_time - start_time)
+        results = self.model.process(self.rgb)
+        self.tracking = True
+        infer_seconds = time.perf_counter() - converted_time
+        self._record("infer", infer_seconds)
+        metrics.observe("inference_ms", 1000 * infer_seconds)
+        self.n_frames += 1
+        return (image, results) if return_image else results
+
+    def extract_into(self, results, out, visibility_thres=0.5):
+        """Timed extract_keypoints_into."""
+
+        start_time = time.perf_counter()
+        presence = extract_keypoints_into(results, out, visibility_thres)
+        self._record("extract", time.perf_counter() - start_time)
+        return presence
+
+    def extract_raw_into(self, results, out):
+        """Timed extract_raw_into."""
+
+        start_time = time.perf_counter()
+        presence = extract_raw_into(results, out)
+        self._record("extract", time.perf_counter() - start_time)
+        return presence
+
+    def extract(self, results, visibility_thres=0.5):
+        """Timed extract_keypoints."""
+
+        start_time = time.perf_counter()
+        keypoints = extract_keypoints(results, visibility_thres)
+        self._record("extract", time.perf_counter() - start_time)
+        return keypoints
+
+    def report(self):
+        """Mean milliseconds per frame of every stage."""
+
+        n_frames = max(self.n_frames, 1)
+        stages = {stage: 1000 * total / n_frames for stage, total in self.totals.items()}
+        return {"videos": self.n_videos, "frames": self.n_frames, "ms_per_frame": stages,
+                "total_ms_per_frame": sum(stages.values())}
+
+    def close(self):
+        self.model.close()
+
+def as_runner(model, min_detection_confidence=None, min_tracking_confidence=None):
+    """
+    Wrap a bare Holistic graph in a HolisticRunner, pass runners through. The confidences the
+    graph was built with are recorded in its config only when given here.
+    """
+
+    if isinstance(model, HolisticRunner):
+        return model
+    return HolisticRunner(model, min_detection_confidence, min_tracking_confidence)
 
 def plot_keypoints(list_landmarks):
     """Plot image with keypoints"""
@@ -0,0 +1,262 @@
+"""
+Derived features over batches of dense clips. A FeatureTransform names the features it
+computes and maps (clips, frames, N_LANDMARKS, 3) keypoints to one (clips, frames, dim)
+float32 array, all clips at once:
+
+    body      every landmark centred on the shoulder midpoint, in shoulder widths
+    hands     finger landmarks relative to their wrist, in palm lengths (wrist to middle finger MCP)
+    velocity  frame-to-frame motion of the body coordinates
+    bones     length of every bone of the augmentation.PARENTS tree
+
+Missing points (undetected hands, pose landmarks below the visibility threshold) give zero
+hands, velocity and bone values. FeatureCache stores the features of a whole packed dataset or
+clip folder as one memory-mapped array, keyed by the transform settings, config.py and the source
+files, so training epochs and retrieval builds read them instead of recomputing.
+"""
+
+import os
+import json
+import time
+import numpy as np
+from . import keypoint_format as kf
+from .augmentation import CHILD_IDX, PARENT_IDX
+from .extraction_cache import fingerprint, config_values
+from .config import (K, N_LANDMARKS, N_HAND_LANDMARKS, UPPER_BODY_CONNECTIONS, POSE_OFFSET, LEFT_HAND_OFFSET,
+                    RIGHT_HAND_OFFSET, LEFT_HAND_PRESENT, RIGHT_HAND_PRESENT)
+
+LEFT_SHOULDER = POSE_OFFSET + UPPER_BODY_CONNECTIONS.index(11)
+RIGHT_SHOULDER = POSE_OFFSET + UPPER_BODY_CONNECTIONS.index(12)
+MIDDLE_MCP = 9                                              # hand landmark ending the palm length
+FEATURE_DIR = "dataset/feature_cache"
+BATCH_SIZE = 256
+FORMAT_VERSION = 1                                          # bump when a feature definition changes
+HANDS = ((LEFT_HAND_OFFSET, LEFT_HAND_PRESENT), (RIGHT_HAND_OFFSET, RIGHT_HAND_PRESENT))
+
+def _masked_median(values, valid):
+    """Median over axis 1 of values (B, T, ...) restricted to valid (B, T), NaN where no frame is valid."""
+
+    values = np.where(valid.reshape(valid.shape + (1,) * (values.ndim - 2)), values, np.nan)
+    values = np.sort(values, axis=1)                        # NaN sort last
+    count = valid.sum(axis=1).reshape((-1, 1) + (1,) * (values.ndim - 2))
+    low = np.take_along_axis(values, np.maximum(count - 1, 0) // 2, axis=1)
+    high = np.take_along_axis(values, count // 2, axis=1)
+    return np.where(count > 0, (low + high) / 2, np.nan)[:, 0]
+
+def valid_points(keypoints, mask):
+    """(B, T, N_LANDMARKS) bool: landmarks that were detected, i.e. non-zero and of a present hand."""
+
+    valid = np.any(keypoints != 0, axis=-1)
+    for offset, flag in HANDS:
+        valid[:, :, offset:offset + N_HAND_LANDMARKS] &= ((mask & flag) != 0)[:, :, None]
+    return valid
+
+def normalize_body(keypoints, mask):
+    """
+    Batched sign_retrieval normalization of (B, T, N_LANDMARKS, 3) clips: shoulder midpoint at the
+    origin and unit shoulder width per frame. Frames where the pose was lost borrow the clip median,
+    clips without any pose are left in image coordinates, and absent hands stay at zero.
+    """
+
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    shoulders = keypoints[:, :, [LEFT_SHOULDER, RIGHT_SHOULDER]]
+    detected = np.any(shoulders != 0, axis=(2, 3))
+    center = shoulders.mean(axis=2)
+    width = np.linalg.norm(shoulders[:, :, 0, :2] - shoulders[:, :, 1, :2], axis=-1)
+    center = np.where(detected[..., None], center, _masked_median(center, detected)[:, None])
+    width = np.where(detected, width, _masked_median(width, detected)[:, None])
+    width[width < 1e-6] = 1.0
+    # Clips without any detected pose: the medians are NaN
+    center = np.nan_to_num(center, nan=0.0)
+    width = np.nan_to_num(width, nan=1.0)
+    body = (keypoints - center[:, :, None]) / width[:, :, None, None]
+    for offset, flag in HANDS:
+        body[(mask & flag) == 0, offset:offset + N_HAND_LANDMARKS] = 0
+    return body.astype(np.float32, copy=False)
+
+def hand_coords(body, valid):
+    """Both hands relative to their wrist and scaled by their palm length, (B, T, 2 * N_HAND_LANDMARKS * 3)."""
+
+    hands = np.stack([body[:, :, offset:offset + N_HAND_LANDMARKS] for offset, _ in HANDS], axis=2)
+    hands = hands - hands[:, :, :, :1]
+    palm = np.linalg.norm(hands[:, :, :, MIDDLE_MCP, :2], axis=-1)
+    palm[palm < 1e-6] = 1.0
+    present = np.stack([valid[:, :, offset:offset + N_HAND_LANDMARKS] for offset, _ in HANDS], axis=2)
+    hands = hands / palm[..., None, None] * present[..., None]
+    return hands.reshape(body.shape[0], body.shape[1], -1)
+
+def velocity(body, valid):
+    """Body coordinate difference to the previous frame, zero on the first frame and wherever a point is missing."""
+
+    motion = np.zeros_like(body)
+    motion[:, 1:] = body[:, 1:] - body[:, :-1]
+    motion[:, 1:] *= (valid[:, 1:] & valid[:, :-1])[..., None]
+    return motion.reshape(body.shape[0], body.shape[1], -1)
+
+def bone_lengths(body, valid):
+    """Length of every child -> parent bone in body coordinates, zero when an end is missing."""
+
+    # np.take gathers along the landmark axis several times faster than fancy indexing
+    bones = np.take(body, CHILD_IDX, axis=2) - np.take(body, PARENT_IDX, axis=2)
+    lengths = np.sqrt(np.einsum("btnc,btnc->btn", bones, bones))
+    return lengths * (np.take(valid, CHILD_IDX, axis=2) & np.take(valid, PARENT_IDX, axis=2))
+
+# name -> (values per frame, function of the body coordinates and valid points)
+FEATURES = {
+    "body": (N_LANDMARKS * 3, lambda body, valid: body.reshape(body.shape[0], body.shape[1], -1)),
+    "hands": (2 * N_HAND_LANDMARKS * 3, hand_coords),
+    "velocity": (N_LANDMARKS * 3, velocity),
+    "bones": (len(CHILD_IDX), bone_lengths),
+}
+DEFAULT_FEATURES = ("body", "hands", "velocity", "bones")
+
+def resample_clips(clips, n_frames=K):
+    """Stack (keypoints, mask) clips resampled to n_frames: ((B, n_frames, N_LANDMARKS, 3), (B, n_frames))."""
+
+    from .augment_loader import fixed_length
+
+    keypoints = np.empty((len(clips), n_frames, N_LANDMARKS, 3), dtype=np.float32)
+    masks = np.empty((len(clips), n_frames), dtype=np.uint8)
+    for row, (clip, mask) in enumerate(clips):
+        frames = fixed_length(len(clip), n_frames)
+        keypoints[row] = clip[frames]
+        masks[row] = kf.presence_mask(keypoints[row]) if mask is None else np.asarray(mask)[frames]
+    return keypoints, masks
+
+class FeatureTransform:
+    """Declared set of FEATURES concatenated along the last axis, in the order given."""
+
+    def __init__(self, features=DEFAULT_FEATURES, n_frames=K):
+        unknown = [name for name in features if name not in FEATURES]
+        if unknown:
+            raise ValueError(f"unknown features {unknown}, expected some of {sorted(FEATURES)}")
+        self.features = tuple(features)
+        self.n_frames = n_frames
+
+    def config(self):
+        """Everything that changes the output, part of the FeatureCache key."""
+
+        return {"features": list(self.features), "n_frames": self.n_frames, "version": FORMAT_VERSION}
+
+    def layout(self):
+        """[start, stop) of every feature along the last axis."""
+
+        layout = {}
+        start = 0
+        for name in self.features:
+            layout[name] = [start, start + FEATURES[name][0]]
+            start += FEATURES[name][0]
+        return layout
+
+    @property
+    def dim(self):
+        return sum(FEATURES[name][0] for name in self.features)
+
+    def __call__(self, keypoints, mask=None):
+        """(B, T, dim) float32 features of (B, T, N_LANDMARKS, 3) keypoints with their (B, T) presence bits."""
+
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        if mask is None:
+            mask = kf.presence_mask(keypoints.reshape(-1, N_LANDMARKS, 3)).reshape(keypoints.shape[:2])
+        mask = np.asarray(mask)
+        valid = valid_points(keypoints, mask)
+        body = normalize_body(keypoints, mask)
+        out = np.empty(keypoints.shape[:2] + (self.dim,), dtype=np.float32)
+        for name, (start, stop) in self.layout().items():
+            out[..., start:stop] = FEATURES[name][1](body, valid)
+        return out
+
+    def clips(self, clips):
+        """Features of (keypoints, mask) clips of any length, resampled to n_frames first."""
+
+        return self(*resample_clips(clips, self.n_frames))
+
+def source_fingerprint(source_path):
+    """Hash of the names, sizes and mtimes of the clip files under source_path (packed or folder)."""
+
+    files = []
+    for root, _, names in os.walk(source_path):
+        for name in names:
+            if name.endswith((".npy", ".jsonl")):
+                stat = os.stat(os.path.join(root, name))
+                files.append((os.path.relpath(os.path.join(root, name), source_path), stat.st_size, stat.st_mtime_ns))
+    return fingerprint(sorted(files))
+
+class FeatureCache:
+    """Directory of feature arrays, one (n_clips, n_frames, dim) .npy plus a .json description per key."""
+
+    def __init__(self, root=FEATURE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, source_path, transform):
+        return fingerprint(transform.config(), config_values(), source_fingerprint(source_path))
+
+    def path(self, key):
+        return os.path.join(self.root, key + ".npy")
+
+    def get(self, source_path, transform, batch_size=BATCH_SIZE):
+        """Memory-mapped features of every clip of source_path in open_source order, computed on a miss."""
+
+        path = self.path(self.key(source_path, transform))
+        if not os.path.exists(path):
+            self.build(source_path, transform, path, batch_size)
+        return np.load(path, mmap_mode="r")
+
+    def build(self, source_path, transform, path, batch_size=BATCH_SIZE):
+        """Compute the features batch by batch into a temporary memory map, then rename it into place."""
+
+        from .augment_loader import open_source
+
+        source = open_source(source_path)
+        tmp_path = f"{path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                        shape=(len(source), transform.n_frames, transform.dim))
+        start_time = time.time()
+        try:
+            for start in range(0, len(source), batch_size):
+                clips = [source[i][:2] for i in range(start, min(start + batch_size, len(source)))]
+                out[start:start + len(clips)] = transform.clips(clips)
+            out.flush()
+            del out
+            with open(path[:-len(".npy")] + ".json", "w", encoding="utf-8") as f:
+                json.dump({**transform.config(), "layout": transform.layout(), "n_clips": len(source),
+                           "source": os.path.abspath(source_path), "seconds": time.time() - start_time}, f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+def main(argv=None, prog=None):
+    import argparse
+    from .augment_loader import open_source
+
+    parser = argparse.ArgumentParser(prog=prog, description="Compute and cache derived features of keypoint clips.")
+    parser.add_argument("source", help="packed dataset directory or folder of dense clips")
+    parser.add_argument("--features", default=",".join(DEFAULT_FEATURES), help=f"comma separated, from {sorted(FEATURES)}")
+    parser.add_argument("--frames", type=int, default=K)
+    parser.add_argument("--cache", default=FEATURE_DIR, help="feature cache directory")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--compare", action="store_true", help="also time the features computed one clip at a time")
+    args = parser.parse_args(argv)
+
+    transform = FeatureTransform(args.features.split(","), args.frames)
+    cache = FeatureCache(args.cache)
+    start_time = time.time()
+    features = cache.get(args.source, transform, args.batch_size)
+    print(f"Features {features.shape} in {time.time() - start_time:.3f}s: {cache.path(cache.key(args.source, transform))}")
+    print(json.dumps(transform.layout()))
+    if args.compare:
+        source = open_source(args.source)
+        clips = [source[i][:2] for i in range(len(source))]
+        start_time = time.time()
+        single = np.concatenate([transform.clips([clip]) for clip in clips])
+        per_clip = time.time() - start_time
+        start_time = time.time()
+        batched = transform.clips(clips)
+        print(f"{len(clips)} clips: one at a time {per_clip:.3f}s, batched {time.time() - start_time:.3f}s, "
+              f"max difference {np.abs(single - batched).max():.2e}")
+
+if __name__ == "__main__":
+    main()
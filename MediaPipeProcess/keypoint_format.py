@@ -0,0 +1,116 @@
+import os
+import numpy as np
+from .config import (N_LANDMARKS, N_HAND_LANDMARKS, N_POSE_LANDMARKS, LEFT_HAND_OFFSET, RIGHT_HAND_OFFSET,
+                    POSE_OFFSET, LEFT_HAND_PRESENT, RIGHT_HAND_PRESENT)
+
+DTYPE = np.float32
+MASK_SUFFIX = ".mask.npy"
+EMPTY_SUFFIX = ".empty"
+
+def mask_path(path):
+    """Path of the presence bitmask stored next to a dense keypoint file."""
+
+    root = path[:-len(".npy")] if path.endswith(".npy") else path
+    return root + MASK_SUFFIX
+
+def empty_path(path):
+    """Marker written in place of a keypoint file when its video has no frame with a hand."""
+
+    root = path[:-len(".npy")] if path.endswith(".npy") else path
+    return root + EMPTY_SUFFIX
+
+def word_label(record):
+    """Stripped word of a metadata record, None when the record has no word or a blank one."""
+
+    word = (record or {}).get("word")
+    if not isinstance(word, str):
+        return None
+    return word.strip() or None
+
+def clip_path(keypoints_dir, video_id, word=None):
+    """
+    Keypoint file of a video: in the folder of its word (see word_label) when it has one, flat in
+    keypoints_dir otherwise. Shared by batch_extract, dataset_check and the packer.
+    """
+
+    target_dir = os.path.join(keypoints_dir, word) if word else keypoints_dir
+    return os.path.join(target_dir, video_id + ".npy")
+
+def is_keypoint_file(name):
+    """Check whether a file name is a dense keypoint clip (not its mask)."""
+
+    return name.endswith(".npy") and not name.endswith(MASK_SUFFIX)
+
+def frames_to_array(list_frames):
+    """Convert [left_hand, right_hand, pose] nested lists into a (frames, N_LANDMARKS, 3) float32 array."""
+
+    keypoints = np.zeros((len(list_frames), N_LANDMARKS, 3), dtype=DTYPE)
+    for t, (left_hand, right_hand, pose) in enumerate(list_frames):
+        keypoints[t, LEFT_HAND_OFFSET:LEFT_HAND_OFFSET + N_HAND_LANDMARKS] = left_hand
+        keypoints[t, RIGHT_HAND_OFFSET:RIGHT_HAND_OFFSET + N_HAND_LANDMARKS] = right_hand
+        keypoints[t, POSE_OFFSET:POSE_OFFSET + N_POSE_LANDMARKS] = pose
+    return keypoints
+
+def array_to_frames(keypoints):
+    """Convert a dense clip back into the [left_hand, right_hand, pose] nested lists used by create_point."""
+
+    keypoints = np.asarray(keypoints)
+    return [[frame[LEFT_HAND_OFFSET:LEFT_HAND_OFFSET + N_HAND_LANDMARKS].tolist(),
+             frame[RIGHT_HAND_OFFSET:RIGHT_HAND_OFFSET + N_HAND_LANDMARKS].tolist(),
+             frame[POSE_OFFSET:POSE_OFFSET + N_POSE_LANDMARKS].tolist()] for frame in keypoints]
+
+def presence_mask(keypoints):
+    """Per-frame bitmask with LEFT_HAND_PRESENT / RIGHT_HAND_PRESENT set for detected hands."""
+
+    keypoints = np.asarray(keypoints)
+    left = np.any(keypoints[:, LEFT_HAND_OFFSET:LEFT_HAND_OFFSET + N_HAND_LANDMARKS] != 0, axis=(1, 2))
+    right = np.any(keypoints[:, RIGHT_HAND_OFFSET:RIGHT_HAND_OFFSET + N_HAND_LANDMARKS] != 0, axis=(1, 2))
+    return (left * LEFT_HAND_PRESENT | right * RIGHT_HAND_PRESENT).astype(np.uint8)
+
+def save_keypoints(path, keypoints, mask=None):
+    """Save one clip as a contiguous float32 .npy plus its presence bitmask."""
+
+    keypoints = np.ascontiguousarray(keypoints, dtype=DTYPE).reshape(-1, N_LANDMARKS, 3)
+    if mask is None:
+        mask = presence_mask(keypoints)
+    if not path.endswith(".npy"):
+        path += ".npy"
+    np.save(path, keypoints)
+    np.save(mask_path(path), np.asarray(mask, dtype=np.uint8))
+    return path
+
+def load_keypoints(path, mmap_mode="r"):
+    """
+    Load a dense clip and its presence bitmask without copying (memory-mapped by default).
+    The mask is recomputed when the clip was saved without one.
+    """
+
+    keypoints = np.load(path, mmap_mode=mmap_mode)
+    if os.path.exists(mask_path(path)):
+        mask = np.load(mask_path(path), mmap_mode=mmap_mode)
+    else:
+        mask = presence_mask(keypoints)
+    return keypoints, mask
+
+def load_legacy(path):
+    """Load an object-dtype .npy written by the old write_data as a dense float32 array."""
+
+    return frames_to_array(np.load(path, allow_pickle=True))
+
+def convert_legacy_dir(input_dir, output_dir):
+    """Convert every object-dtype .npy under input_dir to the dense format, keeping the folder layout."""
+
+    n_converted = 0
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if not is_keypoint_file(name):
+                continue
+            source_path = os.path.join(root, name)
+            target_dir = os.path.join(output_dir, os.path.relpath(root, input_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            try:
+                save_keypoints(os.path.join(target_dir, name), load_legacy(source_path))
+                n_converted += 1
+            except Exception as e:
+                print(f"error convert: {source_path} with {e}")
+    return n_converted
@@ -0,0 +1,285 @@
+"""
+Counters, histograms and spans shared by the crawler, extraction and augmentation code.
+Observations are aggregated in memory (cheap enough for per-frame use) and written to the
+configured backends as snapshots every FLUSH_INTERVAL seconds and at exit; spans are also
+written one record each, so stragglers can be found afterwards. Nothing is written until a
+command line tool or pipeline calls configure(), whose default backend appends JSON lines to
+METRICS_PATH; serve_prometheus exposes the same registry as Prometheus text.
+Only the standard library is used so the crawler and MediaPipeProcess can both import this one.
+"""
+
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+
+METRICS_PATH = "logs/metrics.jsonl"
+FLUSH_INTERVAL = 30.0
+# Upper bounds shared by every histogram: milliseconds, bytes per second and so on
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10_000, 30_000, 60_000, 300_000,
+           1e6, 1e7, 1e8, 1e9)
+PROMETHEUS_PORT = 9464
+SUMMARY_FIELDS = ("time", "count", "sum", "mean", "min", "max", "p50", "p90", "p99")
+
+class JsonLinesBackend:
+    """Appends records to a JSON-lines file, opened on first write."""
+
+    def __init__(self, path=METRICS_PATH):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+
+    def write(self, records):
+        lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self.file = open(self.path, "a", encoding="utf-8")
+            # One write per batch keeps lines from different worker processes whole
+            self.file.write(lines)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+class MemoryBackend:
+    """Keeps records in a list, for tests and notebooks."""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+    def close(self):
+        pass
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q."""
+
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (self.max,), self.buckets):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / max(self.count, 1),
+                "min": self.min, "max": self.max, "p50": self.quantile(0.5), "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99)}
+
+class Registry:
+    """Process-wide metric store feeding one or more backends."""
+
+    def __init__(self, backends=None, flush_interval=FLUSH_INTERVAL):
+        self.backends = [JsonLinesBackend()] if backends is None else list(backends)
+        self.flush_interval = flush_interval
+        self.counters = {}
+        self.histograms = {}
+        self.pending = []
+        self.lock = threading.Lock()
+        self.last_flush = time.time()
+
+    def counter(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+        self._maybe_flush()
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Time the block into the <name>_ms histogram and write one span record; the yielded dict
+        can receive extra fields (bytes, frames, ...). Exceptions are recorded and re-raised.
+        """
+
+        fields = {}
+        start = time.time()
+        start_counter = time.perf_counter()
+        status = "ok"
+        try:
+            yield fields
+        except BaseException as e:
+            status = "error"
+            fields["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration_ms = 1000 * (time.perf_counter() - start_counter)
+            # Callers that handle their own errors can still mark the span failed
+            status = fields.pop("status", status)
+            self.observe(name + "_ms", duration_ms, **labels)
+            self.counter(name + "_total", status=status, **labels)
+            record = {"type": "span", "name": name, "start": start, "duration_ms": duration_ms, "status": status,
+                      "pid": os.getpid(), **labels, **fields}
+            with self.lock:
+                self.pending.append(record)
+
+    def snapshot(self):
+        """Current counters and histogram summaries as records."""
+
+        now = time.time()
+        with self.lock:
+            records = [{"type": "counter", "name": name, "time": now, "pid": os.getpid(), "value": value,
+                        **dict(labels)} for (name, labels), value in self.counters.items()]
+            records += [{"type": "histogram", "name": name, "time": now, "pid": os.getpid(), **dict(labels),
+                         **histogram.summary()} for (name, labels), histogram in self.histograms.items()]
+        return records
+
+    def _maybe_flush(self):
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write pending spans and a snapshot of every metric to the backends."""
+
+        self.last_flush = time.time()
+        with self.lock:
+            records, self.pending = self.pending, []
+        records += self.snapshot()
+        if not records:
+            return
+        for backend in self.backends:
+            backend.write(records)
+
+    def close(self):
+        self.flush()
+        for backend in self.backends:
+            backend.close()
+
+    def prometheus_text(self):
+        """Registry in the Prometheus text exposition format."""
+
+        def label_text(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in items) + "}"
+
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{label_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, histogram.buckets):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+# Library calls only aggregate in memory until configure() picks the output
+registry = Registry(backends=[])
+_closed_at_exit = False
+
+def configure(backends=None, path=None, flush_interval=FLUSH_INTERVAL):
+    """
+    Replace the process registry: backends=[] disables output, path redirects the default JSON lines.
+    The registry in place at exit is flushed and closed. Returns the new registry.
+    """
+
+    global registry, _closed_at_exit
+    registry.close()
+    if backends is None:
+        backends = [JsonLinesBackend(path or METRICS_PATH)]
+    registry = Registry(backends, flush_interval)
+    if not _closed_at_exit:
+        atexit.register(lambda: registry.close())
+        _closed_at_exit = True
+    return registry
+
+def counter(name, value=1, **labels):
+    registry.counter(name, value, **labels)
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+def span(name, **labels):
+    return registry.span(name, **labels)
+
+def flush():
+    registry.flush()
+
+def serve_prometheus(port=PROMETHEUS_PORT, host="127.0.0.1"):
+    """Serve the registry of this process at http://host:port/metrics from a daemon thread."""
+
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="prometheus", daemon=True).start()
+    return server
+
+def summarize(path=METRICS_PATH, top=10):
+    """Slowest spans and latest histogram summaries of a JSON-lines metrics file."""
+
+    spans = []
+    histograms = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["type"] == "span":
+                spans.append(record)
+            elif record["type"] == "histogram":
+                # Snapshots are cumulative, keep the latest one of every series
+                labels = tuple(sorted((k, v) for k, v in record.items() if k not in SUMMARY_FIELDS))
+                histograms[labels] = record
+    slowest = sorted(spans, key=lambda record: record["duration_ms"], reverse=True)[:top]
+    return {"spans": len(spans), "errors": sum(record["status"] == "error" for record in spans),
+            "slowest": slowest, "histograms": list(histograms.values())}
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(summarize(sys.argv[1] if len(sys.argv) > 1 else METRICS_PATH), indent=2, default=str))
@@ -0,0 +1,262 @@
+"""
+Normalized proxy videos for extraction. Each downloaded video is transcoded once into a proxy
+capped at MAX_SIDE pixels and MAX_FPS frames per second, either Motion JPEG (every frame is
+a key frame, cheap to decode and to seek) or raw BGR frames memory-mapped by
+frame_sampling.RawVideo. Proxies are keyed by the source content hash and the proxy settings,
+and the cache directory is bounded in bytes, least recently used first. A proxy being decoded is
+leased (see ProxyCache.lease) so that eviction by another worker never deletes it mid-read.
+Landmarks are normalized to the frame size, so a downscaled proxy keeps their coordinates.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import warnings
+from contextlib import contextmanager
+import numpy as np
+import cv2
+from . import frame_sampling as fsam
+from .extraction_cache import SCHEMA, cached_sha256, fingerprint
+
+PROXY_DIR = "dataset/proxy_cache"
+PROXY_MAX_BYTES = 20 * 1024**3
+MAX_SIDE = 640
+MAX_FPS = 30.0
+JPEG_QUALITY = 90
+MJPG = "mjpg"
+RAW = "raw"
+FORMATS = (MJPG, RAW)
+LEVEL = "proxy"                                             # entries.level of extraction_cache.SCHEMA
+FORMAT_VERSION = 1
+LEASE_SECONDS = 3600.0                                      # a lease left by a crashed worker expires after this
+
+LEASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    owner TEXT PRIMARY KEY,
+    key TEXT,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS leases_key ON leases(key);
+"""
+
+def transcode(source_path, target_path, fmt=MJPG, max_side=MAX_SIDE, max_fps=MAX_FPS, quality=JPEG_QUALITY):
+    """Write the proxy of source_path to target_path; returns (frames written, proxy fps)."""
+
+    cap = cv2.VideoCapture(source_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or max_fps
+    stride = fsam.sampling_stride(cap, target_fps=max_fps) if fps > max_fps else 1
+    fps /= stride
+    writer = None
+    frames = []
+    try:
+        for _, image in fsam.iter_sampled(cap, stride):
+            image = fsam.downscale(image, max_side)
+            if fmt == RAW:
+                frames.append(image)
+                continue
+            if writer is None:
+                writer = cv2.VideoWriter(target_path, cv2.VideoWriter_fourcc(*"MJPG"), fps,
+                                         (image.shape[1], image.shape[0]))
+                writer.set(cv2.VIDEOWRITER_PROP_QUALITY, quality)
+            writer.write(image)
+            frames.append(None)
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    if not frames:
+        raise ValueError(f"no frame decoded from {source_path}")
+    if fmt == RAW:
+        np.save(target_path, np.stack(frames))
+        with open(target_path[:-len(".npy")] + ".json", "w", encoding="utf-8") as f:
+            json.dump({"fps": fps, "source": os.path.abspath(source_path)}, f)
+    return len(frames), fps
+
+class ProxyCache:
+    """Size-bounded directory of proxy videos, safe to share between worker processes."""
+
+    def __init__(self, root=PROXY_DIR, max_bytes=PROXY_MAX_BYTES, fmt=MJPG, max_side=MAX_SIDE, max_fps=MAX_FPS):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown proxy format {fmt!r}, expected one of {FORMATS}")
+        # One sub-directory per format, so eviction always knows the files of an entry
+        self.root = os.path.join(root, fmt)
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.max_side = max_side
+        self.max_fps = max_fps
+        os.makedirs(self.root, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.root, "proxy.sqlite"), timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(LEASE_SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def settings(self):
+        """Everything that changes the proxy frames, also part of the extraction cache key of proxied videos."""
+
+        return {"format": self.fmt, "max_side": self.max_side, "max_fps": self.max_fps, "version": FORMAT_VERSION}
+
+    def key(self, source_path):
+        return fingerprint(LEVEL, cached_sha256(self.conn, source_path), self.settings())
+
+    def path(self, key):
+        return os.path.join(self.root, key + (fsam.RAW_VIDEO_SUFFIX if self.fmt == RAW else ".avi"))
+
+    def _files(self, key):
+        path = self.path(key)
+        return [path, path[:-len(".npy")] + ".json"] if self.fmt == RAW else [path]
+
+    def get(self, source_path):
+        """Path of the proxy of source_path, transcoding it on a miss."""
+
+        key = self.key(source_path)
+        path = self.path(key)
+        if os.path.exists(path):
+            self.conn.execute("UPDATE entries SET last_access=? WHERE key=?", (time.time(), key))
+            self.conn.commit()
+            return path
+        # Transcode next to the target then rename, so readers never open a partial proxy
+        tmp_key = f"{key}.{os.getpid()}.tmp"
+        try:
+            transcode(source_path, self.path(tmp_key), self.fmt, self.max_side, self.max_fps)
+        except Exception:
+            for tmp_file in self._files(tmp_key):
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+            raise
+        for tmp_file, file in zip(self._files(tmp_key), self._files(key)):
+            os.replace(tmp_file, file)
+        size = sum(os.path.getsize(file) for file in self._files(key))
+        self.conn.execute("INSERT OR REPLACE INTO entries(key, level, source, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                          (key, LEVEL, os.path.abspath(source_path), size, time.time()))
+        self.conn.commit()
+        if size > self.max_bytes:
+            warnings.warn(f"proxy of {source_path} ({size} bytes) is larger than the whole cache ({self.max_bytes} bytes)")
+        self.evict(keep=key)
+        return path
+
+    @contextmanager
+    def lease(self, source_path, seconds=LEASE_SECONDS):
+        """
+        Path of the proxy of source_path (see get), protected from eviction by every worker sharing
+        the cache until the block exits. The lease is taken before the lookup, so a concurrent
+        evict either sees it or has already finished and get transcodes the proxy again.
+        """
+
+        key = self.key(source_path)
+        owner = uuid.uuid4().hex
+        self.conn.execute("INSERT INTO leases(owner, key, expires) VALUES (?, ?, ?)",
+                          (owner, key, time.time() + seconds))
+        self.conn.commit()
+        try:
+            yield self.get(source_path)
+        finally:
+            self.conn.execute("DELETE FROM leases WHERE owner=?", (owner,))
+            self.conn.commit()
+
+    def size(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self, max_bytes=None, keep=None):
+        """
+        Drop least recently used proxies until the cache fits in max_bytes, never the proxy keyed keep
+        (the one get is about to return) nor a leased one; returns the number dropped.
+        """
+
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        # Holds the write lock until the files are gone, so no lease can be taken in between
+        self.conn.execute("BEGIN IMMEDIATE")
+        total = self.size()
+        leased = {row[0] for row in self.conn.execute("SELECT key FROM leases WHERE expires>?", (time.time(),))}
+        dropped = 0
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= max_bytes:
+                break
+            if key == keep or key in leased:
+                continue
+            self._remove(key)
+            total -= size
+            dropped += 1
+        self.conn.commit()
+        return dropped
+
+    def _remove(self, key):
+        for file in self._files(key):
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+        self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+
+    def stats(self):
+        n_leases = self.conn.execute("SELECT COUNT(*) FROM leases WHERE expires>?", (time.time(),)).fetchone()[0]
+        return {"entries": self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0], "bytes": self.size(),
+                "max_bytes": self.max_bytes, "leases": n_leases, **self.settings()}
+
+# Per worker process cache connection, set by init_worker
+_worker_cache = None
+
+def init_worker(root, max_bytes, fmt, max_side, max_fps):
+    global _worker_cache
+    _worker_cache = ProxyCache(root, max_bytes, fmt, max_side, max_fps)
+
+def build_one(source_path):
+    start_time = time.time()
+    try:
+        _worker_cache.get(source_path)
+    except Exception as e:
+        return source_path, time.time() - start_time, f"{type(e).__name__}: {e}"
+    return source_path, time.time() - start_time, None
+
+def build_proxies(video_paths, root=PROXY_DIR, max_bytes=PROXY_MAX_BYTES, fmt=MJPG, max_side=MAX_SIDE,
+                  max_fps=MAX_FPS, num_workers=None):
+    """Transcode every video missing from the cache across a process pool; returns the failed paths."""
+
+    from multiprocessing import Pool
+
+    failed = []
+    start_time = time.time()
+    with Pool(num_workers or os.cpu_count(), initializer=init_worker,
+              initargs=(root, max_bytes, fmt, max_side, max_fps)) as pool:
+        for done, (source_path, elapsed, error) in enumerate(pool.imap_unordered(build_one, video_paths), 1):
+            if error:
+                failed.append(source_path)
+                print(f"[{done}/{len(video_paths)}] error proxy: {source_path} with {error}")
+            else:
+                print(f"[{done}/{len(video_paths)}] {source_path} in {elapsed:.2f}s")
+    print(f"Built proxies of {len(video_paths) - len(failed)} videos in {time.time() - start_time:.2f}s, "
+          f"{len(failed)} failed.")
+    return failed
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Transcode downloaded videos into normalized proxies.")
+    parser.add_argument("video_dir")
+    parser.add_argument("--root", default=PROXY_DIR, help="proxy cache directory")
+    parser.add_argument("--format", choices=FORMATS, default=MJPG)
+    parser.add_argument("--max-side", type=int, default=MAX_SIDE)
+    parser.add_argument("--max-fps", type=float, default=MAX_FPS)
+    parser.add_argument("--max-bytes", type=int, default=PROXY_MAX_BYTES)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    video_paths = sorted(os.path.join(args.video_dir, name) for name in os.listdir(args.video_dir)
+                         if name.endswith(".mp4"))
+    build_proxies(video_paths, args.root, args.max_bytes, args.format, args.max_side, args.max_fps, args.workers)
+    with ProxyCache(args.root, args.max_bytes, args.format, args.max_side, args.max_fps) as cache:
+        print(json.dumps(cache.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Nearest-neighbour sign retrieval over dense keypoint clips. Every clip is resampled to K
+frames, centred on the shoulder midpoint and scaled by the shoulder width (pose 11/12),
+then flattened into one row of a float32 matrix. Queries are answered in batches with one
+matrix product; an optional DTW stage re-ranks the best candidates, visiting them in
+LB_Keogh order and stopping once the lower bound exceeds the current k-th distance.
+The index is stored as append-only segments, so newly crawled words are added without
+rewriting what is already on disk.
+"""
+
+import os
+import json
+import numpy as np
+from . import keypoint_format as kf
+from .augment_loader import open_source
+from .keypoint_features import normalize_body, resample_clips
+from .config import K, N_LANDMARKS, LEFT_HAND_PRESENT, RIGHT_HAND_PRESENT
+
+TOP_K = 5
+RERANK = 50                                                 # candidates re-ranked by DTW
+WINDOW = 3                                                  # Sakoe-Chiba band of the DTW, in frames
+RECORDS_NAME = "records.jsonl"
+META_NAME = "index.json"
+
+def segment_name(segment_id):
+    return f"segment_{segment_id:05d}.npy"
+
+def normalize_clip(keypoints, mask=None, n_frames=K):
+    """
+    (n_frames, N_LANDMARKS, 3) float32 copy of a clip resampled to n_frames, with the shoulder
+    midpoint at the origin and unit shoulder width (keypoint_features.normalize_body).
+    Undetected hands stay at zero.
+    """
+
+    keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, N_LANDMARKS, 3)
+    return normalize_body(*resample_clips([(keypoints, mask)], n_frames))[0]
+
+def envelope(sequences, window=WINDOW):
+    """Upper and lower LB_Keogh envelopes of (n, frames, features) sequences."""
+
+    upper = sequences.copy()
+    lower = sequences.copy()
+    for shift in range(1, window + 1):
+        np.maximum(upper[:, shift:], sequences[:, :-shift], out=upper[:, shift:])
+        np.maximum(upper[:, :-shift], sequences[:, shift:], out=upper[:, :-shift])
+        np.minimum(lower[:, shift:], sequences[:, :-shift], out=lower[:, shift:])
+        np.minimum(lower[:, :-shift], sequences[:, shift:], out=lower[:, :-shift])
+    return upper, lower
+
+def lb_keogh(query, upper, lower):
+    """Lower bound of the squared-distance DTW between query (frames, features) and each enveloped candidate."""
+
+    above = np.maximum(query - upper, 0)
+    below = np.maximum(lower - query, 0)
+    return (above**2 + below**2).sum(axis=(1, 2))
+
+def dtw(query, candidates, window=WINDOW):
+    """Banded DTW with squared Euclidean frame cost between query (frames, features) and each of candidates."""
+
+    n_frames = len(query)
+    # (candidates, query frame, candidate frame) cost matrix in one product
+    cost = ((query**2).sum(axis=1)[None, :, None] - 2 * np.einsum("if,cjf->cij", query, candidates)
+            + (candidates**2).sum(axis=2)[:, None, :])
+    np.maximum(cost, 0, out=cost)
+    total = np.full((len(candidates), n_frames + 1, n_frames + 1), np.inf, dtype=np.float64)
+    total[:, 0, 0] = 0
+    for i in range(1, n_frames + 1):
+        for j in range(max(1, i - window), min(n_frames, i + window) + 1):
+            total[:, i, j] = cost[:, i - 1, j - 1] + np.minimum(np.minimum(total[:, i - 1, j], total[:, i, j - 1]),
+                                                                total[:, i - 1, j - 1])
+    return total[:, n_frames, n_frames]
+
+class SignIndex:
+    """Normalized clip matrix with its records, for top-k queries and incremental adds."""
+
+    def __init__(self, n_frames=K, window=WINDOW):
+        self.n_frames = n_frames
+        self.window = window
+        self.records = []
+        self.ids = set()
+        self.vectors = np.empty((0, n_frames * N_LANDMARKS * 3), dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+        self.upper = self.lower = None
+        self.n_saved = 0
+        self.n_segments = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, clips):
+        """Append (keypoints, mask, record) clips whose id is not indexed yet; returns the number added."""
+
+        new_clips = []
+        for keypoints, mask, record in clips:
+            if record["id"] in self.ids:
+                continue
+            new_clips.append((np.asarray(keypoints, dtype=np.float32).reshape(-1, N_LANDMARKS, 3), mask))
+            self.records.append({"id": record["id"], "word": record.get("word")})
+            self.ids.add(record["id"])
+        if new_clips:
+            rows = normalize_body(*resample_clips(new_clips, self.n_frames)).reshape(len(new_clips), -1)
+            self.vectors = np.concatenate([self.vectors, rows])
+            self.norms = np.concatenate([self.norms, (rows**2).sum(axis=1)])
+            self.upper = self.lower = None
+        return len(new_clips)
+
+    def add_source(self, source_path):
+        """Add every clip of a packed dataset or folder of dense clips (see augment_loader.open_source)."""
+
+        source = open_source(source_path)
+        clips = []
+        for i in range(len(source)):
+            keypoints, mask, record = source[i]
+            if "id" not in record:
+                # ClipFolder: the word is the sub-folder and the id the file name
+                record = {"id": os.path.splitext(os.path.basename(record["path"]))[0],
+                          "word": source.words[source.label(i)]}
+            clips.append((keypoints, mask, record))
+        return self.add(clips)
+
+    def _envelopes(self):
+        if self.upper is None:
+            self.upper, self.lower = envelope(self.vectors.reshape(len(self), self.n_frames, -1), self.window)
+        return self.upper, self.lower
+
+    def search(self, queries, k=TOP_K, rerank=0):
+        """
+        Top-k neighbours of a batch of normalized queries (n, n_frames, N_LANDMARKS, 3) as (indices, distances),
+        each (n, k). Distances are squared Euclidean, or DTW costs when rerank > 0 candidates are re-ranked.
+        """
+
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.vectors.shape[1])
+        k = min(k, len(self))
+        n_candidates = max(k, min(rerank, len(self)))
+        distances = (queries**2).sum(axis=1)[:, None] - 2 * queries @ self.vectors.T + self.norms[None, :]
+        candidates = np.argpartition(distances, n_candidates - 1, axis=1)[:, :n_candidates]
+        if not rerank:
+            candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+            order = np.argsort(candidate_distances, axis=1)[:, :k]
+            return np.take_along_axis(candidates, order, axis=1), np.maximum(
+                np.take_along_axis(candidate_distances, order, axis=1), 0)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        costs = np.empty((len(queries), k))
+        for row, (query, query_candidates) in enumerate(zip(queries, candidates)):
+            indices[row], costs[row] = self._rerank(query.reshape(self.n_frames, -1), query_candidates, k)
+        return indices, costs
+
+    def _rerank(self, query, candidates, k):
+        """DTW top-k among candidates, skipping those whose LB_Keogh already exceeds the k-th best."""
+
+        upper, lower = self._envelopes()
+        bounds = lb_keogh(query, upper[candidates], lower[candidates])
+        order = np.argsort(bounds)
+        sequences = self.vectors.reshape(len(self), self.n_frames, -1)
+        best_indices = np.empty(0, dtype=np.int64)
+        best_costs = np.empty(0)
+        # Chunks of k keep the DTW vectorized while still pruning on the bound
+        for start in range(0, len(order), k):
+            chunk = candidates[order[start:start + k]]
+            if len(best_costs) == k:
+                chunk = chunk[bounds[order[start:start + k]] < best_costs[-1]]
+                if not len(chunk):
+                    break
+            best_indices = np.concatenate([best_indices, chunk])
+            best_costs = np.concatenate([best_costs, dtw(query, sequences[chunk], self.window)])
+            keep = np.argsort(best_costs)[:k]
+            best_indices, best_costs = best_indices[keep], best_costs[keep]
+        return best_indices, best_costs
+
+    def query(self, keypoints, mask=None, k=TOP_K, rerank=0):
+        """Top-k matches of one raw clip as [{"id", "word", "distance"}]."""
+
+        indices, distances = self.search(normalize_clip(keypoints, mask, self.n_frames)[None], k, rerank)
+        return [{**self.records[i], "distance": float(distance)} for i, distance in zip(indices[0], distances[0])]
+
+    def save(self, index_dir):
+        """Write the rows added since the last save as a new segment and append their records."""
+
+        os.makedirs(index_dir, exist_ok=True)
+        if len(self) > self.n_saved:
+            np.save(os.path.join(index_dir, segment_name(self.n_segments)), self.vectors[self.n_saved:])
+            with open(os.path.join(index_dir, RECORDS_NAME), "a", encoding="utf-8") as f:
+                for record in self.records[self.n_saved:]:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.n_segments += 1
+            self.n_saved = len(self)
+        # Written last: a crash before this line leaves the previous segment count in place
+        with open(os.path.join(index_dir, META_NAME), "w", encoding="utf-8") as f:
+            json.dump({"n_frames": self.n_frames, "window": self.window, "segments": self.n_segments,
+                       "clips": self.n_saved}, f)
+
+    @classmethod
+    def load(cls, index_dir):
+        with open(os.path.join(index_dir, META_NAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(meta["n_frames"], meta["window"])
+        with open(os.path.join(index_dir, RECORDS_NAME), "r", encoding="utf-8") as f:
+            index.records = [json.loads(line) for line in f if line.strip()][:meta["clips"]]
+        index.ids = {record["id"] for record in index.records}
+        segments = [np.load(os.path.join(index_dir, segment_name(i))) for i in range(meta["segments"])]
+        if segments:
+            index.vectors = np.concatenate(segments)
+        index.norms = (index.vectors**2).sum(axis=1)
+        index.n_saved = len(index.records)
+        index.n_segments = meta["segments"]
+        return index
+
+    @classmethod
+    def open(cls, index_dir, n_frames=K, window=WINDOW):
+        """Load index_dir if it holds an index, otherwise start an empty one."""
+
+        if os.path.exists(os.path.join(index_dir, META_NAME)):
+            return cls.load(index_dir)
+        return cls(n_frames, window)
+
+def benchmark_latency(sizes, n_queries=32, k=TOP_K, rerank=RERANK, seed=0):
+    """Query latency in ms against index size, on random clips (batched and single query, with and without DTW)."""
+
+    import time
+
+    rng = np.random.default_rng(seed)
+    results = {}
+    for size in sizes:
+        index = SignIndex()
+        clips = rng.normal(size=(size, K, N_LANDMARKS, 3)).astype(np.float32)
+        index.add((clip, np.full(K, LEFT_HAND_PRESENT | RIGHT_HAND_PRESENT, dtype=np.uint8), {"id": str(i)})
+                  for i, clip in enumerate(clips))
+        queries = np.stack([normalize_clip(clip) for clip in clips[:n_queries]])
+        index.search(queries[:1], k, rerank)
+        timings = {}
+        for name, batch, n_rerank in (("batch", queries, 0), ("single", queries[:1], 0),
+                                      ("single_dtw", queries[:1], rerank)):
+            start_time = time.perf_counter()
+            index.search(batch, k, n_rerank)
+            timings[name + "_ms"] = 1000 * (time.perf_counter() - start_time) / len(batch)
+        results[size] = timings
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build, query or benchmark the sign retrieval index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="add the clips of a dataset or folder (only new ids)")
+    build.add_argument("source", help="packed dataset directory or folder of dense clips")
+    build.add_argument("index_dir")
+    query = subparsers.add_parser("query", help="top-k matches of a dense clip file")
+    query.add_argument("index_dir")
+    query.add_argument("clip")
+    query.add_argument("--k", type=int, default=TOP_K)
+    query.add_argument("--rerank", type=int, default=0, help="DTW re-rank this many candidates")
+    bench = subparsers.add_parser("bench", help="query latency against index size on random clips")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000])
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = SignIndex.open(args.index_dir)
+        n_added = index.add_source(args.source)
+        index.save(args.index_dir)
+        print(f"Added {n_added} clips, index holds {len(index)}.")
+    elif args.command == "query":
+        index = SignIndex.load(args.index_dir)
+        keypoints, mask = kf.load_keypoints(args.clip)
+        for match in index.query(keypoints, mask, args.k, args.rerank):
+            print(f"{match['distance']:10.3f}  {match['id']}  {match['word']}")
+    else:
+        print(json.dumps(benchmark_latency(args.sizes), indent=2))
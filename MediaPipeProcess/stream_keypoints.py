@@ -0,0 +1,213 @@
+"""
+Live keypoint streaming: a capture thread feeds a bounded drop-oldest queue, an inference
+worker runs Holistic on the newest frames, and a sliding window keeps the latest keypoint
+sequence in the N_LANDMARKS layout for a downstream classifier. A video file can stand in
+for the camera, paced at its own fps so drops and latency behave as they would live.
+"""
+
+import time
+import threading
+from collections import deque
+import cv2
+import numpy as np
+from . import keypoint_extract as md
+from .config import K, N_LANDMARKS
+
+QUEUE_SIZE = 4                                              # frames waiting for inference, older ones are dropped
+WINDOW = 60                                                 # frames kept in the sliding window
+
+class DropOldestQueue:
+    """Bounded frame queue where put never blocks: when full the oldest frame is discarded."""
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.items = deque(maxlen=maxsize)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Oldest queued item, or None once the queue is closed and drained (or on timeout)."""
+
+        with self.condition:
+            self.condition.wait_for(lambda: self.items or self.closed, timeout)
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class SlidingWindow:
+    """Ring buffer of the last size keypoint rows and their hand presence bits."""
+
+    def __init__(self, size=WINDOW):
+        self.rows = np.zeros((size, N_LANDMARKS * 3), dtype=np.float32)
+        self.scratch = np.zeros(N_LANDMARKS * 3, dtype=np.float32)
+        self.presence = np.zeros(size, dtype=np.uint8)
+        self.timestamps = np.zeros(size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def next_row(self):
+        """
+        Row to fill for the next frame. It is a scratch row, copied over the oldest slot by commit,
+        so a reader calling sequence() from another thread never sees a half-written frame.
+        """
+
+        return self.scratch
+
+    def commit(self, presence, timestamp):
+        with self.lock:
+            slot = self.count % len(self.rows)
+            self.rows[slot] = self.scratch
+            self.presence[slot] = presence
+            self.timestamps[slot] = timestamp
+            self.count += 1
+
+    def sequence(self, valid_only=False):
+        """
+        Copy of the window in temporal order as ((n, N_LANDMARKS, 3) keypoints, presence);
+        valid_only keeps frames with a hand, like get_valid_frames.
+        """
+
+        with self.lock:
+            n = min(self.count, len(self.rows))
+            order = (np.arange(self.count - n, self.count)) % len(self.rows)
+            rows = self.rows[order]
+            presence = self.presence[order]
+        if valid_only:
+            rows = rows[presence != 0]
+            presence = presence[presence != 0]
+        return rows.reshape(-1, N_LANDMARKS, 3), presence
+
+class KeypointStream:
+    """
+    Capture, inference and windowing of one camera or video source. on_window(keypoints, presence)
+    is called from the inference thread every hop frames once the window holds at least min_frames
+    valid frames; it should return quickly or hand off, since it delays the next inference.
+    """
+
+    def __init__(self, source=0, window=WINDOW, queue_size=QUEUE_SIZE, realtime=None, on_window=None,
+                 hop=1, min_frames=K, runner=None):
+        self.source = source
+        self.is_file = not isinstance(source, int)
+        # Files are paced at their fps by default so they behave like a camera
+        self.realtime = self.is_file if realtime is None else realtime
+        self.queue = DropOldestQueue(queue_size)
+        self.window = SlidingWindow(window)
+        self.on_window = on_window
+        self.hop = hop
+        self.min_frames = min_frames
+        self.runner = runner or md.HolisticRunner()
+        self.latencies = []
+        self.n_captured = 0
+        self.decode_seconds = 0.0
+        self.n_processed = 0
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.start_time = None
+        self.end_time = None
+
+    def capture(self):
+        cap = cv2.VideoCapture(self.source)
+        interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        next_time = time.perf_counter()
+        try:
+            while not self.stop_event.is_set() and cap.isOpened():
+                read_time = time.perf_counter()
+                success, image = cap.read()
+                if not success:
+                    break
+                self.decode_seconds += time.perf_counter() - read_time
+                self.n_captured += 1
+                self.queue.put((time.perf_counter(), image))
+                if self.realtime:
+                    next_time += interval
+                    time.sleep(max(next_time - time.perf_counter(), 0))
+        finally:
+            cap.release()
+            self.queue.close()
+
+    def infer(self):
+        self.runner.start_video()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            captured_at, image = item
+            results = self.runner.process(image)
+            presence = self.runner.extract_into(results, self.window.next_row())
+            self.window.commit(presence, captured_at)
+            self.latencies.append(time.perf_counter() - captured_at)
+            self.n_processed += 1
+            if self.on_window and self.n_processed % self.hop == 0:
+                keypoints, mask = self.window.sequence(valid_only=True)
+                if len(keypoints) >= self.min_frames:
+                    self.on_window(keypoints, mask)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.threads = [threading.Thread(target=self.capture, name="capture", daemon=True),
+                        threading.Thread(target=self.infer, name="inference", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+        self.end_time = time.perf_counter()
+
+    def report(self):
+        """Capture-to-keypoints latency percentiles in ms, throughput and dropped frames."""
+
+        latencies = 1000 * np.asarray(self.latencies)
+        elapsed = (self.end_time or time.perf_counter()) - (self.start_time or time.perf_counter())
+        percentiles = {f"p{q}": float(np.percentile(latencies, q)) if len(latencies) else float("nan")
+                       for q in (50, 90, 99)}
+        # Decoding happens on the capture thread, the runner only sees the later stages
+        stages = dict(self.runner.report()["ms_per_frame"])
+        stages["decode"] = 1000 * self.decode_seconds / max(self.n_captured, 1)
+        return {"captured": self.n_captured, "processed": self.n_processed, "dropped": self.queue.dropped,
+                "fps": self.n_processed / max(elapsed, 1e-9), "latency_ms": percentiles,
+                "stage_ms_per_frame": stages}
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream keypoints from a camera or a video file.")
+    parser.add_argument("source", nargs="?", default="0", help="camera index or video path")
+    parser.add_argument("--window", type=int, default=WINDOW)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--no-realtime", action="store_true", help="read files as fast as possible")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    windows = []
+    stream = KeypointStream(source, window=args.window, queue_size=args.queue_size,
+                            realtime=False if args.no_realtime else None,
+                            on_window=lambda keypoints, presence: windows.append(len(keypoints))).start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+            stream.stop()
+        else:
+            stream.join()
+    except KeyboardInterrupt:
+        stream.stop()
+    report = stream.report()
+    report["windows"] = len(windows)
+    print(json.dumps(report, indent=2))
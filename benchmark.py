@@ -0,0 +1,329 @@
+"""
+Benchmark suite for the extraction, frame selection, augmentation and crawl stages, and for
+the cold start of the MediaPipeProcess command line.
+Every stage runs in a fresh process so its peak RSS is its own. The report is written
+as JSON and compared against a stored baseline: metrics ending in _per_sec must not drop,
+metrics ending in _ms or _mb must not grow, by more than the tolerance.
+
+    python benchmark.py                      # run everything, write benchmark_report.json
+    python benchmark.py --save-baseline      # also store the result as the new baseline
+    python benchmark.py --stages kmeans crawl
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+import logging
+import platform
+import resource
+import tempfile
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_DIR = os.path.join(ROOT, "notebooks", "dataset", "videos")
+REPORT_PATH = "benchmark_report.json"
+BASELINE_PATH = "benchmark_baseline.json"
+TOLERANCE = 0.2                                             # relative slowdown reported as a regression
+KMEANS_LENGTHS = [50, 100, 200, 400, 800]
+MOCK_PAGES = 8
+MOCK_VIDEOS = 40
+MOCK_VIDEO_BYTES = 512 * 1024
+# Fresh interpreters timed by the startup stage: the CLI commands and the heaviest import
+STARTUP_COMMANDS = {
+    "python": ["-c", "pass"],
+    "cli_extract": ["-m", "MediaPipeProcess", "extract", "--help"],
+    "cli_augment": ["-m", "MediaPipeProcess", "augment", "--help"],
+    "cli_pack": ["-m", "MediaPipeProcess", "pack", "--help"],
+    "import_create_numpy_data": ["-c", "import MediaPipeProcess.create_numpy_data"],
+}
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def sample_videos(limit=None):
+    names = sorted(name for name in os.listdir(SAMPLE_DIR) if name.endswith(".mp4"))
+    return [os.path.join(SAMPLE_DIR, name) for name in names[:limit]]
+
+def bench_extraction(limit=5):
+    """Decode, mediapipe_detection and extract_keypoints time per frame on the sample clips."""
+
+    import cv2
+    import mediapipe as mp
+    from MediaPipeProcess import keypoint_extract as md
+
+    timings = {"decode": 0.0, "detect": 0.0, "extract": 0.0, "extract_into": 0.0}
+    row = np.empty(md.N_LANDMARKS * 3, dtype=np.float32)
+    n_frames = 0
+    videos = sample_videos(limit)
+    start_time = time.perf_counter()
+    for path in videos:
+        model = mp.solutions.holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        cap = cv2.VideoCapture(path)
+        while True:
+            t0 = time.perf_counter()
+            success, image = cap.read()
+            t1 = time.perf_counter()
+            if not success:
+                break
+            _, results = md.mediapipe_detection(image, model)
+            t2 = time.perf_counter()
+            md.extract_keypoints(results)
+            t3 = time.perf_counter()
+            md.extract_keypoints_into(results, row)
+            t4 = time.perf_counter()
+            timings["decode"] += t1 - t0
+            timings["detect"] += t2 - t1
+            timings["extract"] += t3 - t2
+            timings["extract_into"] += t4 - t3
+            n_frames += 1
+        cap.release()
+        model.close()
+    elapsed = time.perf_counter() - start_time
+    n_frames = max(n_frames, 1)
+    metrics = {f"{stage}_ms": 1000 * seconds / n_frames for stage, seconds in timings.items()}
+    metrics.update({"frames": n_frames, "frames_per_sec": n_frames / elapsed, "clips_per_sec": len(videos) / elapsed})
+    return metrics
+
+def random_sequence(n_frames, rng):
+    """Smooth random walk with the row width of get_valid_frames."""
+
+    from MediaPipeProcess.config import N_LANDMARKS
+
+    steps = rng.normal(scale=0.01, size=(n_frames, N_LANDMARKS * 3))
+    return (0.5 + np.cumsum(steps, axis=0)).astype(np.float32)
+
+def bench_kmeans(lengths=KMEANS_LENGTHS, repeats=5):
+    """Reference KMeans keyframe selection time against sequence length."""
+
+    from MediaPipeProcess import frame_selection as fsel
+
+    rng = np.random.default_rng(0)
+    # scikit-learn is imported on first use, keep that out of the timings (the startup stage covers it)
+    fsel.select_kmeans(random_sequence(lengths[0], rng), random_state=0)
+    metrics = {}
+    for n_frames in lengths:
+        sequences = [random_sequence(n_frames, rng) for _ in range(repeats)]
+        start_time = time.perf_counter()
+        for X in sequences:
+            fsel.select_kmeans(X, random_state=0)
+        elapsed = time.perf_counter() - start_time
+        metrics[f"len_{n_frames}_ms"] = 1000 * elapsed / repeats
+    return metrics
+
+def bench_augmentation(n_frames=20, repeats=20):
+    """create_frame_0/create_frame_t (list based) and augment_clip (vectorized) throughput."""
+
+    import random
+    from MediaPipeProcess import create_point as cp
+    from MediaPipeProcess import augmentation as aug
+    from MediaPipeProcess import keypoint_format as kf
+
+    clip = random_sequence(n_frames, np.random.default_rng(1)).reshape(n_frames, -1, 3)
+    list_frames = kf.array_to_frames(clip)
+    list_rng = random.Random(2)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        cp.augment_frames(list_frames, list_rng)
+    list_elapsed = time.perf_counter() - start_time
+
+    rng = np.random.default_rng(2)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        aug.augment_clip(clip, 1, rng)
+    vector_elapsed = time.perf_counter() - start_time
+    return {"create_frame_frames_per_sec": repeats * n_frames / list_elapsed,
+            "augment_clip_frames_per_sec": repeats * n_frames / vector_elapsed,
+            "augment_clip_clips_per_sec": repeats / vector_elapsed}
+
+MOCK_ITEM = """  <div class="col-md-3">
+    <a href="javascript:void(0)" onclick="modalData('{id}', '{word}', '', 1)">
+      <img src="/thumbs/{id}.png" alt="">
+      <p class="text-center">{word}</p>
+    </a>
+  </div>
+"""
+
+def mock_page(page_num, per_page):
+    """Dictionary listing page in the markup of the live site (see tests/fixtures/dictionary)."""
+
+    items = "".join(MOCK_ITEM.format(id=f"V{i:05d}", word=f"word {i % 7}")
+                    for i in range((page_num - 1) * per_page, page_num * per_page))
+    return (f'<!DOCTYPE html>\n<html lang="vi">\n<head><meta charset="utf-8"></head>\n<body>\n'
+            f'<section id="product" class="row">\n{items}</section>\n</body>\n</html>\n').encode("utf-8")
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    """
+    Serves /page<n>.html listing pages and /videos/<id>.mp4 of a fixed size with Range support,
+    like the dictionary site.
+    """
+
+    payload = b""
+    per_page = 1
+
+    def do_GET(self):
+        if self.path.startswith("/page"):
+            self.send_page(int(self.path[len("/page"):].split(".")[0]))
+        else:
+            self.send_video()
+
+    def send_page(self, page_num):
+        body = mock_page(page_num, self.per_page)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_video(self):
+        body = self.payload
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+def bench_crawl(n_pages=MOCK_PAGES, n_videos=MOCK_VIDEOS, video_bytes=MOCK_VIDEO_BYTES):
+    """
+    Full crawl_pipeline.run_pipeline with the HTTP listing backend against a local mock site:
+    page listing, downloads, crawl state and metadata writes running concurrently.
+    """
+
+    from crawl_pipeline import run_pipeline
+
+    logging.getLogger("qipedc_scraper").setLevel(logging.WARNING)
+    MockSiteHandler.payload = os.urandom(video_bytes)
+    MockSiteHandler.per_page = n_videos // n_pages
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockSiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    work_dir = tempfile.mkdtemp(prefix="crawl_bench_")
+    try:
+        metadata_path = os.path.join(work_dir, "metadata.jsonl")
+        video_dir = os.path.join(work_dir, "videos")
+        start_time = time.perf_counter()
+        run_pipeline(metadata_path=metadata_path, video_dir=video_dir, num_pages=n_pages,
+                     state_path=os.path.join(work_dir, "state.sqlite"), backend="http",
+                     page_url=base_url + "/page{page}.html", base_url=base_url)
+        elapsed = time.perf_counter() - start_time
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            n_records = sum(1 for line in f if line.strip())
+        n_downloaded = len([name for name in os.listdir(video_dir) if name.endswith(".mp4")])
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {"pages_per_sec": n_pages / elapsed, "records_per_sec": n_records / elapsed,
+            "download_mb_per_sec": n_downloaded * video_bytes / 1e6 / elapsed,
+            "records": n_records, "downloaded": n_downloaded}
+
+def bench_startup(repeats=3):
+    """Wall time of fresh interpreters running the CLI or importing a module (best of repeats)."""
+
+    metrics = {}
+    for name, args in STARTUP_COMMANDS.items():
+        best = float("inf")
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=ROOT, check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - start_time)
+        metrics[f"{name}_ms"] = 1000 * best
+    return metrics
+
+STAGES = {
+    "extraction": bench_extraction,
+    "kmeans": bench_kmeans,
+    "augmentation": bench_augmentation,
+    "crawl": bench_crawl,
+    "startup": bench_startup,
+}
+
+def run_stage(name):
+    """Entry point of the stage child process."""
+
+    start_time = time.perf_counter()
+    metrics = STAGES[name]()
+    metrics["wall_ms"] = 1000 * (time.perf_counter() - start_time)
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    return metrics
+
+def run_stages(names):
+    context = multiprocessing.get_context("spawn")
+    report = {}
+    for name in names:
+        with context.Pool(1) as pool:
+            report[name] = pool.apply(run_stage, (name,))
+        print(f"{name}: {json.dumps(report[name])}")
+    return report
+
+def lower_is_better(metric):
+    return metric.endswith("_ms") or metric.endswith("_mb")
+
+def higher_is_better(metric):
+    return metric.endswith("_per_sec")
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Metrics that got worse than the baseline by more than tolerance, as readable strings."""
+
+    regressions = []
+    for stage, metrics in report.items():
+        for metric, value in metrics.items():
+            old = baseline.get(stage, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            if (higher_is_better(metric) and value < old * (1 - tolerance)) or \
+                    (lower_is_better(metric) and value > old * (1 + tolerance)):
+                regressions.append(f"{stage}.{metric}: {old:.4g} -> {value:.4g} ({(value - old) / old:+.0%})")
+    return regressions
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the extraction, augmentation and crawl pipelines.")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--report", default=REPORT_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    report = {"environment": {"python": platform.python_version(), "machine": platform.machine(),
+                              "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}}
+    stages = run_stages(args.stages)
+    report.update(stages)
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(stages, json.load(f), args.tolerance)
+    report["regressions"] = regressions
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(stages, f, indent=2)
+    for line in regressions:
+        print("REGRESSION " + line)
+    print(f"Report written to {args.report}, {len(regressions)} regressions.")
+    sys.exit(1 if regressions else 0)
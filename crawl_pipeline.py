@@ -0,0 +1,208 @@
+import time
+import queue
+import threading
+
+from data_crawling import (sync_metadata, apply_repairs, retry_unfinished, log, VIDEO_DIR, METADATA_PATH, NUM_PAGES,
+                           CHUNK_SIZE)
+from crawl_state import CrawlState, STATE_PATH, DONE, FAILED
+from listing import open_listing, AUTO, BACKENDS, BASE_URL, PAGE_URL, PAGE_WORKERS
+from downloader import VideoDownloader, DOWNLOAD_WORKERS, PER_HOST_CONNECTIONS
+from metadata_store import MetadataSink, BATCH_SIZE, FLUSH_INTERVAL
+from MediaPipeProcess import metrics
+
+QUEUE_SIZE = 64                                             # videos waiting for a download worker
+PUT_TIMEOUT = 1.0                                           # seconds between checks that the consumers still run
+REPORT_INTERVAL = 30.0
+
+class StageStats:
+    """Item count and throughput of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.end_time = None
+
+    def add(self, n=1):
+        with self.lock:
+            self.items += n
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def report(self) -> str:
+        elapsed = (self.end_time or time.time()) - self.start_time
+        return f"{self.name}: {self.items} items in {elapsed:.1f}s ({self.items / max(elapsed, 1e-9):.2f}/s)"
+
+def put_while_alive(item_queue, item, consumers):
+    """Put item on a bounded queue, raising RuntimeError instead of blocking forever once every consumer died."""
+
+    while True:
+        try:
+            item_queue.put(item, timeout=PUT_TIMEOUT)
+            return
+        except queue.Full:
+            if not any(consumer.is_alive() for consumer in consumers):
+                raise RuntimeError(f"all {len(consumers)} consumers of the queue have stopped")
+
+def produce(listing, state, start_page, num_pages, download_queue, metadata_queue, stats, consumers):
+    """
+    List the dictionary pages with a listing backend and emit video records onto the queues.
+    Stops, leaving the current page unfinished, when every download consumer has died.
+    """
+
+    page_num = start_page
+    try:
+        for page_num, videos in listing.iter_pages(start_page, num_pages):
+            if videos is None:
+                # Left unfinished, the next run starts again from this page
+                state.mark_page(page_num, FAILED)
+                continue
+            with metrics.span("scrape_page") as span:
+                span["page"] = page_num
+                new_records = state.add_videos([record for record, _ in videos],
+                                               {record['id']: video_data['url'] for record, video_data in videos},
+                                               page_num)
+                span.update(videos=len(videos), new=len(new_records))
+            for record in new_records:
+                metadata_queue.put(record)
+            # Blocks while the downloaders are behind, so the listing never runs far ahead
+            with metrics.span("download_queue_wait"):
+                for _, video_data in videos:
+                    put_while_alive(download_queue, video_data, consumers)
+            state.mark_page(page_num, DONE, len(new_records))
+            stats.add(len(videos))
+            log.info(f"Page {page_num}/{num_pages}: {len(videos)} videos, {len(new_records)} new.")
+    except Exception as e:
+        log.error(f"Producer stopped at page {page_num}: {e}")
+    finally:
+        listing.close()
+        stats.finish()
+
+def consume_downloads(downloader, download_queue, stats):
+    """Download worker: drain the queue until the None sentinel."""
+
+    while True:
+        video_data = download_queue.get()
+        if video_data is None:
+            break
+        try:
+            downloader.download(video_data)
+        except Exception as e:
+            # The video stays unfinished in the crawl state and is retried by retry_unfinished
+            log.error(f"Download worker failed on {video_data['id']}: {e}")
+        stats.add()
+
+def write_metadata(sink, metadata_queue, stats):
+    """Feed metadata records to the group-committing sink until the None sentinel."""
+
+    while True:
+        try:
+            record = metadata_queue.get(timeout=sink.flush_interval)
+        except queue.Empty:
+            sink.maybe_flush()
+            continue
+        if record is None:
+            break
+        sink.add(record)
+        stats.add()
+    sink.close()
+
+def run_pipeline(metadata_path=METADATA_PATH, video_dir=VIDEO_DIR, num_pages=NUM_PAGES, state_path=STATE_PATH,
+                 queue_size=QUEUE_SIZE, download_workers=DOWNLOAD_WORKERS, per_host=PER_HOST_CONNECTIONS,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, backend=AUTO, page_url=PAGE_URL,
+                 base_url=BASE_URL, page_workers=PAGE_WORKERS, repair_path=None):
+    """
+    Crawl with three concurrent stages: page enumeration, downloads and metadata writes.
+    Stages are connected by queues, so the total time approaches the slowest stage instead of their sum.
+    Pages are listed over HTTP or in the browser depending on backend (see listing.open_listing).
+    With a dataset_check repair list, the videos it lists are downloaded again.
+    """
+
+    start_time = time.time()
+    state = CrawlState(state_path)
+    sync_metadata(state, metadata_path, video_dir)
+    if repair_path:
+        apply_repairs(state, repair_path, video_dir)
+    start_page = state.first_unfinished_page(num_pages)
+    downloader = VideoDownloader(video_dir, max_workers=download_workers, per_host=per_host,
+                                 chunk_size=CHUNK_SIZE, state=state)
+    download_queue = queue.Queue(maxsize=queue_size)
+    metadata_queue = queue.Queue()
+    producer_stats = StageStats("pages")
+    download_stats = StageStats("downloads")
+    writer_stats = StageStats("metadata")
+
+    sink = MetadataSink(metadata_path, batch_size=batch_size, flush_interval=flush_interval, index=True)
+    writer = threading.Thread(target=write_metadata, args=(sink, metadata_queue, writer_stats),
+                              name="metadata-writer")
+    consumers = [threading.Thread(target=consume_downloads, args=(downloader, download_queue, download_stats),
+                                  name=f"download-{i}") for i in range(download_workers)]
+    writer.start()
+    for consumer in consumers:
+        consumer.start()
+
+    stop_monitor = threading.Event()
+    def monitor():
+        while not stop_monitor.wait(REPORT_INTERVAL):
+            log.info(f"{producer_stats.report()} | {download_stats.report()} (queued {download_queue.qsize()}) | "
+                     f"{writer_stats.report()}")
+    threading.Thread(target=monitor, daemon=True).start()
+
+    if start_page <= num_pages:
+        log.info(f"Starting pipeline at page {start_page}/{num_pages}.")
+        try:
+            listing = open_listing(backend, video_dir, num_pages, page_url=page_url, base_url=base_url,
+                                   workers=page_workers)
+        except Exception as e:
+            log.error(f"Failed to open the {backend} listing: {e}")
+            producer_stats.finish()
+        else:
+            produce(listing, state, start_page, num_pages, download_queue, metadata_queue, producer_stats,
+                    consumers)
+    else:
+        log.info(f"All {num_pages} pages already scraped.")
+    for _ in consumers:
+        try:
+            put_while_alive(download_queue, None, consumers)
+        except RuntimeError:
+            break
+    for consumer in consumers:
+        consumer.join()
+    download_stats.finish()
+    metadata_queue.put(None)
+    writer.join()
+    writer_stats.finish()
+    stop_monitor.set()
+
+    retry_unfinished(state, downloader)
+    downloader.close()
+    for stats in (producer_stats, download_stats, writer_stats):
+        log.info(stats.report())
+    log.info(f"Pipeline done in {time.time() - start_time:.1f}s. Crawl state: {state.summary()}")
+    state.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Crawl the dictionary with the streaming pipeline.")
+    parser.add_argument("--num-pages", type=int, default=NUM_PAGES)
+    parser.add_argument("--metrics", default=metrics.METRICS_PATH, help="JSON-lines metrics output")
+    parser.add_argument("--prometheus-port", type=int, default=None, help="serve /metrics on this local port")
+    parser.add_argument("--backend", choices=BACKENDS, default=AUTO, help="page listing backend")
+    parser.add_argument("--page-url", default=PAGE_URL, help="listing page url template with a {page} field")
+    parser.add_argument("--base-url", default=BASE_URL, help="site serving /videos/<id>.mp4 for HTTP listings")
+    parser.add_argument("--page-workers", type=int, default=PAGE_WORKERS, help="pages fetched concurrently over HTTP")
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--video-dir", default=VIDEO_DIR)
+    parser.add_argument("--state", default=STATE_PATH, help="crawl state database")
+    parser.add_argument("--repair", default=None, metavar="FILE", help="dataset_check repair list to download again")
+    args = parser.parse_args()
+
+    metrics.configure(path=args.metrics)
+    if args.prometheus_port:
+        metrics.serve_prometheus(args.prometheus_port)
+    run_pipeline(metadata_path=args.metadata, video_dir=args.video_dir, num_pages=args.num_pages,
+                 state_path=args.state, backend=args.backend, page_url=args.page_url,
+                 base_url=args.base_url, page_workers=args.page_workers, repair_path=args.repair)
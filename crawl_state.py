@@ -0,0 +1,116 @@
+import os
+import time
+import sqlite3
+import threading
+
+STATE_PATH = 'dataset/crawl_state.sqlite'
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    page_num INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    n_videos INTEGER DEFAULT 0,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS videos (
+    id TEXT PRIMARY KEY,
+    word TEXT,
+    url TEXT,
+    page_num INTEGER,
+    size INTEGER,
+    checksum TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS videos_status ON videos(status);
+"""
+
+class CrawlState:
+    """Persistent crawl progress: page status and per-video download state in SQLite."""
+
+    def __init__(self, path: str = STATE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        # Downloads update the state from worker threads, guarded by self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # Pages
+    def mark_page(self, page_num: int, status: str, n_videos: int = 0):
+        self._execute("INSERT INTO pages(page_num, status, n_videos, updated_at) VALUES (?, ?, ?, ?) "
+                      "ON CONFLICT(page_num) DO UPDATE SET status=excluded.status, "
+                      "n_videos=excluded.n_videos, updated_at=excluded.updated_at",
+                      (page_num, status, n_videos, time.time()))
+
+    def first_unfinished_page(self, num_pages: int) -> int:
+        """First page in 1..num_pages that is not done yet (num_pages + 1 when all are done)."""
+        done = {row[0] for row in self._query("SELECT page_num FROM pages WHERE status = ?", (DONE,))}
+        for page_num in range(1, num_pages + 1):
+            if page_num not in done:
+                return page_num
+        return num_pages + 1
+
+    # Videos
+    def add_videos(self, records, urls: dict, page_num: int = None):
+        """Register metadata records with their download urls; return only the records not seen before."""
+        new_records = []
+        with self.lock:
+            for record in records:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO videos(id, word, url, page_num, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record['id'], record['word'], urls[record['id']], page_num, PENDING, time.time()))
+                if cursor.rowcount:
+                    new_records.append(record)
+            self.conn.commit()
+        return new_records
+
+    def mark_video_done(self, video_id: str, size: int, checksum: str):
+        self._execute("UPDATE videos SET status=?, size=?, checksum=?, error=NULL, updated_at=? WHERE id=?",
+                      (DONE, size, checksum, time.time(), video_id))
+
+    def mark_video_failed(self, video_id: str, error: str):
+        self._execute("UPDATE videos SET status=?, error=?, updated_at=? WHERE id=?",
+                      (FAILED, error, time.time(), video_id))
+
+    def is_complete(self, video_id: str, output_path: str) -> bool:
+        """A video is complete when recorded as done and the file on disk still has the recorded size."""
+        rows = self._query("SELECT size FROM videos WHERE id=? AND status=?", (video_id, DONE))
+        return bool(rows) and os.path.exists(output_path) and os.path.getsize(output_path) == rows[0][0]
+
+    def unfinished_videos(self):
+        """Videos that are pending or failed, as download_video inputs."""
+        rows = self._query("SELECT id, url FROM videos WHERE status != ?", (DONE,))
+        return [{'id': video_id, 'url': url} for video_id, url in rows]
+
+    def videos(self):
+        """Every registered video in registration order."""
+        rows = self._query("SELECT id, word, url, status FROM videos ORDER BY rowid")
+        return [{'id': video_id, 'word': word, 'url': url, 'status': status} for video_id, word, url, status in rows]
+
+    def n_videos(self) -> int:
+        return self._query("SELECT COUNT(*) FROM videos")[0][0]
+
+    def summary(self) -> dict:
+        rows = self._query("SELECT status, COUNT(*) FROM videos GROUP BY status")
+        return dict(rows)
@@ -4,6 +4,7 @@ import time
 import requests
 from tqdm import tqdm
 import re
+import hashlib
 from html import unescape
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -15,12 +16,17 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
 
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-BASE_URL = "https://qipedc.moet.gov.vn"
-URL = "https://qipedc.moet.gov.vn/dictionary"
+from crawl_state import CrawlState, STATE_PATH, DONE
+from downloader import VideoDownloader, DOWNLOAD_WORKERS, PER_HOST_CONNECTIONS, file_sha256
+from metadata_store import MetadataSink
+from listing import BASE_URL, URL, video_entry
+from MediaPipeProcess import metrics
+
 VIDEO_DIR = 'dataset/videos'
 METADATA_PATH = 'dataset/metadata.jsonl'
 CHUNK_SIZE = 1024*32
@@ -53,15 +59,19 @@ def init_driver(headless: bool = HEADLESS) -> webdriver.Chrome:
     service = Service(ChromeDriverManager().install())
     return webdriver.Chrome(service=service, options=options)
 
-def download_video(video_data, video_dir='dataset/videos', chunk_size=1024*32):
-    """Download one video."""
+def download_video(video_data, video_dir='dataset/videos', chunk_size=1024*32, state=None):
+    """Download one video. With a crawl state, completeness is checked against the recorded size."""
     
     filename = f"{video_data['id']}.mp4"
     os.makedirs(video_dir, exist_ok=True)
     output_path = os.path.join(video_dir, filename)
     
     # Skip if existed
-    if os.path.exists(output_path):
+    if state is not None:
+        if state.is_complete(video_data['id'], output_path):
+            log.debug(f"Skipped complete video {filename}")
+            return
+    elif os.path.exists(output_path):
         log.debug(f"Skipped existing video {filename}")
         return
     
@@ -70,6 +80,8 @@ def download_video(video_data, video_dir='dataset/videos', chunk_size=1024*32):
         response = requests.get(video_data['url'], stream=True, verify=False, timeout=10)
         response.raise_for_status()
         total_size = int(response.headers.get('content-length', 0))
+        digest = hashlib.sha256()
+        size = 0
         
         with open(output_path, 'wb') as f, tqdm(
             total=total_size, unit='B', unit_scale=True, desc=f"Progess {filename}"
@@ -77,69 +89,103 @@ def download_video(video_data, video_dir='dataset/videos', chunk_size=1024*32):
             for chunk in response.iter_content(chunk_size=chunk_size):
                 if chunk:
                     f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
                     bar.update(len(chunk))
-            log.info(f"Downloaded video successfully: {filename}")
+        if total_size and size != total_size:
+            raise IOError(f"truncated download, got {size}/{total_size} bytes")
+        if state is not None:
+            state.mark_video_done(video_data['id'], size, digest.hexdigest())
+        log.info(f"Downloaded video successfully: {filename}")
     except Exception as e:
         log.error(f"Failed to download {filename}: {e}")
+        if state is not None:
+            state.mark_video_failed(video_data['id'], str(e))
         return f"Video {filename} downloaded failed: {e}"
 
-def scrape_one_page(driver, video_dir='dataset/videos', chunk_size=1024*32):
-    """Scrape data included getting metadata and downloading video in one page."""
+def list_page_videos(driver, video_dir='dataset/videos'):
+    """Read (metadata record, download task) pairs of every video shown on the current page."""
+    
+    videos = []
+    for vid in driver.find_elements(By.CSS_SELECTOR, "#product a"):
+        video_id = None
+        try:
+            label = vid.find_element(By.TAG_NAME, "p").text.strip()
+            thumbs_url = vid.find_element(By.CSS_SELECTOR, "img").get_attribute("src")
+            record, video_data = video_entry(label, thumbs_url, video_dir)
+            video_id = record['id']
+            
+            # driver.execute_script("modalData(arguments[0], arguments[1], arguments[2], arguments[3])",
+            #                       id, label, l_definition, flag)
+            # WebDriverWait(driver, WAIT_TIME).until(
+            #     expected_conditions.presence_of_element_located((By.CSS_SELECTOR, "#s_expert"))
+            # )
+            # iframe = driver.find_element(By.CSS_SELECTOR, "#s_expert")
+            # video_data['url'] = iframe.get_attribute("src").replace('?autoplay=true','')
+            
+            videos.append((record, video_data))
+            
+            ## quit modal
+            # driver.execute_script("$('#exampleModal').modal('hide');")
+            # time.sleep(0.5)
+            
+        except Exception as e:
+            log.warning(f"Error at video {video_id}: {e}")
+    return videos
+
+def scrape_one_page(driver, video_dir='dataset/videos', chunk_size=1024*32, state=None, page_num=None,
+                    downloader=None):
+    """
+    Scrape data included getting metadata and downloading video in one page.
+    With a crawl state, only records whose id was not seen before are returned.
+    With a shared downloader, videos are queued on it and the page returns without waiting.
+    """
     
     data = []
-    try:
-        videos = driver.find_elements(By.CSS_SELECTOR, "#product a")
-        start_time = time.time()
-        
-        tasks = []
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            for i, vid in enumerate(videos):
-                try:
-                    video_data = {}
-                    label = vid.find_element(By.TAG_NAME, "p").text.strip()
-                    thumbs_url = vid.find_element(By.CSS_SELECTOR, "img").get_attribute("src")
-                    video_id = thumbs_url.replace("https://qipedc.moet.gov.vn/thumbs/", "").replace(".png", "")
-                    video_url = f"{BASE_URL}/videos/{video_id}.mp4"
-                    
-                    # driver.execute_script("modalData(arguments[0], arguments[1], arguments[2], arguments[3])",
-                    #                       id, label, l_definition, flag)
-                    # WebDriverWait(driver, WAIT_TIME).until(
-                    #     expected_conditions.presence_of_element_located((By.CSS_SELECTOR, "#s_expert"))
-                    # )
-                    # iframe = driver.find_element(By.CSS_SELECTOR, "#s_expert")
-                    # video_data['url'] = iframe.get_attribute("src").replace('?autoplay=true','')
-                    
-                    local_url = os.path.join(video_dir, video_id)
+    with metrics.span("scrape_page") as span:
+        span["page"] = page_num
+        try:
+            start_time = time.time()
+            
+            tasks = []
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                for record, video_data in list_page_videos(driver, video_dir):
                     # add metadata
-                    data.append({
-                        'id': video_id,
-                        'word': label,
-                        'video_url': local_url
-                    })
+                    if state is None or state.add_videos([record], {record['id']: video_data['url']}, page_num):
+                        data.append(record)
                     
                     # create task video download
-                    video_data['id'] = video_id
-                    video_data['url'] = video_url
-                    tasks.append(executor.submit(download_video, video_data, video_dir, chunk_size))
-                    
-                    ## quit modal
-                    # driver.execute_script("$('#exampleModal').modal('hide');")
-                    # time.sleep(0.5)
-                    
-                except Exception as e:
-                    log.warning(f"Error at video {video_data['id']}: {e}")
-            
-            for future in as_completed(tasks):
-                result = future.result()
-                if result:
-                    log.debug(result)
+                    if downloader is not None:
+                        downloader.submit(video_data)
+                    else:
+                        tasks.append(executor.submit(download_video, video_data, video_dir, chunk_size, state))
+                
+                for future in as_completed(tasks):
+                    result = future.result()
+                    if result:
+                        log.debug(result)
 
-        log.info(f"Page scrapped in {time.time() - start_time:.2f}s")
-            
-    except Exception as e:
-        log.error(f"Page scrape failed: {e}")
+            log.info(f"Page scrapped in {time.time() - start_time:.2f}s")
+            span["videos"] = len(data)
+                
+        except Exception as e:
+            log.error(f"Page scrape failed: {e}")
+            span.update(status="error", error=str(e))
     
     return data
+
+def wait_until(driver, condition):
+    """Explicit readiness wait that tolerates elements re-rendered while polling."""
+    return WebDriverWait(driver, WAIT_TIME, poll_frequency=0.1,
+                         ignored_exceptions=(NoSuchElementException, StaleElementReferenceException)).until(condition)
+
+def current_page(driver) -> str:
+    """Value of the highlighted pagination button."""
+    return driver.find_element(By.CSS_SELECTOR, "#pagination-wrapper .btn-info").get_attribute("value")
+
+def first_thumbnail(driver):
+    thumbs = driver.find_elements(By.CSS_SELECTOR, "#product a img")
+    return thumbs[0].get_attribute("src") if thumbs else None
         
 def turn_page(driver, page_num):
     """Go to the page_num page."""
@@ -147,6 +193,8 @@ def turn_page(driver, page_num):
         WebDriverWait(driver, WAIT_TIME).until(
             expected_conditions.presence_of_element_located((By.CSS_SELECTOR, "#pagination-wrapper"))
         )
+        if current_page(driver) == str(page_num):
+            return
         found = False
         attempt = 0
 
@@ -155,12 +203,12 @@ def turn_page(driver, page_num):
             buttons = driver.find_elements(By.CSS_SELECTOR, "#pagination-wrapper button.page")
             for btn in buttons:
                 if btn.get_attribute("value") == str(page_num):
+                    old_thumbnail = first_thumbnail(driver)
                     driver.execute_script("arguments[0].click();", btn)
-                    time.sleep(1.5)
-
-                    # Page is showing
-                    current_page = driver.find_element(By.CSS_SELECTOR, "#pagination-wrapper .btn-info")
-                    log.info(f"Page {current_page.get_attribute('value')} is being opened.")
+                    
+                    # Wait until the page is highlighted and its videos replaced the old ones
+                    wait_until(driver, lambda d: current_page(d) == str(page_num) and first_thumbnail(d) != old_thumbnail)
+                    log.info(f"Page {current_page(driver)} is being opened.")
                     found = True
                     break
                 
@@ -169,8 +217,9 @@ def turn_page(driver, page_num):
             
             next_btn = driver.find_element(By.CSS_SELECTOR, "#pagination-wrapper button.next")
             if next_btn.is_enabled():
+                old_page = current_page(driver)
                 driver.execute_script("arguments[0].click();", next_btn)
-                time.sleep(1)
+                wait_until(driver, lambda d: current_page(d) != old_page)
             else:
                 log.error(f"Cannot found page {page_num}, no next button available.")
                 break  
@@ -197,29 +246,101 @@ def safe_turn_page(driver, page_num):
     return driver
 
 def save_jsonl(data, output_path):
-    """Append JSON lines to file."""
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "a", encoding="utf-8") as f:
-        for item in data:
-            f.write(json.dumps(item, ensure_ascii=False) + "\n")
-            f.flush()
-            os.fsync(f.fileno())
-    log.info(f"Saved {len(data)} records to {output_path}.")
+    """Append JSON lines to file, group-committed by MetadataSink."""
+    with MetadataSink(output_path) as sink:
+        sink.extend(data)
+        sink.flush()
 
-def scrape_data(metadata_path='dataset/metadata.jsonl', video_dir='dataset/videos', num_pages=219):
-    """Scrape all pages."""
+def sync_metadata(state, metadata_path, video_dir='dataset/videos'):
+    """
+    Reconcile metadata.jsonl with the crawl state. An empty state is seeded with the records already
+    in the file, done with their size and checksum when the video is on disk and pending otherwise,
+    and videos registered in the state but never written (crash in between) are appended.
+    """
+    records = []
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    if not state.n_videos() and records:
+        urls = {record['id']: f"{BASE_URL}/videos/{record['id']}.mp4" for record in records}
+        new_records = state.add_videos(records, urls)
+        n_downloaded = 0
+        for record in new_records:
+            output_path = os.path.join(video_dir, f"{record['id']}.mp4")
+            if os.path.exists(output_path):
+                state.mark_video_done(record['id'], os.path.getsize(output_path), file_sha256(output_path))
+                n_downloaded += 1
+        log.info(f"Imported {len(new_records)} existing records from {metadata_path} into crawl state "
+                 f"({n_downloaded} already downloaded).")
     
-    driver = init_driver()
+    written = {record['id'] for record in records}
+    missing = [{'id': video['id'], 'word': video['word'], 'video_url': os.path.join(video_dir, video['id'])}
+               for video in state.videos() if video['id'] not in written]
+    if missing:
+        save_jsonl(missing, metadata_path)
+
+def apply_repairs(state, repair_path, video_dir='dataset/videos'):
+    """
+    Queue the videos of a dataset_check repair list for download again: each one is removed
+    from disk (a partial .part is kept for Range resume) and marked failed in the crawl state,
+    so retry_unfinished picks it up.
+    """
+    with open(repair_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)["redownload"]
+    for entry in entries:
+        url = entry['url'] or f"{BASE_URL}/videos/{entry['id']}.mp4"
+        record = {'id': entry['id'], 'word': entry['word'], 'video_url': os.path.join(video_dir, entry['id'])}
+        state.add_videos([record], {entry['id']: url})
+        output_path = os.path.join(video_dir, f"{entry['id']}.mp4")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        state.mark_video_failed(entry['id'], "integrity check: " + "; ".join(entry['reasons']))
+    log.info(f"Queued {len(entries)} videos from {repair_path} for download again.")
+    return len(entries)
+
+def retry_unfinished(state, downloader):
+    """Download again every video recorded as pending or failed."""
+    videos = state.unfinished_videos()
+    if not videos:
+        return
+    log.info(f"Retrying {len(videos)} unfinished downloads ...")
+    for video_data in videos:
+        downloader.submit(video_data)
+    downloader.join()
+
+def scrape_data(metadata_path='dataset/metadata.jsonl', video_dir='dataset/videos', num_pages=219,
+                state_path=STATE_PATH):
+    """Scrape all pages, resuming from the first page the crawl state has not finished."""
+    
+    state = CrawlState(state_path)
+    sync_metadata(state, metadata_path, video_dir)
+    downloader = VideoDownloader(video_dir, max_workers=DOWNLOAD_WORKERS, per_host=PER_HOST_CONNECTIONS,
+                                 chunk_size=CHUNK_SIZE, state=state)
     start_time = time.time()
-    page_num = 1
+    page_num = state.first_unfinished_page(num_pages)
+    if page_num > num_pages:
+        log.info(f"All {num_pages} pages already scraped.")
+        retry_unfinished(state, downloader)
+        downloader.close()
+        log.info(f"Crawl state: {state.summary()}")
+        state.close()
+        return
     
+    driver = init_driver()
     try:
         driver.get(URL)
         driver.implicitly_wait(5)
         log.info(f"Connected to {driver.title} ({driver.current_url})")
+        if page_num > 1:
+            log.info(f"Resuming from page {page_num}.")
+            driver = safe_turn_page(driver, page_num)
     except Exception as e:
         log.error(f"Failed to connect: {e}")
         driver.quit()
+        downloader.close()
+        state.close()
         return
     
     while page_num <= num_pages:
@@ -232,8 +353,10 @@ def scrape_data(metadata_path='dataset/metadata.jsonl', video_dir='dataset/video
             except Exception as e:
                 driver = safe_turn_page(driver, num_pages)
                     
-            page_data = scrape_one_page(driver, video_dir, chunk_size=1024*32)
+            page_data = scrape_one_page(driver, video_dir, chunk_size=CHUNK_SIZE, state=state, page_num=page_num,
+                                        downloader=downloader)
             save_jsonl(page_data, metadata_path)
+            state.mark_page(page_num, DONE, len(page_data))
             
             if page_num < num_pages:
                 driver = safe_turn_page(driver, page_num + 1)
@@ -252,7 +375,16 @@ def scrape_data(metadata_path='dataset/metadata.jsonl', video_dir='dataset/video
             driver = safe_turn_page(driver, page_num)
         
     driver.quit()   
+    downloader.join()
+    retry_unfinished(state, downloader)
+    downloader.close()
     log.info(f"Done scraping {num_pages} pages in {time.time() - start_time:.4f}s")
+    log.info(f"Crawl state: {state.summary()}")
+    state.close()
     
 if __name__ == "__main__":
-    scrape_data(metadata_path=METADATA_PATH, video_dir=VIDEO_DIR, num_pages=NUM_PAGES)
\ No newline at end of file
+    # scrape_data stays for the notebooks; the command line runs the streaming pipeline (see crawl_pipeline)
+    from crawl_pipeline import run_pipeline
+
+    metrics.configure()
+    run_pipeline(metadata_path=METADATA_PATH, video_dir=VIDEO_DIR, num_pages=NUM_PAGES)
\ No newline at end of file
@@ -0,0 +1,190 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+from MediaPipeProcess import metrics
+
+log = logging.getLogger("qipedc_scraper")
+
+DOWNLOAD_WORKERS = 8
+PER_HOST_CONNECTIONS = 4
+RETRIES = 3
+BACKOFF = 1.0
+TIMEOUT = 10
+CHUNK_SIZE = 1024*32
+PART_SUFFIX = ".part"
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024*1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class VideoDownloader:
+    """
+    Long-lived download pool shared by every page of a crawl.
+    One pooled requests.Session, at most per_host concurrent transfers per host,
+    retries with exponential backoff, Range resume of .part files, atomic rename
+    on completion and a single aggregate progress meter.
+    """
+
+    def __init__(self, video_dir='dataset/videos', max_workers=DOWNLOAD_WORKERS, per_host=PER_HOST_CONNECTIONS,
+                 retries=RETRIES, backoff=BACKOFF, chunk_size=CHUNK_SIZE, timeout=TIMEOUT, state=None, verify=False):
+        self.video_dir = video_dir
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.state = state
+        os.makedirs(video_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self.host_slots = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        self.host_lock = threading.Lock()
+        self.futures = []
+
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.bytes_done = 0
+        self.n_done = 0
+        self.n_failed = 0
+        self.bar = tqdm(total=0, unit='B', unit_scale=True, desc="Downloading")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _slot(self, url):
+        with self.host_lock:
+            return self.host_slots[urlparse(url).netloc]
+
+    def _progress(self, n_bytes=0, total=0):
+        with self.lock:
+            self.bytes_done += n_bytes
+            if total:
+                self.bar.total += total
+                self.bar.refresh()
+            if n_bytes:
+                self.bar.update(n_bytes)
+
+    def submit(self, video_data):
+        """Queue one {'id', 'url'} video; returns its future."""
+        future = self.executor.submit(self.download, video_data)
+        self.futures.append(future)
+        return future
+
+    def join(self):
+        """Wait for every queued download."""
+        wait(self.futures)
+        self.futures = [future for future in self.futures if not future.done()]
+
+    def close(self):
+        self.join()
+        self.executor.shutdown()
+        self.session.close()
+        self.bar.close()
+        log.info(self.report())
+
+    def report(self) -> str:
+        elapsed = time.time() - self.start_time
+        return (f"Downloaded {self.n_done} videos ({self.bytes_done / 1e6:.1f} MB, {self.n_failed} failed) "
+                f"in {elapsed:.1f}s: {self.bytes_done / 1e6 / max(elapsed, 1e-9):.2f} MB/s")
+
+    def is_complete(self, video_id, output_path):
+        if self.state is not None:
+            return self.state.is_complete(video_id, output_path)
+        return os.path.exists(output_path)
+
+    def download(self, video_data):
+        """Download one video with retries; returns an error message on failure like download_video."""
+        filename = f"{video_data['id']}.mp4"
+        output_path = os.path.join(self.video_dir, filename)
+        if self.is_complete(video_data['id'], output_path):
+            log.debug(f"Skipped complete video {filename}")
+            return
+
+        error = None
+        with metrics.span("download") as span:
+            span["id"] = video_data['id']
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    metrics.counter("download_retries")
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                try:
+                    with self._slot(video_data['url']):
+                        size, checksum = self._fetch(video_data['url'], output_path)
+                    if self.state is not None:
+                        self.state.mark_video_done(video_data['id'], size, checksum)
+                    with self.lock:
+                        self.n_done += 1
+                    span.update(bytes=size, attempts=attempt + 1)
+                    log.info(f"Downloaded video successfully: {filename}")
+                    return
+                except (requests.RequestException, IOError) as e:
+                    error = e
+                    log.warning(f"Attempt {attempt + 1}/{self.retries + 1} for {filename} failed: {e}")
+
+            with self.lock:
+                self.n_failed += 1
+            span.update(status="error", error=str(error), attempts=self.retries + 1)
+        log.error(f"Failed to download {filename}: {error}")
+        if self.state is not None:
+            self.state.mark_video_failed(video_data['id'], str(error))
+        return f"Video {filename} downloaded failed: {error}"
+
+    def _fetch(self, url, output_path):
+        """Stream url into output_path + PART_SUFFIX, resuming it with a Range request, then rename."""
+        part_path = output_path + PART_SUFFIX
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        start_time = time.perf_counter()
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                response.close()
+                # Nothing left to send: the part file is complete only if it has the size in "bytes */<size>"
+                total = response.headers.get('content-range', '').rpartition('/')[2]
+                if not total.isdigit() or int(total) != offset:
+                    log.warning(f"Discarding {part_path}: {offset} bytes, server has {total or 'unknown'}")
+                    os.remove(part_path)
+                    return self._fetch(url, output_path)
+                total_size = offset
+            else:
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    # Server ignored the Range header, start over
+                    offset = 0
+                total_size = int(response.headers.get('content-length', 0))
+                total_size = total_size + offset if total_size else 0
+                self._progress(total=max(total_size - offset, 0))
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            self._progress(len(chunk))
+
+        size = os.path.getsize(part_path)
+        if size > offset:
+            metrics.observe("download_bytes_per_sec", (size - offset) / max(time.perf_counter() - start_time, 1e-9))
+        if total_size and size != total_size:
+            raise IOError(f"truncated download, got {size}/{total_size} bytes")
+        checksum = file_sha256(part_path)
+        os.replace(part_path, output_path)
+        return size, checksum
@@ -0,0 +1,227 @@
+import os
+import time
+import logging
+import posixpath
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from downloader import RETRIES, BACKOFF, TIMEOUT
+from MediaPipeProcess import metrics
+
+log = logging.getLogger("qipedc_scraper")
+
+BASE_URL = "https://qipedc.moet.gov.vn"
+URL = "https://qipedc.moet.gov.vn/dictionary"
+PAGE_URL = URL + "?page={page}"                             # listing page template, {page} is 1-based
+PAGE_WORKERS = 8
+HTTP = "http"
+SELENIUM = "selenium"
+AUTO = "auto"
+BACKENDS = (HTTP, SELENIUM, AUTO)
+
+def video_entry(label, thumbs_url, video_dir='dataset/videos', base_url=BASE_URL):
+    """(metadata record, download task) of one listed video; the id is the thumbnail file name."""
+
+    video_id = posixpath.splitext(posixpath.basename(urlparse(thumbs_url).path))[0]
+    record = {
+        'id': video_id,
+        'word': label,
+        'video_url': os.path.join(video_dir, video_id)
+    }
+    return record, {'id': video_id, 'url': f"{base_url}/videos/{video_id}.mp4"}
+
+class ProductParser(HTMLParser):
+    """Collect (label, thumbnail src) of every link inside #product, like the "#product a" selector."""
+
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        self.open_tags = []                                 # elements open inside #product, itself first; empty outside
+        self.link = None
+        self.in_label = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if not self.open_tags:
+            if attrs.get("id") == "product" and tag not in self.VOID_TAGS:
+                self.open_tags.append(tag)
+            return
+        if tag not in self.VOID_TAGS:
+            self.open_tags.append(tag)
+        if tag == "a":
+            self.link = {"label": [], "src": None}
+        elif self.link is not None:
+            if tag == "img" and self.link["src"] is None:
+                self.link["src"] = attrs.get("src")
+            elif tag == "p":
+                self.in_label = True
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        # Stray end tags are ignored, like browsers do
+        if tag not in self.open_tags:
+            return
+        # An end tag also closes the elements left open inside it, e.g. a <p> without </p> in its <a>
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self._close(open_tag)
+            if open_tag == tag:
+                break
+
+    def _close(self, tag):
+        if tag == "p":
+            self.in_label = False
+        elif tag == "a" and self.link is not None:
+            if self.link["src"]:
+                self.items.append((" ".join("".join(self.link["label"]).split()), self.link["src"]))
+            self.link = None
+
+    def handle_data(self, data):
+        if self.in_label and self.link is not None:
+            self.link["label"].append(data)
+
+def parse_listing(html, page_url, video_dir='dataset/videos', base_url=BASE_URL):
+    """Videos of one dictionary page as list_page_videos returns them, from its HTML."""
+
+    parser = ProductParser()
+    parser.feed(html)
+    parser.close()
+    return [video_entry(label, urljoin(page_url, src), video_dir, base_url) for label, src in parser.items]
+
+class HttpListing:
+    """
+    Browser-free listing backend: dictionary pages are fetched over one pooled requests.Session
+    and parsed without rendering, up to workers pages at a time, and yielded in page order.
+    page_url and base_url can point at any server, e.g. saved pages served by python -m http.server.
+    """
+
+    def __init__(self, video_dir='dataset/videos', page_url=PAGE_URL, base_url=BASE_URL, workers=PAGE_WORKERS,
+                 retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT, verify=False):
+        self.video_dir = video_dir
+        self.page_url = page_url
+        self.base_url = base_url
+        self.workers = workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = verify
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def page_videos(self, page_num):
+        """Fetch and parse one page."""
+
+        url = self.page_url.format(page=page_num)
+        with metrics.span("fetch_page") as span:
+            span["page"] = page_num
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            if "charset" not in response.headers.get("content-type", ""):
+                # requests assumes ISO-8859-1 for text without a declared charset, labels are Vietnamese
+                response.encoding = response.apparent_encoding
+            videos = parse_listing(response.text, response.url, self.video_dir, self.base_url)
+            span["videos"] = len(videos)
+        return videos
+
+    def _fetch(self, page_num):
+        try:
+            return page_num, self.page_videos(page_num)
+        except Exception as e:
+            log.error(f"Failed to fetch page {page_num}: {e}")
+            return page_num, None
+
+    def iter_pages(self, start_page, num_pages):
+        """Yield (page_num, videos) for start_page..num_pages in order, videos is None for a failed page."""
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="page") as executor:
+            yield from executor.map(self._fetch, range(start_page, num_pages + 1))
+
+    def probe(self, num_pages):
+        """True when pages are served as HTML with their own videos, not rendered by scripts after load."""
+
+        pages = [page_videos for _, page_videos in self.iter_pages(1, min(num_pages, 2))]
+        if any(not page_videos for page_videos in pages):
+            return False
+        ids = [{record['id'] for record, _ in page_videos} for page_videos in pages]
+        # A server ignoring the page parameter returns page 1 every time
+        return len(ids) == 1 or ids[0] != ids[1]
+
+class SeleniumListing:
+    """Fallback listing backend: one headless Chrome clicking through #pagination-wrapper."""
+
+    def __init__(self, video_dir='dataset/videos', url=URL):
+        import data_crawling
+
+        self.crawling = data_crawling
+        self.video_dir = video_dir
+        self.driver = data_crawling.init_driver()
+        self.driver.get(url)
+        self.driver.implicitly_wait(5)
+        self.page_num = 1
+        log.info(f"Connected to {self.driver.title} ({self.driver.current_url})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.driver.quit()
+
+    def page_videos(self, page_num):
+        if page_num != self.page_num:
+            self.driver = self.crawling.safe_turn_page(self.driver, page_num)
+            self.page_num = page_num
+        return self.crawling.list_page_videos(self.driver, self.video_dir)
+
+    def iter_pages(self, start_page, num_pages):
+        """Yield (page_num, videos) for start_page..num_pages, turning one page at a time."""
+
+        for page_num in range(start_page, num_pages + 1):
+            try:
+                videos = self.page_videos(page_num)
+            except Exception as e:
+                log.error(f"Failed to list page {page_num}: {e}")
+                videos = None
+            yield page_num, videos
+
+def open_listing(backend=AUTO, video_dir='dataset/videos', num_pages=1, **http_options):
+    """
+    Listing backend by name. "auto" uses HTTP when probing the first pages finds their videos
+    in the served HTML and falls back to the browser otherwise.
+    """
+
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown listing backend {backend!r}, expected one of {BACKENDS}")
+    if backend == SELENIUM:
+        return SeleniumListing(video_dir)
+    listing = HttpListing(video_dir, **http_options)
+    if backend == HTTP:
+        return listing
+    start_time = time.time()
+    if listing.probe(num_pages):
+        log.info(f"Listing pages over HTTP (probe took {time.time() - start_time:.2f}s).")
+        return listing
+    log.warning("Pages are not listed in the served HTML, falling back to the browser.")
+    listing.close()
+    return SeleniumListing(video_dir)
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+from MediaPipeProcess import metrics
+
+log = logging.getLogger("qipedc_scraper")
+
+BATCH_SIZE = 100                                            # records per group commit
+FLUSH_INTERVAL = 5.0                                        # seconds before a partial batch is committed
+INDEX_SUFFIX = ".index.sqlite"
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    word TEXT,
+    video_url TEXT,
+    offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS records_word ON records(word);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+def index_path_for(metadata_path: str) -> str:
+    return os.path.splitext(metadata_path)[0] + INDEX_SUFFIX
+
+def recover_tail(path: str) -> int:
+    """Cut a torn last line left by a crash mid-write; returns the number of bytes dropped."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return 0
+        # Scan back for the last complete line
+        pos = size
+        while pos > 0:
+            step = min(pos, 64*1024)
+            f.seek(pos - step)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                pos = pos - step + newline + 1
+                break
+            pos -= step
+        f.truncate(pos)
+    log.warning(f"Dropped {size - pos} bytes of incomplete record at the end of {path}.")
+    return size - pos
+
+class MetadataIndex:
+    """SQLite index of metadata.jsonl for lookups by id and word without rescanning the file."""
+
+    def __init__(self, metadata_path: str, index_path: str = None):
+        self.metadata_path = metadata_path
+        self.conn = sqlite3.connect(index_path or index_path_for(metadata_path), check_same_thread=False)
+        self.conn.executescript(INDEX_SCHEMA)
+        self.conn.commit()
+        self.refresh()
+
+    def close(self):
+        self.conn.close()
+
+    def indexed_bytes(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key='indexed_bytes'").fetchone()
+        return row[0] if row else 0
+
+    def refresh(self):
+        """Index the complete lines appended since the last refresh (rebuild if the file shrank)."""
+        if not os.path.exists(self.metadata_path):
+            return
+        start = self.indexed_bytes()
+        if start > os.path.getsize(self.metadata_path):
+            self.conn.execute("DELETE FROM records")
+            start = 0
+        rows = []
+        offset = start
+        with open(self.metadata_path, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    record = json.loads(line)
+                    rows.append((record['id'], record.get('word'), record.get('video_url'), offset))
+                offset += len(line)
+        self.add_rows(rows, offset)
+
+    def add_rows(self, rows, indexed_bytes: int):
+        # Duplicated ids keep their first record
+        self.conn.executemany("INSERT OR IGNORE INTO records(id, word, video_url, offset) VALUES (?, ?, ?, ?)", rows)
+        self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('indexed_bytes', ?)", (indexed_bytes,))
+        self.conn.commit()
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def count_by_word(self) -> dict:
+        return dict(self.conn.execute("SELECT word, COUNT(*) FROM records GROUP BY word"))
+
+    def get(self, video_id: str):
+        row = self.conn.execute("SELECT id, word, video_url FROM records WHERE id=?", (video_id,)).fetchone()
+        return {'id': row[0], 'word': row[1], 'video_url': row[2]} if row else None
+
+    def by_word(self, word: str):
+        rows = self.conn.execute("SELECT id, word, video_url FROM records WHERE word=? ORDER BY offset", (word,))
+        return [{'id': video_id, 'word': w, 'video_url': url} for video_id, w, url in rows]
+
+    def ids(self):
+        return {row[0] for row in self.conn.execute("SELECT id FROM records")}
+
+class MetadataSink:
+    """
+    Buffered append-only writer for metadata.jsonl. Records are group-committed
+    (one write and one fsync) every batch_size records or flush_interval seconds,
+    and a torn tail from a previous crash is cut on open. With index=True the
+    id/word index is updated in the same commit.
+    """
+
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 index: bool = False):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        recover_tail(path)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.time()
+        self.n_written = 0
+        self.index = MetadataIndex(path) if index else None
+        self.file = open(path, "ab")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, record: dict):
+        self.buffer.append(record)
+        self.maybe_flush()
+
+    def extend(self, records):
+        self.buffer.extend(records)
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if len(self.buffer) >= self.batch_size or (self.buffer and time.time() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Group commit of every buffered record."""
+        self.last_flush = time.time()
+        if not self.buffer:
+            return
+        with metrics.span("metadata_flush") as span:
+            span["records"] = len(self.buffer)
+            offset = self.file.tell()
+            lines = [(json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8") for item in self.buffer]
+            self.file.write(b"".join(lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            if self.index is not None:
+                rows = []
+                for item, line in zip(self.buffer, lines):
+                    rows.append((item['id'], item.get('word'), item.get('video_url'), offset))
+                    offset += len(line)
+                self.index.add_rows(rows, offset)
+        self.n_written += len(self.buffer)
+        log.info(f"Saved {len(self.buffer)} records to {self.path}.")
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        if self.index is not None:
+            self.index.close()
+
+if __name__ == "__main__":
+    import sys
+    metadata_path = sys.argv[1] if len(sys.argv) > 1 else 'dataset/metadata.jsonl'
+    index = MetadataIndex(metadata_path)
+    print(f"Number of metadata records: {index.count()} unique ids, {len(index.count_by_word())} words")
+    index.close()
@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+
+from MediaPipeProcess import augmentation as aug
+from MediaPipeProcess import create_point as cp
+from MediaPipeProcess import keypoint_format as kf
+from MediaPipeProcess.config import N_LANDMARKS
+
+N_COPIES = 300
+
+
+class Midpoint:
+    """rng stand-in for create_point whose draws are the middle of their range: no noise, mean k."""
+
+    def uniform(self, low, high):
+        return (low + high) / 2
+
+
+def moving_clip(n_frames=20, seed=0):
+    rng = np.random.default_rng(seed)
+    start = 0.5 + rng.uniform(-0.2, 0.2, (1, N_LANDMARKS, 3))
+    return (start + np.cumsum(rng.normal(0, 0.01, (n_frames, N_LANDMARKS, 3)), axis=0)).astype(np.float32)
+
+
+def test_matches_create_point_without_noise():
+    clip = moving_clip()
+    reference = kf.frames_to_array(cp.augment_frames(kf.array_to_frames(clip), Midpoint()))
+    k = sum(aug.K_RANGE) / 2
+    k_body = sum(aug.K_BODY_RANGE) / 2
+
+    augmented = aug.augment_clip(clip, k_range=(k, k), k_body_range=(k_body, k_body), noise_scale=0)[0]
+
+    np.testing.assert_allclose(augmented, reference, atol=1e-6)
+
+
+def test_matches_create_point_statistically():
+    clip = moving_clip()
+    frames = kf.array_to_frames(clip)
+    rng = random.Random(1)
+    reference = np.stack([kf.frames_to_array(cp.augment_frames(frames, rng)) for _ in range(N_COPIES)])[..., :2]
+
+    augmented = aug.augment_clip(clip, N_COPIES, rng=2)[..., :2]
+
+    # Every coordinate has the same mean (within 5 standard errors) and about the same spread
+    standard_error = np.sqrt((reference.var(axis=0) + augmented.var(axis=0)) / N_COPIES)
+    assert np.all(np.abs(reference.mean(axis=0) - augmented.mean(axis=0)) <= 5 * standard_error)
+    ratio = augmented.std(axis=0) / reference.std(axis=0)
+    assert 0.75 < ratio.min() and ratio.max() < 1.33
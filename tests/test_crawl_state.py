@@ -0,0 +1,86 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawl_state import CrawlState, DONE, PENDING
+from downloader import VideoDownloader, file_sha256
+from data_crawling import sync_metadata, retry_unfinished, save_jsonl
+
+
+class VideoHandler(BaseHTTPRequestHandler):
+    """Serves /videos/<id>.mp4 as the bytes of its id repeated, and records every path asked for."""
+
+    def do_GET(self):
+        self.server.requested.append(self.path)
+        body = os.path.basename(self.path).encode() * 1000
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), VideoHandler)
+    server.requested = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def record(video_id):
+    return {"id": video_id, "word": video_id.lower(), "video_url": os.path.join("videos", video_id)}
+
+
+def test_resume_skips_done_and_retries_unfinished(server, tmp_path):
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    video_dir = str(tmp_path / "videos")
+    os.makedirs(video_dir)
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    ids = ["A", "B", "C", "D"]
+    state.add_videos([record(video_id) for video_id in ids],
+                     {video_id: f"{base_url}/videos/{video_id}.mp4" for video_id in ids}, page_num=1)
+    state.mark_page(1, DONE, len(ids))
+    # Interrupted crawl: A finished, B failed, C was cut off mid-transfer, D never started
+    with open(os.path.join(video_dir, "A.mp4"), "wb") as f:
+        f.write(b"A.mp4" * 1000)
+    state.mark_video_done("A", 5000, file_sha256(os.path.join(video_dir, "A.mp4")))
+    state.mark_video_failed("B", "timeout")
+    with open(os.path.join(video_dir, "C.mp4"), "wb") as f:
+        f.write(b"C.mp4" * 10)
+
+    with VideoDownloader(video_dir, max_workers=2, backoff=0, timeout=5, state=state) as downloader:
+        assert {video["id"] for video in state.unfinished_videos()} == {"B", "C", "D"}
+        retry_unfinished(state, downloader)
+
+    assert sorted(server.requested) == ["/videos/B.mp4", "/videos/C.mp4", "/videos/D.mp4"]
+    assert state.summary() == {DONE: 4}
+    assert state.first_unfinished_page(3) == 2
+    for video_id in ids:
+        path = os.path.join(video_dir, f"{video_id}.mp4")
+        assert os.path.getsize(path) == 5000
+        assert state.is_complete(video_id, path)
+    state.close()
+
+
+def test_seeding_imports_downloaded_videos_as_done(tmp_path):
+    video_dir = str(tmp_path / "videos")
+    os.makedirs(video_dir)
+    metadata_path = str(tmp_path / "metadata.jsonl")
+    save_jsonl([record("A"), record("B")], metadata_path)
+    with open(os.path.join(video_dir, "A.mp4"), "wb") as f:
+        f.write(b"video")
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+
+    sync_metadata(state, metadata_path, video_dir)
+
+    assert state.summary() == {DONE: 1, PENDING: 1}
+    assert [video["id"] for video in state.unfinished_videos()] == ["B"]
+    state.close()
@@ -0,0 +1,51 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+from MediaPipeProcess import keypoint_format as kf
+from MediaPipeProcess.batch_extract import collect_jobs
+from MediaPipeProcess.config import K, N_LANDMARKS
+from MediaPipeProcess.dataset_check import verify_dataset
+from MediaPipeProcess.keypoint_dataset import find_clip, pack_dataset
+
+RECORDS = [{"id": "A", "word": " Xin chào "}, {"id": "B", "word": None}, {"id": "C", "word": "  "},
+           {"id": "D", "word": "Ăn"}]
+
+
+def write_video(path, n_frames=8, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, size)
+    for i in range(n_frames):
+        writer.write(np.full((size[1], size[0], 3), 20 * i, dtype=np.uint8))
+    writer.release()
+
+
+def test_check_extract_and_pack_agree_on_clip_paths(tmp_path):
+    video_dir, keypoints_dir = tmp_path / "videos", tmp_path / "keypoints"
+    video_dir.mkdir()
+    metadata_path = tmp_path / "metadata.jsonl"
+    metadata_path.write_text("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in RECORDS),
+                             encoding="utf-8")
+    for record in RECORDS:
+        write_video(video_dir / f"{record['id']}.mp4")
+
+    jobs, _ = collect_jobs(str(video_dir), str(keypoints_dir), str(metadata_path))
+    clip = np.ones((K, N_LANDMARKS, 3), dtype=np.float32)
+    for _, target_dir, file_name in jobs:
+        kf.save_keypoints(os.path.join(target_dir, file_name), clip)
+    outputs = {file_name[:-len(".npy")]: os.path.join(target_dir, file_name) for _, target_dir, file_name in jobs}
+    assert outputs["A"] == str(keypoints_dir / "Xin chào" / "A.npy")
+    assert outputs["B"] == str(keypoints_dir / "B.npy") and outputs["C"] == str(keypoints_dir / "C.npy")
+
+    report = verify_dataset(str(video_dir), str(metadata_path), str(keypoints_dir), state_path=None,
+                            manifest_path=str(tmp_path / "manifest.sqlite"), num_workers=2)
+    assert report["reextract"] == []
+    assert report["summary"]["keypoint_files"] == 4
+    assert report["metadata"]["records_without_word"] == ["B", "C"]
+    for record in RECORDS:
+        assert find_clip(str(keypoints_dir), record) == outputs[record["id"]]
+
+    # Only clips with a word can be labelled
+    index = pack_dataset(str(metadata_path), str(keypoints_dir), str(tmp_path / "packed"))
+    assert [(item["id"], item["word"]) for item in index] == [("A", "Xin chào"), ("D", "Ăn")]
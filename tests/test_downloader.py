@@ -0,0 +1,81 @@
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downloader import VideoDownloader, PART_SUFFIX
+
+VIDEO = bytes(range(256)) * 4096                            # 1 MiB
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves VIDEO with Range support; the first full response is cut off half way."""
+
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get("Range"))
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            if start >= len(VIDEO):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(VIDEO)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(VIDEO) - 1}/{len(VIDEO)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(VIDEO) - start))
+        self.end_headers()
+        body = VIDEO[start:]
+        if not self.server.cut_done:
+            self.server.cut_done = True
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    server.ranges = []
+    server.cut_done = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_resumes_after_cut_off(server, tmp_path):
+    url = f"http://127.0.0.1:{server.server_address[1]}/videos/clip.mp4"
+    with VideoDownloader(str(tmp_path), max_workers=1, backoff=0, timeout=5) as downloader:
+        error = downloader.download({"id": "clip", "url": url})
+
+    assert error is None
+    assert server.ranges == [None, f"bytes={len(VIDEO) // 2}-"]
+    output_path = tmp_path / "clip.mp4"
+    assert not os.path.exists(str(output_path) + PART_SUFFIX)
+    assert hashlib.sha256(output_path.read_bytes()).hexdigest() == hashlib.sha256(VIDEO).hexdigest()
+
+
+@pytest.mark.parametrize("part, requests", [
+    (VIDEO, [f"bytes={len(VIDEO)}-"]),                                  # complete, promoted as is
+    (VIDEO + b"junk", [f"bytes={len(VIDEO) + 4}-", None]),              # larger than the video, restarted
+])
+def test_unsatisfiable_range_checks_part_size(server, tmp_path, part, requests):
+    server.cut_done = True
+    (tmp_path / ("clip.mp4" + PART_SUFFIX)).write_bytes(part)
+    url = f"http://127.0.0.1:{server.server_address[1]}/videos/clip.mp4"
+    with VideoDownloader(str(tmp_path), max_workers=1, backoff=0, timeout=5) as downloader:
+        error = downloader.download({"id": "clip", "url": url})
+
+    assert error is None
+    assert server.ranges == requests
+    assert (tmp_path / "clip.mp4").read_bytes() == VIDEO
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from MediaPipeProcess import create_numpy_data as cnd
+from MediaPipeProcess import keypoint_extract as md
+from MediaPipeProcess.config import K, N_LANDMARKS
+from MediaPipeProcess.extraction_cache import ExtractionCache, RAW, DERIVED
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with ExtractionCache(str(tmp_path / "cache")) as cache:
+        yield cache
+
+
+def raw_frames(n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    raw = rng.random((n_frames, md.N_RAW_LANDMARKS, 4), dtype=np.float32)
+    return raw, np.ones(n_frames, dtype=np.uint8)
+
+
+def test_each_level_is_evicted_least_recently_used_first(cache):
+    raw, presence = raw_frames(10)
+    for i in range(3):
+        cache.put_raw(f"raw{i}", raw, presence)
+        cache.put_derived(f"derived{i}", raw[:K])
+    raw_size = cache.size(RAW) // 3
+    derived_size = cache.size(DERIVED) // 3
+    assert cache.get_raw("raw0") is not None
+    assert cache.get_derived("derived1") is not None
+
+    # raw1 and derived0 are now the least recently used of their level
+    cache.max_bytes = {RAW: 2 * raw_size, DERIVED: 2 * derived_size}
+    cache.put_raw("raw3", raw, presence)
+    cache.put_derived("derived3", raw[:K])
+    assert cache.get_raw("raw1") is None
+    assert cache.get_derived("derived0") is None
+    assert cache.size(RAW) <= 2 * raw_size and cache.size(DERIVED) <= 2 * derived_size
+    assert cache.get_raw("raw0") is not None and cache.get_raw("raw3") is not None
+    assert cache.get_derived("derived1") is not None and cache.get_derived("derived3") is not None
+
+
+def test_selector_and_visibility_changes_reuse_raw_landmarks(cache, tmp_path, monkeypatch):
+    video_path = tmp_path / "clip.mp4"
+    video_path.write_bytes(b"not decoded")
+    extracted = []
+    def fake_raw_frames(source_path, model=None, **sampling):
+        extracted.append(source_path)
+        return raw_frames(30)
+    monkeypatch.setattr(cnd, "get_raw_frames", fake_raw_frames)
+    # Stated confidences give the runner a config, so its landmarks are cacheable
+    model = md.HolisticRunner(object(), min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+    keyframes, n_frames = cnd.cached_keyframes(cache, str(video_path), model, selector="uniform")
+    assert keyframes.shape == (K, N_LANDMARKS * 3) and n_frames == 30
+    assert len(extracted) == 1
+
+    # Same settings: the derived keyframes are returned as stored
+    cached, n_frames = cnd.cached_keyframes(cache, str(video_path), model, selector="uniform")
+    np.testing.assert_array_equal(cached, keyframes)
+    assert n_frames == 0
+
+    # New selector or threshold: derived recomputed from the stored raw landmarks, Holistic not run
+    for selector, visibility_thres in [("motion", 0.5), ("uniform", 0.9)]:
+        _, n_frames = cnd.cached_keyframes(cache, str(video_path), model, selector=selector,
+                                           visibility_thres=visibility_thres)
+        assert n_frames == 0
+    assert len(extracted) == 1
+    assert cache.stats()[RAW]["entries"] == 1
+    assert cache.stats()[DERIVED]["entries"] == 3
@@ -0,0 +1,26 @@
+import numpy as np
+
+from MediaPipeProcess import create_numpy_data as cnd
+from MediaPipeProcess import frame_sampling as fsam
+
+K = 5
+
+
+def test_benchmark_sampling_smoke(monkeypatch):
+    """benchmark_sampling runs end to end on stubbed extraction; stride keeps every stride-th frame."""
+
+    rng = np.random.default_rng(0)
+    clips = {f"v{i}.mp4": rng.random((30, 12), dtype=np.float32) for i in range(4)}
+    def fake_valid_frames(path, model=None, stride=1, **sampling):
+        return clips[path][::stride], len(clips[path]) // stride
+    monkeypatch.setattr(cnd, "get_valid_frames", fake_valid_frames)
+
+    report = fsam.benchmark_sampling(list(clips), {"stride-2": {"stride": 2}}, labels=[0, 0, 1, 1], k=K,
+                                     selector="uniform")
+
+    assert set(report) == {"all-frames", "stride-2"}
+    assert report["all-frames"]["reference_gap"] == 0
+    assert report["stride-2"]["inferred_frames"] == 60
+    assert report["stride-2"]["short_clips"] == 0
+    assert np.isfinite(report["stride-2"]["reference_gap"])
+    assert 0 <= report["stride-2"]["knn_accuracy"] <= 1
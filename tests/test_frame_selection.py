@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from MediaPipeProcess import frame_selection as fsel
+
+K = 20
+
+
+def labelled_clips(n_words=4, per_word=6, dim=60, seed=0):
+    """Clips moving through four poses of their word, with random timing and frame noise; words share a base pose."""
+
+    rng = np.random.default_rng(seed)
+    poses = rng.normal(0, 1, (1, 4, dim)) + rng.normal(0, 0.35, (n_words, 4, dim))
+    sequences, labels = [], []
+    for word in range(n_words):
+        for _ in range(per_word):
+            lengths = rng.integers(10, 25, 4)
+            X = np.concatenate([np.linspace(poses[word, i], poses[word, min(i + 1, 3)], n)
+                                for i, n in enumerate(lengths)])
+            sequences.append((X + rng.normal(0, 0.2, X.shape)).astype(np.float32))
+            labels.append(word)
+    return sequences, labels
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_selectors_match_kmeans_reference(seed):
+    sequences, labels = labelled_clips(seed=seed)
+    spread = np.mean([np.linalg.norm(X - X.mean(axis=0), axis=1).mean() for X in sequences])
+
+    report = fsel.benchmark_selectors(sequences, labels, k=K)
+
+    assert set(report) == set(fsel.SELECTORS)
+    reference = report["kmeans"]["knn_accuracy"]
+    for strategy, result in report.items():
+        # Selected frames lie among the reference ones (closer than frame noise apart) ...
+        assert result["reference_gap"] < 0.35 * spread, strategy
+        # ... and keep the clips of a word together as well as the reference does
+        assert result["knn_accuracy"] >= reference - 0.1, strategy
+
+
+@pytest.mark.parametrize("strategy", sorted(fsel.SELECTORS))
+def test_selectors_return_k_sorted_indices(strategy):
+    X = labelled_clips(n_words=1, per_word=1)[0][0]
+
+    index = fsel.select_keyframes(X, K, strategy, random_state=0)
+
+    assert len(index) == K
+    assert np.all(np.diff(index) >= 0)
+    assert 0 <= index.min() and index.max() < len(X)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from MediaPipeProcess import keypoint_codec as kc
+from MediaPipeProcess import keypoint_format as kf
+from MediaPipeProcess.config import (N_LANDMARKS, N_HAND_LANDMARKS, LEFT_HAND_OFFSET, RIGHT_HAND_OFFSET,
+                                     POSE_OFFSET)
+
+
+def clip_with_lost_hands(n_frames, seed=0):
+    """Smooth random clip where each hand is lost for a stretch of frames and a pose point drops out."""
+
+    rng = np.random.default_rng(seed)
+    keypoints = rng.uniform(0, 1, (1, N_LANDMARKS, 3)) + np.cumsum(rng.normal(0, 0.01, (n_frames, N_LANDMARKS, 3)), axis=0)
+    keypoints[..., 2] -= 0.5                                # z is relative depth, around zero
+    keypoints = keypoints.astype(np.float32)
+    keypoints[n_frames // 4:n_frames // 2, LEFT_HAND_OFFSET:LEFT_HAND_OFFSET + N_HAND_LANDMARKS] = 0
+    keypoints[n_frames // 3:, RIGHT_HAND_OFFSET:RIGHT_HAND_OFFSET + N_HAND_LANDMARKS] = 0
+    keypoints[::5, POSE_OFFSET] = 0
+    return keypoints
+
+
+@pytest.mark.parametrize("mode", kc.MODES)
+@pytest.mark.parametrize("n_frames", [0, 1, 60])
+def test_round_trip_within_error_bound(mode, n_frames):
+    keypoints = clip_with_lost_hands(n_frames)
+    mask = kf.presence_mask(keypoints)
+
+    decoded, decoded_mask = kc.from_bytes(kc.to_bytes(keypoints, mask, mode=mode))
+
+    assert decoded.shape == keypoints.shape
+    assert decoded.dtype == kf.DTYPE
+    np.testing.assert_array_equal(decoded_mask, mask)
+    missing = ~np.any(keypoints != 0, axis=2)
+    assert np.all(decoded[missing] == 0)
+    if n_frames:
+        max_abs = float(np.abs(keypoints).max())
+        assert np.abs(decoded - keypoints).max() <= kc.error_bound(mode, max_abs=max_abs)
+
+
+def test_mask_of_lost_hands():
+    keypoints = clip_with_lost_hands(60)
+    _, mask = kc.decode(kc.encode(keypoints))
+
+    assert mask[0] == kf.LEFT_HAND_PRESENT | kf.RIGHT_HAND_PRESENT
+    assert mask[16] == kf.RIGHT_HAND_PRESENT
+    assert mask[25] == 0
+    assert mask[59] == kf.LEFT_HAND_PRESENT
@@ -0,0 +1,58 @@
+import os
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from listing import HttpListing
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "dictionary")
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    """Base url of the saved dictionary pages, served without a charset in Content-Type."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=FIXTURES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def open_site(site, page_url):
+    return HttpListing("dataset/videos", page_url=site + page_url, base_url=site, workers=4, retries=0, timeout=5)
+
+
+def test_iter_pages(site):
+    with open_site(site, "/page{page}.html") as listing:
+        pages = list(listing.iter_pages(1, 3))
+
+    assert [page_num for page_num, _ in pages] == [1, 2, 3]
+    assert pages[2][1] is None                              # no page3.html: failed, not empty
+    records = [[record for record, _ in videos] for _, videos in pages[:2]]
+    assert [[record["id"] for record in page] for page in records] == [["D0001", "D0002", "D0003B"],
+                                                                      ["D0004", "D0005N"]]
+    assert [[record["word"] for record in page] for page in records] == [["Anh", "Ăn", "Bạn bè"],
+                                                                        ["Đường", "Cảm ơn"]]
+    record, task = pages[0][1][0]
+    assert record["video_url"] == os.path.join("dataset/videos", "D0001")
+    assert task == {"id": "D0001", "url": f"{site}/videos/D0001.mp4"}
+
+
+def test_probe(site):
+    with open_site(site, "/page{page}.html") as listing:
+        assert listing.probe(219)
+        assert listing.probe(1)
+    # A server ignoring the page number, and a page whose videos are rendered by scripts
+    with open_site(site, "/page1.html?page={page}") as listing:
+        assert not listing.probe(219)
+    with open_site(site, "/rendered.html?page={page}") as listing:
+        assert not listing.probe(219)
@@ -0,0 +1,56 @@
+import json
+
+from metadata_store import MetadataIndex, MetadataSink, recover_tail
+
+
+def record(video_id, word):
+    return {"id": video_id, "word": word, "video_url": f"videos/{video_id}"}
+
+
+def test_recover_tail_cuts_back_to_the_last_complete_record(tmp_path):
+    path = str(tmp_path / "metadata.jsonl")
+    with MetadataSink(path, index=True) as sink:
+        sink.extend([record("A", "a"), record("B", "b")])
+    complete = open(path, "rb").read()
+    # Crash mid-write: half of the third record reached the file
+    torn = (json.dumps(record("C", "c")) + "\n").encode()[:20]
+    with open(path, "ab") as f:
+        f.write(torn)
+
+    assert recover_tail(path) == len(torn)
+    assert open(path, "rb").read() == complete
+    assert recover_tail(path) == 0
+
+
+def test_index_refreshes_after_a_torn_tail(tmp_path):
+    path = str(tmp_path / "metadata.jsonl")
+    with MetadataSink(path, index=True) as sink:
+        sink.extend([record("A", "a"), record("B", "b")])
+    with open(path, "ab") as f:
+        f.write(b'{"id": "C", "wo')
+
+    # The sink cuts the torn line on open and appends after the last complete record
+    with MetadataSink(path, index=True) as sink:
+        sink.add(record("D", "d"))
+    with open(path, "r", encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == ["A", "B", "D"]
+    index = MetadataIndex(path)
+    assert index.ids() == {"A", "B", "D"}
+    assert index.get("D") == record("D", "d")
+    index.close()
+
+
+def test_index_rebuilds_when_the_file_shrank(tmp_path):
+    path = str(tmp_path / "metadata.jsonl")
+    with MetadataSink(path, index=True) as sink:
+        sink.extend([record("A", "a"), record("B", "b"), record("C", "c")])
+    # Truncated mid-record below what the index has seen
+    lines = open(path, "rb").read().splitlines(keepends=True)
+    with open(path, "wb") as f:
+        f.write(lines[0] + lines[1][:10])
+    recover_tail(path)
+
+    index = MetadataIndex(path)
+    assert index.ids() == {"A"}
+    assert index.count_by_word() == {"a": 1}
+    index.close()
@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+
+from MediaPipeProcess import frame_sampling as fsam
+from MediaPipeProcess.proxy_cache import ProxyCache
+
+
+def write_video(path, seed, n_frames=8, size=(64, 48)):
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, size)
+    for _ in range(n_frames):
+        writer.write(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_leased_proxy_survives_eviction_by_another_worker(tmp_path):
+    first = write_video(tmp_path / "first.avi", 0)
+    second = write_video(tmp_path / "second.avi", 1)
+    root = str(tmp_path / "proxies")
+    # Two workers sharing the cache, which only has room for one proxy (about 26 kB each)
+    with ProxyCache(root, max_bytes=40_000) as worker, ProxyCache(root, max_bytes=40_000) as other:
+        with worker.lease(first) as path:
+            other.get(second)
+            cap = fsam.open_video(path)
+            assert cap.read()[0]
+            cap.release()
+            assert worker.stats()["leases"] == 1
+        assert worker.stats()["leases"] == 0
+        # Released, the first proxy is evicted like any other
+        other.get(write_video(tmp_path / "third.avi", 2))
+        assert other.stats()["entries"] == 1
+        # A lease on an evicted proxy transcodes it again
+        with worker.lease(first) as path:
+            assert fsam.open_video(path).read()[0]
+
+
+def test_missing_video_is_an_error_not_an_empty_clip(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        fsam.open_video(str(tmp_path / "evicted.avi"))